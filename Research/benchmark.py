@@ -0,0 +1,275 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+
+import comparemore
+from synthetic_corpus import generate_corpus, write_corpus
+from timing import measure
+
+# Default location of the stored benchmark baseline. Throughput depends on the
+# machine, so a baseline is only meaningful on the machine that recorded it.
+DEFAULT_BASELINE_PATH = "benchmark_baseline.json"
+
+# A benchmark is flagged when its throughput drops, or its peak memory grows,
+# by more than this fraction relative to the baseline
+REGRESSION_THRESHOLD = 0.2
+
+# Peak-memory changes smaller than this are treated as noise
+MEMORY_NOISE_MB = 1.0
+
+
+# Define function to empty the in-process grammar sentence cache, so a timed
+# run checks its sentences instead of reading the previous run's results
+def clear_caches():
+    if comparemore.get_grammar_pool.cache_info().currsize:
+        comparemore.get_grammar_pool().cache.clear()
+
+
+# Define function to build analysis contexts for the synthetic emails; the
+# spaCy parse is only done when a benchmarked metric needs it
+def build_contexts(texts, metric_names, parse_pool=None):
+    if any(comparemore.METRICS[name].needs_doc for name in metric_names):
+        parsed = comparemore.parse_corpus(((text, i) for i, text in enumerate(texts)),
+                                          parse_pool=parse_pool)
+        return [ctx for _, ctx in parsed]
+    return [comparemore.EmailContext(text) for text in texts]
+
+
+# Define function to list the benchmarks for the selected metrics as
+# (name, run, items) triples. With a parse pool, parsing is measured both
+# in-process and on the pool, so the pool's speedup is a measured number.
+def collect_benchmarks(texts, contexts, metric_names, corpus_path, n_process, parse_pool=None):
+    benchmarks = []
+    if contexts and contexts[0].doc is not None:
+        benchmarks.append(("parse_corpus", lambda batch: list(comparemore.parse_corpus(
+            (text, i) for i, text in enumerate(batch))), texts))
+        if parse_pool is not None:
+            benchmarks.append((f"parse_corpus[{n_process} workers]",
+                               lambda batch: list(comparemore.parse_corpus(
+                                   ((text, i) for i, text in enumerate(batch)),
+                                   parse_pool=parse_pool)),
+                               texts))
+
+    for name in metric_names:
+        metric = comparemore.METRICS[name]
+        benchmarks.append((metric.analyze.__name__,
+                           lambda batch, analyze=metric.analyze: [analyze(ctx) for ctx in batch],
+                           contexts))
+        if metric.batch is not None:
+            extract, compute = metric.batch
+            benchmarks.append((f"{metric.analyze.__name__}[batch]",
+                               lambda batch, extract=extract, compute=compute:
+                                   compute([extract(ctx) for ctx in batch]),
+                               contexts))
+
+    # Batched perplexity: the same engine.score call that `python perplexity.py`
+    # times per backend
+    if "perplexity" in metric_names:
+        benchmarks.append(("perplexity[batch]",
+                           lambda batch: comparemore.get_perplexity_engine().score(batch),
+                           texts))
+
+    # The whole pipeline reads the corpus file itself, so its "items" are only
+    # used for the email count; the warmup run scores a one-email file
+    def run_pipeline(batch):
+        path = corpus_path if len(batch) == len(texts) else corpus_path + ".warmup"
+        if not os.path.exists(path):
+            write_corpus([{"scenario": "", "category": "", "email": text} for text in batch], path)
+        with contextlib.redirect_stdout(io.StringIO()):
+            comparemore.evaluate_models({"synthetic": path}, metric_names,
+                                        n_process=n_process, cache=None,
+                                        parse_pool=parse_pool)
+
+    benchmarks.append(("evaluate_models", run_pipeline, texts))
+    return benchmarks
+
+
+# Define function to run every benchmark; metrics whose models cannot be
+# loaded are reported as skipped
+def run_benchmarks(args):
+    metric_names = args.metrics or list(comparemore.METRICS)
+
+    # The parse pool is started before any model is loaded, so its workers
+    # are not forked from a process running LanguageTool threads. When spaCy
+    # cannot be loaded the parse metrics are skipped below.
+    parse_pool = None
+    if any(comparemore.METRICS[name].needs_doc for name in metric_names):
+        try:
+            parse_pool = comparemore.create_parse_pool(args.n_process)
+        except Exception:
+            parse_pool = None
+    try:
+        return _run_benchmarks(args, metric_names, parse_pool)
+    finally:
+        if parse_pool is not None:
+            parse_pool.shutdown()
+
+
+def _run_benchmarks(args, metric_names, parse_pool):
+    available = []
+    skipped = {}
+    for name in metric_names:
+        try:
+            comparemore.load_resources([name])
+            available.append(name)
+        except Exception as e:
+            skipped[name] = f"{type(e).__name__}: {e}"
+
+    records = generate_corpus(args.emails, args.words, args.paragraphs,
+                              structure_rate=args.structure_rate, seed=args.seed)
+    texts = [record["email"] for record in records]
+    contexts = build_contexts(texts, available, parse_pool)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_path = os.path.join(tmp, "synthetic.json")
+        write_corpus(records, corpus_path)
+        for name, run, items in collect_benchmarks(texts, contexts, available, corpus_path,
+                                                   args.n_process, parse_pool):
+            print(f"Benchmarking {name}...")
+            results[name] = measure(run, items, args.repeat, reset=clear_caches)
+
+    return {
+        "config": {
+            "emails": args.emails,
+            "words": args.words,
+            "paragraphs": args.paragraphs,
+            "structure_rate": args.structure_rate,
+            "seed": args.seed,
+            "perplexity_backend": args.perplexity_backend,
+            "n_process": args.n_process,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+# Define function to compare a run against a baseline. Returns one row per
+# benchmark with the relative throughput and memory changes and whether it
+# regressed.
+def compare_to_baseline(current, baseline, threshold=REGRESSION_THRESHOLD):
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            rows.append({"name": name, "status": "new"})
+            continue
+        speed_change = result["emails_per_sec"] / base["emails_per_sec"] - 1
+        memory_change = (result["peak_mb"] / base["peak_mb"] - 1) if base["peak_mb"] > 0 else 0.0
+        slower = speed_change < -threshold
+        bigger = (memory_change > threshold
+                  and result["peak_mb"] - base["peak_mb"] > MEMORY_NOISE_MB)
+        rows.append({
+            "name": name,
+            "speed_change": speed_change,
+            "memory_change": memory_change,
+            "status": "REGRESSION" if slower or bigger else "ok",
+        })
+    return rows
+
+
+# Define function to print benchmark results, with baseline changes when given
+def print_report(current, comparison=None):
+    changes = {row["name"]: row for row in comparison or []}
+    print("\nBenchmark Results:")
+    print("=" * 86)
+    print(f"{'benchmark':<34}{'emails/s':>12}{'ms/email':>11}{'peak MB':>10}"
+          f"{'speed':>9}{'memory':>9}  status")
+    print("-" * 86)
+    for name, result in current["results"].items():
+        ms_per_email = 1000 * result["seconds"] / result["emails"] if result["emails"] else 0.0
+        line = (f"{name:<34}{result['emails_per_sec']:>12.1f}{ms_per_email:>11.2f}"
+                f"{result['peak_mb']:>10.2f}")
+        row = changes.get(name)
+        if row is not None and "speed_change" in row:
+            line += f"{row['speed_change']:>+9.0%}{row['memory_change']:>+9.0%}  {row['status']}"
+        elif row is not None:
+            line += f"{'':>18}  {row['status']}"
+        print(line)
+    print("=" * 86)
+    serial = current["results"].get("parse_corpus")
+    for name, result in current["results"].items():
+        if serial is not None and name.startswith("parse_corpus["):
+            speedup = result["emails_per_sec"] / serial["emails_per_sec"]
+            print(f"{name}: {speedup:.2f}x the in-process parse "
+                  f"({current['config']['cpu_count']} CPUs)")
+    for name, reason in current["skipped"].items():
+        print(f"Skipped {name}: {reason}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the email analyzers on a synthetic corpus.")
+    parser.add_argument("--metrics", type=comparemore._split_option, default=None,
+                        help="comma-separated metrics to benchmark (default: all). "
+                             f"Available: {', '.join(comparemore.METRICS)}")
+    parser.add_argument("--emails", type=int, default=200, help="synthetic emails per benchmark")
+    parser.add_argument("--words", type=int, default=180, help="mean body words per email")
+    parser.add_argument("--paragraphs", type=int, default=4, help="body paragraphs per email")
+    parser.add_argument("--structure-rate", type=float, default=1.0,
+                        help="probability of including each of subject, greeting and sign-off")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the corpus")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="timed runs per benchmark; the fastest is reported")
+    parser.add_argument("--perplexity-backend", default=comparemore.PERPLEXITY_BACKEND,
+                        help="perplexity model to benchmark (see perplexity.py)")
+    parser.add_argument("--n-process", type=int, default=1,
+                        help="spaCy parse worker processes; > 1 also measures the "
+                             "parse pool against the in-process parse")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH,
+                        help="baseline JSON file to compare against")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative slowdown or memory growth flagged as a regression")
+    parser.add_argument("--output", default=None, help="also write this run's results as JSON")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.metrics or [] if name not in comparemore.METRICS]
+    if unknown:
+        parser.error(f"unknown metrics: {', '.join(unknown)}")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    comparemore.set_perplexity_backend(args.perplexity_backend)
+    try:
+        current = run_benchmarks(args)
+    finally:
+        comparemore.close_resources()
+
+    comparison = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["config"] != current["config"]:
+            print(f"Warning: {args.baseline} was recorded with a different configuration; "
+                  "changes may not be comparable")
+        comparison = compare_to_baseline(current, baseline, args.threshold)
+
+    print_report(current, comparison)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=4)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, indent=4)
+        print(f"Saved baseline to {args.baseline}")
+
+    regressions = [row["name"] for row in comparison or [] if row["status"] == "REGRESSION"]
+    if regressions:
+        print(f"\nRegressions: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
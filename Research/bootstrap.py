@@ -0,0 +1,149 @@
+import numpy as np
+
+# Default number of bootstrap resamples
+DEFAULT_RESAMPLES = 1000
+
+# Default confidence level of the reported intervals
+DEFAULT_CONFIDENCE = 0.95
+
+# Upper bound on resample-count matrix entries built at once; resamples are
+# processed in blocks so memory stays bounded for large corpora
+BLOCK_ENTRIES = 1 << 24
+
+
+# Define function to draw bootstrap means of one model's per-email scores.
+# values is an (n_emails x n_metrics) matrix. Each block of resamples is drawn
+# as one (block x n_emails) index matrix, turned into per-email counts with a
+# single bincount, and every metric's resampled mean comes from one matrix
+# product. Returns an (n_resamples x n_metrics) array.
+def bootstrap_means(values, n_resamples=DEFAULT_RESAMPLES, rng=None):
+    rng = np.random.default_rng(rng)
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    means = np.empty((n_resamples, values.shape[1]), dtype=np.float64)
+    if n == 0:
+        means.fill(np.nan)
+        return means
+
+    block = max(1, min(n_resamples, BLOCK_ENTRIES // n))
+    for start in range(0, n_resamples, block):
+        size = min(block, n_resamples - start)
+        indices = rng.integers(0, n, size=(size, n))
+        indices += np.arange(size)[:, None] * n
+        counts = np.bincount(indices.ravel(), minlength=size * n).reshape(size, n)
+        means[start:start + size] = counts @ values / n
+    return means
+
+
+# Define function to min-max normalize resampled means across models, the
+# same way as the point estimates: (n_resamples x n_models x n_metrics) in,
+# same shape out. Metrics where every model ties get tie_value; lower_is_better
+# is a boolean mask over metrics whose normalization is inverted.
+def normalize_samples(means, lower_is_better, tie_value=0.5):
+    low = means.min(axis=1, keepdims=True)
+    high = means.max(axis=1, keepdims=True)
+    spread = high - low
+    normalized = np.divide(means - low, spread, out=np.full_like(means, tie_value),
+                           where=spread != 0)
+    inverted = np.asarray(lower_is_better, dtype=bool)
+    normalized[..., inverted] = np.where(spread[..., inverted] != 0,
+                                         1 - normalized[..., inverted], tie_value)
+    return normalized
+
+
+# Define function to compute percentile confidence intervals along the first
+# (resample) axis; returns (low, high) arrays
+def confidence_intervals(samples, confidence=DEFAULT_CONFIDENCE):
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(samples, [tail, 100 - tail], axis=0)
+    return low, high
+
+
+# Define function to compute pairwise win probabilities from an
+# (n_resamples x n_models) score matrix: entry [a, b] is the fraction of
+# resamples where model a scores above model b, with ties counted as half
+def win_probabilities(scores):
+    a = scores[:, :, None]
+    b = scores[:, None, :]
+    return (a > b).mean(axis=0) + 0.5 * (a == b).mean(axis=0)
+
+
+# Bootstrap analysis of a model comparison. values_by_model maps each model
+# to its (n_emails x n_metrics) per-email matrix; metric columns line up with
+# keys. Each model's emails are resampled independently; each resample's
+# means are normalized across models and weighted exactly like the point
+# estimates (tie_value is the normalized value of metrics where every model
+# ties), giving a distribution of final scores per model.
+class BootstrapResult:
+    def __init__(self, values_by_model, keys, weights, lower_is_better=(),
+                 n_resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE, seed=0,
+                 tie_value=0.5):
+        rng = np.random.default_rng(seed)
+        self.models = list(values_by_model)
+        self.keys = list(keys)
+        self.confidence = confidence
+        self.n_resamples = n_resamples
+
+        # (n_resamples x n_models x n_metrics)
+        self.means = np.stack([bootstrap_means(values_by_model[model], n_resamples, rng)
+                               for model in self.models], axis=1)
+        normalized = normalize_samples(self.means, [key in lower_is_better for key in self.keys],
+                                       tie_value)
+        weight_vector = np.array([weights.get(key, 0.0) for key in self.keys])
+        self.scores = normalized @ weight_vector
+        self.wins = win_probabilities(self.scores)
+
+    # Define function to get per-model confidence intervals of every metric mean
+    def metric_intervals(self):
+        low, high = confidence_intervals(self.means, self.confidence)
+        return {model: {key: (float(low[m, k]), float(high[m, k]))
+                        for k, key in enumerate(self.keys)}
+                for m, model in enumerate(self.models)}
+
+    # Define function to get per-model confidence intervals of the weighted score
+    def score_intervals(self):
+        low, high = confidence_intervals(self.scores, self.confidence)
+        return {model: (float(low[m]), float(high[m])) for m, model in enumerate(self.models)}
+
+    # Define function to get each model's probability of ranking first
+    def best_probabilities(self):
+        best = np.bincount(self.scores.argmax(axis=1), minlength=len(self.models))
+        return {model: float(best[m] / self.n_resamples) for m, model in enumerate(self.models)}
+
+    # Define function to get the win probability of model a over model b
+    def win_probability(self, a, b):
+        return float(self.wins[self.models.index(a), self.models.index(b)])
+
+
+# Define function to print a BootstrapResult: metric and weighted-score
+# intervals around the point estimates in final_scores and model_scores, and
+# the pairwise win probabilities
+def print_bootstrap(final_scores, model_scores, result):
+    level = f"{result.confidence:.0%}"
+    metric_intervals = result.metric_intervals()
+    print(f"\nMetric {level} Confidence Intervals ({result.n_resamples} bootstrap resamples):")
+    print("=" * 80)
+    for model in result.models:
+        print(f"\n{model}:")
+        for key in result.keys:
+            low, high = metric_intervals[model][key]
+            print(f"  - {key}: {final_scores[model][key]:.2f} [{low:.2f}, {high:.2f}]")
+    print("=" * 80)
+
+    score_intervals = result.score_intervals()
+    best = result.best_probabilities()
+    print(f"\nWeighted Score {level} Confidence Intervals:")
+    print("=" * 50)
+    for model in result.models:
+        low, high = score_intervals[model]
+        print(f"{model}: {model_scores[model]:.4f} [{low:.4f}, {high:.4f}]  "
+              f"P(best) = {best[model]:.2f}")
+    print("=" * 50)
+
+    print("\nPairwise Win Probabilities:")
+    print("=" * 50)
+    for a in result.models:
+        for b in result.models:
+            if a != b:
+                print(f"P({a} > {b}) = {result.win_probability(a, b):.3f}")
+    print("=" * 50)
@@ -0,0 +1,95 @@
+import numpy as np
+
+# Weight of local (adjacent-sentence) coherence in the combined score; the
+# rest goes to global (first-to-last sentence) coherence
+LOCAL_WEIGHT = 0.7
+
+# Emails with fewer sentences than this get a coherence score of 1.0
+MIN_SENTENCES = 3
+
+# Largest sentence distance compared by windowed coherence
+WINDOW = 2
+
+
+# Define function to row-normalize a sentence-vector matrix; zero rows stay zero
+def normalize_rows(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+# Define function to stack the emails with at least min_sentences rows and
+# row-normalize them once. Returns (eligible email indices, their lengths,
+# the stacked unit rows)
+def stack_eligible(matrices, min_sentences):
+    eligible = [i for i, matrix in enumerate(matrices) if len(matrix) >= min_sentences]
+    if not eligible:
+        return eligible, np.zeros(0, dtype=np.int64), None
+    lengths = np.array([len(matrices[i]) for i in eligible])
+    return eligible, lengths, normalize_rows(np.concatenate([matrices[i] for i in eligible]))
+
+
+# Define function to compute combined coherence for a batch of emails, given
+# one (n_sentences x dim) sentence-vector matrix per email. All eligible
+# emails are stacked into one matrix, normalized once, and every adjacent
+# similarity comes from a single row-wise dot product.
+def coherence_scores(matrices, local_weight=LOCAL_WEIGHT):
+    scores = np.ones(len(matrices), dtype=np.float64)
+    eligible, lengths, unit = stack_eligible(matrices, MIN_SENTENCES)
+    if not eligible:
+        return scores.tolist()
+
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    # Similarity of each row with the next; pairs that straddle two emails are
+    # zeroed before summing each email's pairs
+    adjacent = np.einsum("ij,ij->i", unit[:-1], unit[1:])
+    adjacent[ends[:-1] - 1] = 0.0
+    local = np.add.reduceat(adjacent, starts) / (lengths - 1)
+
+    global_similarity = np.einsum("ij,ij->i", unit[starts], unit[ends - 1])
+
+    scores[eligible] = local_weight * local + (1 - local_weight) * global_similarity
+    return scores.tolist()
+
+
+# Define function to compute mean similarity over all sentence pairs of each
+# email in a batch. The sum over ordered pairs i != j of u_i . u_j is
+# |sum_i u_i|^2 - sum_i |u_i|^2, so every email needs only its row sum and
+# its rows' squared norms. Emails with fewer than two sentences score 1.0.
+def all_pairs_coherence_scores(matrices):
+    scores = np.ones(len(matrices), dtype=np.float64)
+    eligible, lengths, unit = stack_eligible(matrices, 2)
+    if not eligible:
+        return scores.tolist()
+
+    starts = np.cumsum(lengths) - lengths
+    sums = np.add.reduceat(unit, starts, axis=0)
+    squared_norms = np.add.reduceat(np.einsum("ij,ij->i", unit, unit), starts)
+    pair_sums = np.einsum("ij,ij->i", sums, sums) - squared_norms
+    scores[eligible] = pair_sums / (lengths * (lengths - 1))
+    return scores.tolist()
+
+
+# Define function to compute mean similarity over sentence pairs at most
+# window sentences apart in each email of a batch: one row-wise dot product
+# per offset over the stacked matrix, with pairs that straddle two emails
+# dropped. Emails with fewer than two sentences score 1.0.
+def windowed_coherence_scores(matrices, window=WINDOW):
+    scores = np.ones(len(matrices), dtype=np.float64)
+    eligible, lengths, unit = stack_eligible(matrices, 2)
+    if not eligible:
+        return scores.tolist()
+
+    owner = np.repeat(np.arange(len(eligible)), lengths)
+    totals = np.zeros(len(eligible), dtype=np.float64)
+    counts = np.zeros(len(eligible), dtype=np.int64)
+    for offset in range(1, min(window, int(lengths.max()) - 1) + 1):
+        similarity = np.einsum("ij,ij->i", unit[:-offset], unit[offset:])
+        same = owner[:-offset] == owner[offset:]
+        totals += np.bincount(owner[:-offset][same], weights=similarity[same],
+                              minlength=len(eligible))
+        counts += np.maximum(lengths - offset, 0)
+    scores[eligible] = totals / counts
+    return scores.tolist()
@@ -2,10 +2,13 @@ import json
 import os
 import textstat
 import spacy
-import matplotlib.pyplot as plt
 import numpy as np
 from collections import defaultdict
+from bootstrap import DEFAULT_CONFIDENCE, DEFAULT_RESAMPLES, BootstrapResult, print_bootstrap
 from language_tool_python import LanguageTool
+from metric_cache import DEFAULT_CACHE_PATH, MetricCache, text_hash
+from report import build_report, render_report, save_aggregates
+from streaming_stats import StreamingAggregator
 
 # Load English NLP model
 nlp = spacy.load("en_core_web_sm")
@@ -33,6 +36,9 @@ def analyze_formality(text):
 def analyze_readability(text):
     return textstat.flesch_kincaid_grade(text)
 
+# Value reported when an email's grammar check fails; it is never cached
+GRAMMAR_ERROR = -1
+
 # Define function to analyze grammar quality
 def analyze_grammar(text):
     try:
@@ -40,28 +46,51 @@ def analyze_grammar(text):
         return len(matches)  # Number of grammar issues detected
     except Exception as e:
         print(f"Grammar check error: {e}")
-        return -1  # Error handling
+        return GRAMMAR_ERROR  # Error handling
 
 # Define function to analyze conciseness
 def analyze_conciseness(text):
     return len(text.split())
 
-# Function to evaluate emails from all models
-def evaluate_models(json_files):
-    scores = defaultdict(lambda: defaultdict(list))
+# Metrics computed per email, with their cache versions: bump a version
+# whenever that metric's implementation changes
+METRICS = {
+    "formality": analyze_formality,
+    "readability": analyze_readability,
+    "grammar_errors": analyze_grammar,
+    "conciseness": analyze_conciseness,
+}
+METRIC_VERSIONS = {"formality": 1, "readability": 1, "grammar_errors": 1, "conciseness": 1}
+
+# Function to evaluate emails from all models, reusing cached metric values.
+# Per-model statistics are accumulated as values arrive (see streaming_stats.py);
+# the per-email values are kept as well, {model: {metric: [value, ...]}}, for
+# the bootstrap. Returns both.
+def evaluate_models(json_files, cache=None):
+    scores = StreamingAggregator()
+    per_email = defaultdict(lambda: defaultdict(list))
     
     for model, file in json_files.items():
         print(f"\nEvaluating model: {model}...")
         data = load_json(file)
-        for email_data in data:
-            email_text = email_data["email"]
-            scores[model]["formality"].append(analyze_formality(email_text))
-            scores[model]["readability"].append(analyze_readability(email_text))
-            scores[model]["grammar_errors"].append(analyze_grammar(email_text))
-            scores[model]["conciseness"].append(analyze_conciseness(email_text))
+        texts = [email_data["email"] for email_data in data]
+        hashes = [text_hash(text) for text in texts]
+        for metric, analyze in METRICS.items():
+            version = METRIC_VERSIONS[metric]
+            cached = cache.get_many(hashes, metric, version) if cache is not None else {}
+            new_values = []
+            for text, h in zip(texts, hashes):
+                if h not in cached:
+                    cached[h] = analyze(text)
+                    if not (metric == "grammar_errors" and cached[h] == GRAMMAR_ERROR):
+                        new_values.append((h, cached[h]))
+                scores.get(model, metric).add(cached[h])
+                per_email[model][metric].append(cached[h])
+            if cache is not None:
+                cache.put_many(metric, version, new_values)
         print(f"Completed evaluation for {model}\n")
     
-    return scores
+    return scores, per_email
 
 # Define JSON files for each AI model
 json_files = {
@@ -72,17 +101,18 @@ json_files = {
 }
 
 # Evaluate models
-results = evaluate_models(json_files)
-
-# Aggregate scores
-final_scores = {}
-for model, metrics in results.items():
-    final_scores[model] = {
-        "avg_formality": np.mean(metrics["formality"]),
-        "avg_readability": np.mean(metrics["readability"]),
-        "avg_grammar_errors": np.mean(metrics["grammar_errors"]),
-        "avg_word_count": np.mean(metrics["conciseness"])
-    }
+with MetricCache(DEFAULT_CACHE_PATH, namespace="compare") as metric_cache:
+    results, per_email = evaluate_models(json_files, cache=metric_cache)
+
+# Aggregate scores, with each metric's std, median and 95th percentile
+aggregates = {
+    "avg_formality": "formality",
+    "avg_readability": "readability",
+    "avg_grammar_errors": "grammar_errors",
+    "avg_word_count": "conciseness"
+}
+final_scores = results.means(aggregates)
+spread = results.spread(aggregates)
 
 # Print scores in a structured format
 print("\nModel Evaluation Results:")
@@ -117,43 +147,29 @@ for model in final_scores:
     print(f"{model}: {model_scores[model]:.4f}")
 print("=" * 50)
 
+# Bootstrap the per-email scores to see whether the gaps are real. Resampled
+# means are normalized like the point estimates above (1.0 on ties, no
+# inversion; grammar issues carry a negative weight instead).
+bootstrap = None
+if len(model_scores) > 1:
+    keys = list(weights)
+    bootstrap = BootstrapResult(
+        {model: np.column_stack([per_email[model][aggregates[key]] for key in keys])
+         for model in final_scores},
+        keys, weights, n_resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE,
+        tie_value=1.0)
+    print_bootstrap(final_scores, model_scores, bootstrap)
+
 # Determine the best model
 best_model = max(model_scores, key=model_scores.get)
 print(f"\nBest AI Model for Formal Emails: {best_model}\n")
 
-# Visualization
-models = list(final_scores.keys())
-metrics = ["avg_formality", "avg_readability", "avg_grammar_errors", "avg_word_count"]
-colors = ['blue', 'green', 'red', 'purple']
-
-plt.figure(figsize=(12, 8))
-for i, metric in enumerate(metrics):
-    plt.subplot(2, 2, i + 1)
-    values = [final_scores[model][metric] for model in models]
-    bars = plt.bar(models, values, color=colors)
-    plt.title(metric.replace("avg_", "").capitalize(), fontsize=14, fontweight='bold')
-    plt.xticks(rotation=30, fontsize=10)
-    plt.ylabel("Score", fontsize=12)
-    plt.grid(axis='y', linestyle='--', alpha=0.7)
-    
-    for bar in bars:
-        yval = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2, yval * 0.9, f"{yval:.2f}", ha='center', va='top', fontsize=10, color='white', fontweight='bold')
-
-plt.tight_layout()
-plt.show()
-
-# Final model score comparison graph
-plt.figure(figsize=(8, 5))
-final_values = [model_scores[model] for model in models]
-bars = plt.bar(models, final_values, color=colors)
-plt.title("Final Model Scores", fontsize=14, fontweight='bold')
-plt.xticks(rotation=30, fontsize=10)
-plt.ylabel("Score", fontsize=12)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-
-for bar in bars:
-    yval = bar.get_height()
-    plt.text(bar.get_x() + bar.get_width()/2, yval * 0.9, f"{yval:.4f}", ha='center', va='top', fontsize=10, color='white', fontweight='bold')
-
-plt.show()
+# Store the aggregates and render the charts headlessly (see report.py). This
+# script runs at import time, so figures are rendered in-process rather than
+# on worker processes that would re-import it.
+report = build_report(final_scores, normalized_scores, model_scores,
+                      ["avg_formality", "avg_readability", "avg_grammar_errors", "avg_word_count"],
+                      bootstrap=bootstrap, weights=weights, spread=spread)
+save_aggregates(report, "compare_scores.json")
+for path in render_report(report, prefix="compare_", workers=1).values():
+    print(f"Wrote {path}")
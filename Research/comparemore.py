@@ -1,121 +1,318 @@
-import json
+import argparse
+import functools
+import multiprocessing
 import os
-import textstat
-import spacy
-import matplotlib.pyplot as plt
 import numpy as np
+from bootstrap import DEFAULT_CONFIDENCE, DEFAULT_RESAMPLES, BootstrapResult, print_bootstrap
+from coherence import all_pairs_coherence_scores, coherence_scores, windowed_coherence_scores
 from collections import defaultdict
-from language_tool_python import LanguageTool
-import re
-import importlib.util
-
-# Check and install required packages
-def install_if_missing(package):
-    try:
-        importlib.import_module(package)
-        print(f"{package} is already installed.")
-    except ImportError:
-        import subprocess
-        print(f"Installing {package}...")
-        subprocess.check_call(["pip", "install", package])
-        print(f"{package} has been installed.")
-
-# Install dependencies
-packages = ["vaderSentiment", "transformers", "lexical_diversity"]
-for package in packages:
-    install_if_missing(package)
-
-# Now import the packages
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-import torch
-from transformers import GPT2LMHeadModel, GPT2Tokenizer
-from lexicalrichness import LexicalRichness
+from email_rules import DEFAULT_RULES_PATH, EmailRuleEngine, rules_digest
+from group_stats import GROUP_LABELS, GroupedStats, scores_by_group
+from concurrent.futures import ProcessPoolExecutor
+from ingest import iter_chunks, iter_records
+from lexicon import DEFAULT_LEXICONS_PATH, lexicons_digest
+from instrumentation import DEFAULT_TRACE_PATH, Profiler
+from metric_cache import DEFAULT_CACHE_PATH, MetricCache, text_hash
+from report import DEFAULT_AGGREGATES_PATH, build_report, render_report, save_aggregates
+from results_store import ResultsTable
+from streaming_stats import StreamingAggregator
+
+# Heavy analyzers (spaCy, LanguageTool, VADER, GPT-2, PassivePy) are loaded
+# lazily on first use, so a run only pays for the models its metrics need
+
+# Grammar checks go to a pool of local LanguageTool servers from a bounded
+# thread pool and overlap with the spaCy and GPT-2 work
+GRAMMAR_SERVERS = 2
+GRAMMAR_CONCURRENCY = 4
+
+# Grammar is checked sentence by sentence and repeated sentences are served
+# from a bounded LRU (see grammar_cache.py); GRAMMAR_SENTENCE_CACHE_PATH adds
+# an on-disk tier, which run_evaluation points at the metric cache file
+GRAMMAR_SENTENCE_CACHE_SIZE = 100000
+GRAMMAR_SENTENCE_CACHE_PATH = None
+
+# Emails are scored in length-sorted padded batches; see perplexity.py.
+# PERPLEXITY_THREADS is PyTorch's process-wide CPU thread count, set by main.
+PERPLEXITY_BATCH_SIZE = 8
+PERPLEXITY_THREADS = os.cpu_count() or 1
+
+# Perplexity backend: "gpt2" (full precision), "gpt2-int8" or "distilgpt2";
+# see PERPLEXITY_BACKENDS in perplexity.py and set_perplexity_backend()
+PERPLEXITY_BACKEND = "gpt2"
 
 # Load English NLP model
-print("Loading spaCy model...")
-nlp = spacy.load("en_core_web_sm")
-
-# Initialize LanguageTool API
-print("Initializing LanguageTool...")
-lt = LanguageTool("en-US")
+@functools.lru_cache(maxsize=None)
+def get_nlp():
+    import spacy
+    print("Loading spaCy model...")
+    return spacy.load("en_core_web_sm")
+
+# Initialize the pool of local LanguageTool servers behind the sentence cache
+@functools.lru_cache(maxsize=None)
+def get_grammar_pool():
+    from grammar_cache import SentenceCache, SentenceGrammarChecker
+    from grammar_pool import LanguageToolPool
+    print("Initializing LanguageTool...")
+    pool = LanguageToolPool("en-US", size=GRAMMAR_SERVERS,
+                            max_concurrency=GRAMMAR_CONCURRENCY)
+    return SentenceGrammarChecker(pool, SentenceCache(GRAMMAR_SENTENCE_CACHE_SIZE,
+                                                      GRAMMAR_SENTENCE_CACHE_PATH))
 
 # Initialize VADER sentiment analyzer
-print("Initializing sentiment analyzer...")
-sentiment_analyzer = SentimentIntensityAnalyzer()
-
-# Initialize GPT-2 for perplexity calculation
-print("Loading GPT-2 model for perplexity...")
-tokenizer = GPT2Tokenizer.from_pretrained("gpt2")
-model = GPT2LMHeadModel.from_pretrained("gpt2")
-model.eval()
-
-# Try to import PassivePy
-passive_py_available = False
-try:
-    from PassivePySrc import PassivePy
+@functools.lru_cache(maxsize=None)
+def get_sentiment_analyzer():
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+    print("Initializing sentiment analyzer...")
+    return SentimentIntensityAnalyzer()
+
+# Initialize GPT-2 (or the selected backend) for perplexity calculation
+@functools.lru_cache(maxsize=None)
+def get_perplexity_engine():
+    from perplexity import PerplexityEngine, load_backend
+    print(f"Loading {PERPLEXITY_BACKEND} model for perplexity...")
+    model, tokenizer = load_backend(PERPLEXITY_BACKEND)
+    return PerplexityEngine(model, tokenizer, batch_size=PERPLEXITY_BATCH_SIZE)
+
+# Rule file for the email structure features; see email_rules.py
+EMAIL_RULES_PATH = DEFAULT_RULES_PATH
+
+# Compile the email structure rules
+@functools.lru_cache(maxsize=None)
+def get_email_rules():
+    return EmailRuleEngine.from_file(EMAIL_RULES_PATH)
+
+# Lexicon file for the formality and filler-word counts; see lexicon.py
+LEXICONS_PATH = DEFAULT_LEXICONS_PATH
+
+# Compile the word lexicons into spaCy hash IDs
+@functools.lru_cache(maxsize=None)
+def get_lexicons():
+    from lexicon import LexiconEngine
+    return LexiconEngine.from_file(LEXICONS_PATH)
+
+# Initialize the single-pass readability engine (see readability.py)
+@functools.lru_cache(maxsize=None)
+def get_readability_engine():
+    from readability import ReadabilityEngine
+    return ReadabilityEngine()
+
+# Initialize the lexical-diversity engine (see lexical_diversity.py)
+@functools.lru_cache(maxsize=None)
+def get_lexical_diversity_engine():
+    from lexical_diversity import LexicalDiversityEngine
+    return LexicalDiversityEngine()
+
+# Try to initialize PassivePy; returns None when it is not installed
+@functools.lru_cache(maxsize=None)
+def get_passivepy():
+    try:
+        from PassivePySrc import PassivePy
+    except ImportError:
+        print("PassivePy not available. Using fallback passive voice detection.")
+        return None
     passivepy = PassivePy.PassivePyAnalyzer(spacy_model="en_core_web_sm")
-    passive_py_available = True
     print("PassivePy initialized successfully.")
-except ImportError:
-    print("PassivePy not available. Using fallback passive voice detection.")
-
-# Define function to load JSON files
-def load_json(file_path):
-    with open(file_path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-# Define function to analyze formality
-def analyze_formality(text):
-    doc = nlp(text)
-    formal_words = set(["therefore", "hence", "thus", "moreover", "consequently",
-                      "nevertheless", "whereas", "furthermore", "accordingly",
-                      "alternatively", "subsequently", "notwithstanding"])
-
-    informal_words = set(["hey", "thanks", "cheers", "gonna", "wanna", "kinda",
-                        "yeah", "nope", "cool", "awesome", "stuff", "things",
-                        "okay", "ok", "sure", "alright"])
-
-    contractions = sum(1 for token in doc if "'" in token.text.lower())
-    first_person = sum(1 for token in doc if token.text.lower() in ["i", "me", "my", "mine"])
-    third_person = sum(1 for token in doc if token.text.lower() in ["one", "it", "they", "them"])
-
-    formal_count = sum(1 for token in doc if token.text.lower() in formal_words)
-    informal_count = sum(1 for token in doc if token.text.lower() in informal_words)
+    return passivepy
+
+# Define function to shut down loaded resources that hold external processes
+def close_resources():
+    if get_grammar_pool.cache_info().currsize:
+        checker = get_grammar_pool()
+        stats = checker.stats()
+        if stats["sentences"]:
+            print(f"Grammar sentence cache: {stats['checked']} of {stats['sentences']} "
+                  f"sentences checked ({stats['hit_rate']:.0%} reused)")
+        checker.close()
+        get_grammar_pool.cache_clear()
+
+# Metric registry: each metric records its cache version (bump it whenever the
+# implementation changes so only that metric is recomputed), whether it needs
+# the spaCy parse, the lazy loaders of the models it uses, the score columns
+# it contributes (column -> key in the metric's result, or None when the
+# result itself is the value), and optionally a batch form: an
+# (extract, compute) pair where extract(ctx) pulls the per-email input and
+# compute(inputs) scores a whole list of them at once
+class Metric:
+    __slots__ = ("name", "version", "analyze", "needs_doc", "loaders", "columns", "batch")
+
+    def __init__(self, name, version, analyze, needs_doc, loaders, columns, batch=None):
+        self.name = name
+        self.version = version
+        self.analyze = analyze
+        self.needs_doc = needs_doc
+        self.loaders = loaders
+        self.columns = columns
+        self.batch = batch
+
+METRICS = {}
+
+# Result of a metric that failed on one email: value is the fallback reported
+# for this run. Fallbacks are never written to the metric cache, so a
+# transient LanguageTool or model failure is retried on the next run.
+class Fallback:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+# Define decorator to register an analyze_* function as a metric
+def register_metric(name, version=1, needs_doc=False, loaders=(), columns=None, batch=None):
+    def decorator(analyze):
+        if needs_doc:
+            all_loaders = (get_nlp,) + tuple(loaders)
+        else:
+            all_loaders = tuple(loaders)
+        METRICS[name] = Metric(name, version, analyze, needs_doc, all_loaders,
+                               columns or {name: None}, batch)
+        return analyze
+    return decorator
+
+# Define function to load every model the given metrics need up front
+def load_resources(metric_names):
+    for name in metric_names:
+        for loader in METRICS[name].loaders:
+            loader()
+
+# Per-email analysis context: the email is parsed by spaCy exactly once and
+# every analyze_* function reads the shared Doc, tokens, sentences and counts.
+# When no selected metric needs the parse, doc is None and only the text-level
+# fields are filled in.
+class EmailContext:
+    __slots__ = ("text", "doc", "tokens", "sentences", "word_count", "_lexicon_counts")
+
+    def __init__(self, text, doc=None):
+        self.text = text
+        self.doc = doc
+        self.word_count = len(text.split())
+        self._lexicon_counts = None
+        if doc is None:
+            self.tokens = self.sentences = None
+            return
+        self.tokens = list(doc)
+        self.sentences = list(doc.sents)
+
+    # Every lexicon count for the email, computed once in a single vectorized
+    # pass and shared by the metrics that use them
+    @property
+    def lexicon_counts(self):
+        if self._lexicon_counts is None:
+            self._lexicon_counts = get_lexicons().count(self.doc)
+        return self._lexicon_counts
+
+# Define function to build the analysis context for one email (single parse)
+def build_context(text):
+    return EmailContext(text, get_nlp()(text))
+
+# Corpus-level parsing settings: emails are streamed through nlp.pipe in
+# batches. With PARSE_N_PROCESS > 1 the batches are spread over a pool of
+# parse workers that is started once per run and reused for every chunk, so
+# the spaCy model is loaded once per worker rather than once per chunk.
+PARSE_BATCH_SIZE = 64
+PARSE_N_PROCESS = os.cpu_count() or 1
+
+# Define function to start every worker of a process pool now.
+# ProcessPoolExecutor otherwise forks its workers when work is first
+# submitted, which could be after the LanguageTool pool's threads have
+# started; evaluate_models creates (and so warms) its pools before any
+# grammar check.
+def warm_pool(executor, workers):
+    for future in [executor.submit(os.getpid) for _ in range(workers)]:
+        future.result()
+    return executor
+
+# Define function to initialize a parse worker: the spaCy model is loaded
+# once per process (under fork it is inherited from the parent)
+def _init_parse_worker():
+    get_nlp()
+
+# Define function run in a parse worker to parse one batch of texts. The Docs
+# are returned serialized with Doc.to_bytes, as nlp.pipe's own workers do.
+def _parse_batch(texts, batch_size):
+    return [doc.to_bytes() for doc in get_nlp().pipe(texts, batch_size=batch_size)]
+
+# Define function to start the long-lived parse worker pool; returns None when
+# n_process is 1 and emails are parsed in-process
+def create_parse_pool(n_process):
+    if n_process <= 1:
+        return None
+    if "fork" in multiprocessing.get_all_start_methods():
+        get_nlp()  # Load the model in the parent so forked workers inherit it
+        mp_context = multiprocessing.get_context("fork")
+    else:
+        mp_context = None
+    return warm_pool(ProcessPoolExecutor(max_workers=n_process, mp_context=mp_context,
+                                         initializer=_init_parse_worker), n_process)
+
+# Define function to parse a stream of (text, key) pairs, in-process or in
+# batches on parse_pool. Yields (key, context) in input order.
+def parse_corpus(items, batch_size=PARSE_BATCH_SIZE, parse_pool=None):
+    nlp = get_nlp()
+    if parse_pool is None:
+        for doc, key in nlp.pipe(items, as_tuples=True, batch_size=batch_size):
+            yield key, EmailContext(doc.text, doc)
+        return
+
+    from spacy.tokens import Doc
+    items = list(items)
+    starts = range(0, len(items), batch_size)
+    futures = [parse_pool.submit(_parse_batch,
+                                 [text for text, _ in items[start:start + batch_size]],
+                                 batch_size)
+               for start in starts]
+    for start, future in zip(starts, futures):
+        for (_, key), data in zip(items[start:start + batch_size], future.result()):
+            doc = Doc(nlp.vocab).from_bytes(data)
+            yield key, EmailContext(doc.text, doc)
+
+# Define function to analyze formality. The word lists live in lexicons.json;
+# the cache version includes its hash, so editing them recomputes the metrics
+# that use them.
+@register_metric("formality", version=f"2-{lexicons_digest(LEXICONS_PATH)}", needs_doc=True,
+                 loaders=(get_lexicons,))
+def analyze_formality(ctx):
+    counts = ctx.lexicon_counts
+    contractions = counts["contraction"]
+    first_person = counts["first_person"]
+    third_person = counts["third_person"]
+
+    formal_count = counts["formal"]
+    informal_count = counts["informal"]
 
     # Calculate formality score with more factors
     formality_score = (formal_count - informal_count - contractions * 0.5 + third_person * 0.3 - first_person * 0.2)
 
     # Normalize by text length
-    word_count = len([token for token in doc if token.is_alpha])
+    word_count = counts["alpha_words"]
     if word_count > 0:
         formality_score = formality_score / (word_count / 100)  # Per 100 words
 
     return formality_score
 
 # Define function to analyze lexical diversity
-def analyze_lexical_diversity(text):
+@register_metric("lexical_diversity", loaders=(get_lexical_diversity_engine,),
+                 columns={"lexical_diversity": "average"})
+def analyze_lexical_diversity(ctx):
     try:
-        if len(text.split()) < 10:  # Require minimum tokens
+        if ctx.word_count < 10:  # Require minimum tokens
             return {"ttr": 0, "rttr": 0, "mtld": 0, "hdd": 0, "average": 0}
 
-        lex = LexicalRichness(text)
-        metrics = {
-            "ttr": lex.ttr,
-            "rttr": lex.rttr,
-            "mtld": lex.mtld(threshold=0.72),
-            "hdd": min(1.0, lex.hdd(draws=42))  # Cap at 1.0 for normalization
-        }
-
-        # Average the metrics
-        metrics["average"] = sum(v for k, v in metrics.items() if k != "average") / 4
-        return metrics
-    except Exception as e:
+        # TTR, RTTR, MTLD (threshold 0.72) and HD-D (42 draws, capped at 1.0
+        # for normalization) from one tokenization, plus their average
+        return get_lexical_diversity_engine().analyze(ctx.text)
+    except (ValueError, ZeroDivisionError) as e:
+        # Too few tokens for HD-D or MTLD: the same text always fails the
+        # same way, so the zeros are cached like any other value
         print(f"Lexical diversity calculation error: {e}")
         return {"ttr": 0, "rttr": 0, "mtld": 0, "hdd": 0, "average": 0}
+    except Exception as e:
+        print(f"Lexical diversity calculation error: {e}")
+        return Fallback({"ttr": 0, "rttr": 0, "mtld": 0, "hdd": 0, "average": 0})
 
 # Define function to analyze sentiment
-def analyze_sentiment(text):
-    sentiment_scores = sentiment_analyzer.polarity_scores(text)
+@register_metric("sentiment", loaders=(get_sentiment_analyzer,), columns={"sentiment_compound": "compound",
+                                       "sentiment_balance": "balance"})
+def analyze_sentiment(ctx):
+    sentiment_scores = get_sentiment_analyzer().polarity_scores(ctx.text)
 
     # Calculate sentiment balance (how balanced vs. extreme)
     balance = 1 - abs(sentiment_scores['compound'])
@@ -129,18 +326,22 @@ def analyze_sentiment(text):
     }
 
 # Define function to analyze passive voice
-def analyze_passive_voice(text):
-    if passive_py_available:
+@register_metric("passive_voice", needs_doc=True, loaders=(get_passivepy,), columns={"passive_ratio": None})
+def analyze_passive_voice(ctx):
+    sentence_count = max(1, len(ctx.sentences))
+    passivepy = get_passivepy()
+    if passivepy is not None:
         try:
-            results = passivepy.match_text(text, full_passive=True, truncated_passive=True)
+            # PassivePy runs its own matcher pipeline on the raw text; the
+            # sentence count comes from the shared parse
+            results = passivepy.match_text(ctx.text, full_passive=True, truncated_passive=True)
             passive_count = results.get('passive_count', 0)
-            sentence_count = max(1, len([s for s in nlp(text).sents]))
             return passive_count / sentence_count
         except Exception as e:
             print(f"PassivePy error: {e}")
 
     # Fallback: simple rule-based passive detection
-    doc = nlp(text)
+    doc = ctx.doc
     passive_count = 0
 
     # Look for patterns like "was/were + past participle"
@@ -150,50 +351,49 @@ def analyze_passive_voice(text):
             if i + 1 < len(doc) and doc[i+1].tag_ == "VBN":
                 passive_count += 1
 
-    sentence_count = max(1, len([s for s in doc.sents]))
     return passive_count / sentence_count
 
-# Define function to calculate perplexity
+# Define function to get the perplexity cache version for a backend; full
+# GPT-2 keeps the original version so existing cached scores stay valid
+def perplexity_version(backend):
+    return 1 if backend == "gpt2" else f"1-{backend}"
+
+# Define function to select the perplexity backend; each backend's scores are
+# cached under their own version
+def set_perplexity_backend(backend):
+    global PERPLEXITY_BACKEND
+    if backend == PERPLEXITY_BACKEND:
+        return
+    PERPLEXITY_BACKEND = backend
+    get_perplexity_engine.cache_clear()
+    METRICS["perplexity"].version = perplexity_version(backend)
+
+# Define function to calculate perplexity of a single email
+# (evaluate_models scores the whole corpus in batches instead)
 def calculate_perplexity(text):
+    return get_perplexity_engine().score([text])[0]
+
+# Define function to analyze perplexity from the analysis context
+@register_metric("perplexity", version=perplexity_version(PERPLEXITY_BACKEND),
+                 loaders=(get_perplexity_engine,))
+def analyze_perplexity(ctx):
+    return calculate_perplexity(ctx.text)
+
+# Define function to analyze clarity & readability using multiple metrics.
+# Flesch-Kincaid, Gunning fog, SMOG, Coleman-Liau, ARI, Dale-Chall and the
+# difficult-word ratio all come from one set of base counts per email and
+# match textstat 0.7.3-0.7.4 (tests/test_readability.py checks it).
+@register_metric("readability", loaders=(get_readability_engine,),
+                 columns={"flesch_kincaid": "flesch_kincaid",
+                          "gunning_fog": "gunning_fog",
+                          "average_grade": "average_grade"})
+def analyze_readability(ctx):
+    return get_readability_engine().analyze(ctx.text)
+
+# Define function to turn a pending grammar check into grammar quality metrics
+def collect_grammar(future, word_count):
     try:
-        # Truncate long texts to avoid CUDA memory issues
-        max_length = 512
-        if len(text) > max_length * 4:  # Roughly 4 chars per token
-            text = text[:max_length * 4]
-
-        # Tokenize and calculate perplexity
-        inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=max_length)
-        with torch.no_grad():
-            outputs = model(**inputs, labels=inputs["input_ids"])
-
-        return torch.exp(outputs.loss).item()
-    except Exception as e:
-        print(f"Perplexity calculation error: {e}")
-        return 100  # Default high value
-
-# Define function to analyze clarity & readability using multiple metrics
-def analyze_readability(text):
-    metrics = {
-        "flesch_kincaid": textstat.flesch_kincaid_grade(text),
-        "gunning_fog": textstat.gunning_fog(text),
-        "smog": textstat.smog_index(text),
-        "coleman_liau": textstat.coleman_liau_index(text),
-        "ari": textstat.automated_readability_index(text),
-        "dale_chall": textstat.dale_chall_readability_score(text),
-        "difficult_words": textstat.difficult_words(text) / max(1, len(text.split()))
-    }
-
-    # Calculate average readability across grade-level metrics
-    grade_metrics = ["flesch_kincaid", "gunning_fog", "smog", "coleman_liau", "ari"]
-    metrics["average_grade"] = sum(metrics[m] for m in grade_metrics) / len(grade_metrics)
-
-    return metrics
-
-# Define function to analyze grammar quality
-def analyze_grammar(text):
-    try:
-        matches = lt.check(text)
-        word_count = len(text.split())
+        matches = future.result()
 
         # Normalize by text length (errors per 100 words)
         error_density = len(matches) / (word_count / 100) if word_count > 0 else 0
@@ -205,26 +405,35 @@ def analyze_grammar(text):
         }
     except Exception as e:
         print(f"Grammar check error: {e}")
-        return {"error_count": 0, "error_density": 0, "error_types": {}}
+        return Fallback({"error_count": 0, "error_density": 0, "error_types": {}})
+
+# Define function to analyze grammar quality
+# Matches come from sentence-level checks (version 2), reassembled with their
+# offsets in the email text; version 3 keeps abbreviations such as "Corp." and
+# list markers inside their sentence. The error count leaves out rules that
+# look across sentences; see SentenceGrammarChecker for the tolerated
+# difference from a whole-text check.
+@register_metric("grammar", version=3, loaders=(get_grammar_pool,),
+                 columns={"grammar_error_density": "error_density"})
+def analyze_grammar(ctx):
+    return collect_grammar(get_grammar_pool().submit(ctx.text), ctx.word_count)
 
 # Define function to analyze conciseness
-def analyze_conciseness(text):
-    word_count = len(text.split())
-    doc = nlp(text)
+@register_metric("conciseness", version=f"2-{lexicons_digest(LEXICONS_PATH)}", needs_doc=True,
+                 loaders=(get_lexicons,), columns={"word_count": "word_count",
+                                                   "conciseness_score": "conciseness_score"})
+def analyze_conciseness(ctx):
+    word_count = ctx.word_count
 
     # Calculate average sentence length
-    sentences = list(doc.sents)
+    sentences = ctx.sentences
     if not sentences:
         return {"word_count": word_count, "avg_sentence_length": 0, "conciseness_score": 0}
 
     avg_sentence_length = word_count / len(sentences)
 
     # Calculate "filler word" ratio
-    filler_words = ["basically", "actually", "literally", "really", "very",
-                   "quite", "simply", "just", "so", "that", "totally",
-                   "definitely", "certainly", "probably", "honestly"]
-
-    filler_count = sum(1 for token in doc if token.text.lower() in filler_words)
+    filler_count = ctx.lexicon_counts["filler"]
     filler_ratio = filler_count / word_count if word_count > 0 else 0
 
     # Conciseness score (lower is better)
@@ -239,219 +448,381 @@ def analyze_conciseness(text):
         "conciseness_score": conciseness_score
     }
 
-# Define function to analyze text coherence
-def analyze_coherence(text):
-    sentences = list(nlp(text).sents)
-    if len(sentences) < 3:
-        return 1.0  # Not enough sentences for meaningful coherence
-
-    # Get sentence embeddings
-    embeddings = [sent.vector for sent in sentences]
-
-    # Calculate average cosine similarity between adjacent sentences
-    similarities = []
-    for i in range(len(embeddings)-1):
-        # Calculate cosine similarity
-        norm_prod = np.linalg.norm(embeddings[i]) * np.linalg.norm(embeddings[i+1])
-        if norm_prod == 0:  # Handle zero vectors
-            similarity = 0
+# Define function to stack an email's sentence vectors into an
+# (n_sentences x dim) matrix for the vectorized coherence computation
+def sentence_matrix(ctx):
+    if not ctx.sentences:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack([sent.vector for sent in ctx.sentences]).astype(np.float32, copy=False)
+
+# Define function to analyze text coherence (see coherence.py); evaluation
+# batches every email of a chunk into a few NumPy calls
+@register_metric("coherence", needs_doc=True, batch=(sentence_matrix, coherence_scores))
+def analyze_coherence(ctx):
+    return coherence_scores([sentence_matrix(ctx)])[0]
+
+# Define function to analyze all-pairs coherence: mean similarity of every
+# sentence pair, batched like coherence
+@register_metric("coherence_all_pairs", needs_doc=True,
+                 batch=(sentence_matrix, all_pairs_coherence_scores))
+def analyze_coherence_all_pairs(ctx):
+    return all_pairs_coherence_scores([sentence_matrix(ctx)])[0]
+
+# Define function to analyze windowed coherence: mean similarity of sentence
+# pairs at most coherence.WINDOW sentences apart, batched like coherence
+@register_metric("coherence_windowed", needs_doc=True,
+                 batch=(sentence_matrix, windowed_coherence_scores))
+def analyze_coherence_windowed(ctx):
+    return windowed_coherence_scores([sentence_matrix(ctx)])[0]
+
+# Define function to compute email structure features for a batch of emails
+def scan_email_features(texts):
+    return get_email_rules().scan_many(texts)
+
+# Define function to detect email-specific features (greeting, sign-off, call
+# to action, subject line, paragraphing) with the compiled rule engine. The
+# cache version includes the rule file's hash, so editing the rules
+# invalidates only this metric.
+@register_metric("email_features", version=f"2-{rules_digest(EMAIL_RULES_PATH)}",
+                 columns={"email_structure": "structure_score"},
+                 batch=(lambda ctx: ctx.text, scan_email_features))
+def analyze_email_features(ctx):
+    return get_email_rules().scan(ctx.text)
+
+# Metrics with their own corpus-level stages: grammar checks run concurrently
+# on the LanguageTool pool in the main process, perplexity in padded GPT-2
+# batches
+ASYNC_METRICS = ("grammar",)
+BATCH_METRICS = ("perplexity",)
+
+# Parallel evaluation settings: pending (model, email) work items are split
+# into shards of SHARD_SIZE emails and scored on a pool of EVAL_WORKERS
+# processes (1 scores everything in the main process)
+EVAL_WORKERS = 1
+SHARD_SIZE = 32
+
+# Model files are streamed and evaluated INGEST_CHUNK_SIZE records at a time
+INGEST_CHUNK_SIZE = 1024
+
+# Define function to flatten one email's metric results into score columns
+def score_row(values, metrics):
+    row = {}
+    for metric in metrics:
+        value = values[metric.name]
+        for column, key in metric.columns.items():
+            row[column] = value if key is None else value[key]
+    return row
+
+# Define function to list the score columns produced by the given metrics
+def score_columns(metrics):
+    return [column for metric in metrics for column in metric.columns]
+
+# Profiler recording every metric call (see instrumentation.py); None when
+# profiling is off, in which case the hot loops skip it with one check
+PROFILER = None
+
+# Define function to score work items of the form (key, text, missing metric
+# names). Context metrics share one parse per email; perplexity is batched.
+# Keys are (model, email index) pairs. Emails are parsed on parse_pool when
+# given. Returns {key: {metric: value}}.
+def score_items(items, batch_size=PARSE_BATCH_SIZE, parse_pool=None):
+    profiler = PROFILER
+    results = {key: {} for key, _, _ in items}
+    context_names = {key: [name for name in missing if name not in BATCH_METRICS]
+                     for key, _, missing in items}
+    context_items = [(text, key) for key, text, _ in items if context_names[key]]
+
+    # Emails only go through the batched parse stream when a missing metric
+    # needs the spaCy Doc
+    if any(METRICS[name].needs_doc for names in context_names.values() for name in names):
+        contexts = parse_corpus(context_items, batch_size, parse_pool)
+        if profiler is not None:
+            get_nlp()  # Load the model before the first parse span starts
+            contexts = profiler.iter_spans("spacy_parse", contexts)
+    else:
+        contexts = ((key, EmailContext(text)) for text, key in context_items)
+
+    # Batch metrics only extract their inputs per email and are scored
+    # together once every context has been seen
+    batch_inputs = defaultdict(list)
+    for key, ctx in contexts:
+        for name in context_names[key]:
+            metric = METRICS[name]
+            if metric.batch is not None:
+                batch_inputs[name].append((key, metric.batch[0](ctx)))
+            elif profiler is None:
+                results[key][name] = metric.analyze(ctx)
+            else:
+                with profiler.span(name, *key):
+                    results[key][name] = metric.analyze(ctx)
+
+    # Batched work is recorded as one span per batch, under the first email's model
+    for name, inputs in batch_inputs.items():
+        compute = METRICS[name].batch[1]
+        if profiler is None:
+            batch_values = compute([value for _, value in inputs])
         else:
-            similarity = np.dot(embeddings[i], embeddings[i+1]) / norm_prod
-        similarities.append(similarity)
-
-    # Also calculate global coherence (first and last sentences)
-    if len(embeddings) > 2:
-        norm_prod = np.linalg.norm(embeddings[0]) * np.linalg.norm(embeddings[-1])
-        if norm_prod > 0:
-            global_similarity = np.dot(embeddings[0], embeddings[-1]) / norm_prod
+            with profiler.span(name, inputs[0][0][0], emails=len(inputs)):
+                batch_values = compute([value for _, value in inputs])
+        for (key, _), value in zip(inputs, batch_values):
+            results[key][name] = value
+
+    # Perplexity runs over all pending emails at once so batches can be
+    # length-sorted
+    perplexity_items = [(key, text) for key, text, missing in items if "perplexity" in missing]
+    if perplexity_items:
+        perplexity_texts = [text for _, text in perplexity_items]
+        failed = []
+        if profiler is None:
+            perplexities = get_perplexity_engine().score(perplexity_texts, failed)
         else:
-            global_similarity = 0
+            with profiler.span("perplexity", perplexity_items[0][0][0],
+                               emails=len(perplexity_items)):
+                perplexities = get_perplexity_engine().score(perplexity_texts, failed)
+        for i in failed:
+            perplexities[i] = Fallback(perplexities[i])
+        for (key, _), value in zip(perplexity_items, perplexities):
+            results[key]["perplexity"] = value
+
+    return results
+
+# Define function to initialize a pool worker: the models its metrics need are
+# loaded once per process. Under fork they were already loaded by the parent,
+# so the read-only weights are shared copy-on-write. When profiling, each
+# worker records into its own Profiler on the parent's clock origin.
+def _init_worker(metric_names, profiler_options=None, perplexity_backend=None):
+    global PROFILER
+    PROFILER = None if profiler_options is None else Profiler(**profiler_options)
+    if perplexity_backend is not None:
+        set_perplexity_backend(perplexity_backend)
+    load_resources(metric_names)
+    if "perplexity" in metric_names:
+        import torch
+        torch.set_num_threads(1)  # One process per core; avoid oversubscription
+
+# Define function run in a pool worker to score one shard; returns the
+# results and the spans recorded while scoring it
+def _score_shard(shard):
+    results = score_items(shard)
+    return results, (PROFILER.drain() if PROFILER is not None else [])
+
+# Define function to start the process pool used for sharded evaluation
+def create_worker_pool(metric_names, workers):
+    metric_names = [name for name in metric_names if name not in ASYNC_METRICS]
+    if "fork" in multiprocessing.get_all_start_methods():
+        # Load models in the parent so forked workers inherit them
+        load_resources(metric_names)
+        mp_context = multiprocessing.get_context("fork")
     else:
-        global_similarity = 1.0
-
-    # Combined coherence score (local and global)
-    local_coherence = np.mean(similarities) if similarities else 1.0
-    coherence_score = 0.7 * local_coherence + 0.3 * global_similarity
-
-    return coherence_score
-
-# Define function to detect email-specific features
-def analyze_email_features(text):
-    # Check for greeting
-    greeting_patterns = [
-        r'^(dear|hello|hi|good morning|good afternoon|good evening|hey)(\s|\s.*?\s)',
-        r'^to whom it may concern',
-        r'^greetings'
-    ]
-    has_greeting = any(re.search(pattern, text.lower()) for pattern in greeting_patterns)
-
-    # Check for sign-off
-    signoff_patterns = [
-        r'(sincerely|regards|best regards|thanks|thank you|yours truly|cheers|best wishes|respectfully)(\s|\s.*?)(,|\n|$)',
-        r'(looking forward|warmly|cordially)'
-    ]
-    has_signoff = any(re.search(pattern, text.lower()) for pattern in signoff_patterns)
-
-    # Check for call to action
-    cta_patterns = [
-        r'(please|kindly)(\s|\s.*?)(let me know|contact|get back|reply|respond|send|provide)',
-        r'(would you|could you)(\s|\s.*?)(please|kindly)',
-        r'(looking forward to|await|expecting)(\s|\s.*?)(response|reply|hearing|feedback)'
-    ]
-    has_cta = any(re.search(pattern, text.lower()) for pattern in cta_patterns)
-
-    # Check for subject line
-    subject_patterns = [
-        r'^subject:',
-        r'^re:',
-        r'^fwd:'
-    ]
-    has_subject = any(re.search(pattern, text.lower()) for pattern in subject_patterns)
-
-    # Check for paragraphing
-    paragraphs = [p for p in text.split('\n\n') if p.strip()]
-    good_paragraphing = len(paragraphs) > 1
-
-    return {
-        "has_greeting": int(has_greeting),
-        "has_signoff": int(has_signoff),
-        "has_cta": int(has_cta),
-        "has_subject": int(has_subject),
-        "good_paragraphing": int(good_paragraphing),
-        "structure_score": sum([int(has_greeting), int(has_signoff), int(has_cta),
-                               int(has_subject), int(good_paragraphing)]) / 5
-    }
-
-# Function to evaluate emails from all models
-def evaluate_models(json_files):
-    scores = defaultdict(lambda: defaultdict(list))
-
-    for model, file in json_files.items():
-        print(f"\nEvaluating model: {model}...")
-        data = load_json(file)
-        for idx, email_data in enumerate(data):
-            if idx % 10 == 0:
-                print(f"Processing email {idx+1}/{len(data)}...")
-
-            email_text = email_data["email"]
-
-            # Original metrics
-            scores[model]["formality"].append(analyze_formality(email_text))
-
-            readability = analyze_readability(email_text)
-            scores[model]["flesch_kincaid"].append(readability["flesch_kincaid"])
-            scores[model]["gunning_fog"].append(readability["gunning_fog"])
-            scores[model]["average_grade"].append(readability["average_grade"])
-
-            grammar = analyze_grammar(email_text)
-            scores[model]["grammar_error_density"].append(grammar["error_density"])
-
-            conciseness = analyze_conciseness(email_text)
-            scores[model]["word_count"].append(conciseness["word_count"])
-            scores[model]["conciseness_score"].append(conciseness["conciseness_score"])
-
-            # New metrics
-            lex_diversity = analyze_lexical_diversity(email_text)
-            scores[model]["lexical_diversity"].append(lex_diversity["average"])
-
-            sentiment = analyze_sentiment(email_text)
-            scores[model]["sentiment_compound"].append(sentiment["compound"])
-            scores[model]["sentiment_balance"].append(sentiment["balance"])
-
-            scores[model]["passive_ratio"].append(analyze_passive_voice(email_text))
-            scores[model]["perplexity"].append(calculate_perplexity(email_text))
-            scores[model]["coherence"].append(analyze_coherence(email_text))
-
-            email_features = analyze_email_features(email_text)
-            scores[model]["email_structure"].append(email_features["structure_score"])
+        mp_context = None
+    profiler_options = PROFILER.options() if PROFILER is not None else None
+    return warm_pool(ProcessPoolExecutor(max_workers=workers, mp_context=mp_context,
+                                         initializer=_init_worker,
+                                         initargs=(metric_names, profiler_options,
+                                                   PERPLEXITY_BACKEND)),
+                     workers)
+
+# Define function to submit work items to the process pool in shards
+def submit_shards(executor, items, shard_size=SHARD_SIZE):
+    return [executor.submit(_score_shard, items[start:start + shard_size])
+            for start in range(0, len(items), shard_size)]
+
+# Define function to evaluate one chunk of a model's records: cached metric
+# values are looked up first and only missing metrics are computed. Returns a
+# {metric: value} dict per record, in input order.
+def evaluate_chunk(model, records, offset, selected, cache=None, executor=None,
+                   batch_size=PARSE_BATCH_SIZE, parse_pool=None, shard_size=SHARD_SIZE):
+    selected_names = [metric.name for metric in selected]
+    texts = [record["email"] for record in records]
+    hashes = [text_hash(text) for text in texts]
+    values = [{} for _ in records]
+
+    if cache is not None:
+        for metric in selected:
+            found = cache.get_many(hashes, metric.name, metric.version)
+            for email_values, h in zip(values, hashes):
+                if h in found:
+                    email_values[metric.name] = found[h]
+
+    # Work items: every email still missing a metric other than grammar
+    items = []
+    for i, (text, email_values) in enumerate(zip(texts, values)):
+        missing = [name for name in selected_names
+                   if name not in ASYNC_METRICS and name not in email_values]
+        if missing:
+            items.append(((model, offset + i), text, missing))
+
+    # Shards are submitted first so the workers start on them while the
+    # grammar checks are queued (the workers themselves were started, and
+    # warmed, by evaluate_models before any grammar check)
+    shard_futures = submit_shards(executor, items, shard_size) if executor and items else None
+
+    # Grammar checks are I/O-bound on the LanguageTool servers, so they are
+    # queued up front and run while the emails are parsed and scored
+    grammar_missing = []
+    if "grammar" in selected_names:
+        grammar_missing = [i for i, email_values in enumerate(values)
+                           if "grammar" not in email_values]
+    grammar_futures = []
+    if grammar_missing and PROFILER is None:
+        grammar_futures = get_grammar_pool().submit_many([texts[i] for i in grammar_missing])
+    elif grammar_missing:
+        # Each check is timed on the thread that runs it
+        grammar_futures = [get_grammar_pool().submit(
+                               texts[i], wrap=PROFILER.wrap("grammar", model, offset + i))
+                           for i in grammar_missing]
+
+    if shard_futures is None:
+        results = score_items(items, batch_size, parse_pool)
+    else:
+        # Shards are collected in submission order, so the merged results do
+        # not depend on scheduling
+        results = {}
+        for future in shard_futures:
+            shard_results, spans = future.result()
+            results.update(shard_results)
+            if spans:
+                PROFILER.extend(spans)
+
+    # Only successful computations are cached; fallbacks are reported for
+    # this run and recomputed on the next one
+    new_values = defaultdict(list)
+    for (_, idx), email_results in results.items():
+        for name, value in email_results.items():
+            if isinstance(value, Fallback):
+                value = value.value
+            else:
+                new_values[name].append((hashes[idx - offset], value))
+            values[idx - offset][name] = value
+
+    for i, future in zip(grammar_missing, grammar_futures):
+        value = collect_grammar(future, len(texts[i].split()))
+        if isinstance(value, Fallback):
+            value = value.value
+        else:
+            new_values["grammar"].append((hashes[i], value))
+        values[i]["grammar"] = value
+
+    if cache is not None:
+        for name, metric_values in new_values.items():
+            cache.put_many(name, METRICS[name].version, metric_values)
+
+    return values
+
+# Function to evaluate emails from all models. Model files are streamed in
+# chunks of chunk_size records, so memory for parsing and scoring stays
+# bounded however large the files are. With workers > 1, pending emails are
+# sharded across a process pool; otherwise, with n_process > 1, they are
+# parsed on a parse worker pool (or on parse_pool, a running pool from
+# create_parse_pool, when given). Either pool is started, with all of its
+# workers, before the first grammar check and reused for every chunk. Every
+# email's scores are also added to aggregator (a StreamingAggregator) when
+# given, and on_chunk(model, processed) is called after each chunk. Returns a columnar ResultsTable with
+# one row per email, or None when keep_rows is False.
+def evaluate_models(json_files, metrics=None, batch_size=PARSE_BATCH_SIZE,
+                    n_process=PARSE_N_PROCESS, cache=None, workers=EVAL_WORKERS,
+                    shard_size=SHARD_SIZE, chunk_size=INGEST_CHUNK_SIZE,
+                    aggregator=None, keep_rows=True, on_chunk=None, parse_pool=None):
+    selected = [METRICS[name] for name in (metrics or METRICS)]
+    scores = ResultsTable(score_columns(selected)) if keep_rows else None
+
+    executor = own_parse_pool = None
+    if workers > 1:
+        executor = create_worker_pool([metric.name for metric in selected], workers)
+        print(f"Scoring on {workers} worker processes (shards of {shard_size} emails)")
+        parse_pool = None
+    elif parse_pool is None and any(metric.needs_doc for metric in selected):
+        parse_pool = own_parse_pool = create_parse_pool(n_process)
 
-        print(f"Completed evaluation for {model}")
+    try:
+        for model, file in json_files.items():
+            print(f"\nEvaluating model: {model}...")
+            processed = 0
+            for records in iter_chunks(iter_records(file), chunk_size):
+                values = evaluate_chunk(model, records, processed, selected, cache, executor,
+                                        batch_size, parse_pool, shard_size)
+                for i, (record, email_values) in enumerate(zip(records, values)):
+                    row = score_row(email_values, selected)
+                    if scores is not None:
+                        scores.append(model, record["scenario"], record["category"],
+                                      processed + i, row)
+                    if aggregator is not None:
+                        aggregator.add_row(model, row)
+                processed += len(records)
+                print(f"Processed {processed} emails...")
+                if on_chunk is not None:
+                    on_chunk(model, processed)
+            print(f"Completed evaluation for {model}")
+    finally:
+        for pool in (executor, own_parse_pool):
+            if pool is not None:
+                pool.shutdown()
 
     return scores
 
+# Default location of the per-email results table
+DEFAULT_RESULTS_PATH = "email_scores.npz"
+
 # Define JSON files for each AI model
-json_files = {
+DEFAULT_JSON_FILES = {
     "OpenAI-GPT-4o-mini": "gpt.json",
     "Google-Gemini-2.0-Flash": "gemini.json",
     "Claude-3.7-Sonnet": "claude.json",
     "Meta-Llama3-70b": "llama.json"
 }
 
-# Evaluate models
-print("Starting model evaluation...")
-results = evaluate_models(json_files)
-
-# Aggregate scores
-final_scores = {}
-for model, metrics in results.items():
-    final_scores[model] = {
-        # Original metrics
-        "avg_formality": np.mean(metrics["formality"]),
-        "avg_flesch_kincaid": np.mean(metrics["flesch_kincaid"]),
-        "avg_gunning_fog": np.mean(metrics["gunning_fog"]),
-        "avg_readability": np.mean(metrics["average_grade"]),
-        "avg_grammar_errors": np.mean(metrics["grammar_error_density"]),
-        "avg_word_count": np.mean(metrics["word_count"]),
-        "avg_conciseness": np.mean(metrics["conciseness_score"]),
-
-        # New metrics
-        "avg_lexical_diversity": np.mean(metrics["lexical_diversity"]),
-        "avg_sentiment": np.mean(metrics["sentiment_compound"]),
-        "avg_sentiment_balance": np.mean(metrics["sentiment_balance"]),
-        "avg_passive_ratio": np.mean(metrics["passive_ratio"]),
-        "avg_perplexity": np.mean(metrics["perplexity"]),
-        "avg_coherence": np.mean(metrics["coherence"]),
-        "avg_email_structure": np.mean(metrics["email_structure"])
-    }
+# Aggregated report fields: key -> per-email score column it averages
+AGGREGATES = {
+    # Original metrics
+    "avg_formality": "formality",
+    "avg_flesch_kincaid": "flesch_kincaid",
+    "avg_gunning_fog": "gunning_fog",
+    "avg_readability": "average_grade",
+    "avg_grammar_errors": "grammar_error_density",
+    "avg_word_count": "word_count",
+    "avg_conciseness": "conciseness_score",
+
+    # New metrics
+    "avg_lexical_diversity": "lexical_diversity",
+    "avg_sentiment": "sentiment_compound",
+    "avg_sentiment_balance": "sentiment_balance",
+    "avg_passive_ratio": "passive_ratio",
+    "avg_perplexity": "perplexity",
+    "avg_coherence": "coherence",
+    "avg_coherence_all_pairs": "coherence_all_pairs",
+    "avg_coherence_windowed": "coherence_windowed",
+    "avg_email_structure": "email_structure"
+}
+
+# Printed report lines: (aggregated key, label, format)
+REPORT_LINES = [
+    ("avg_formality", "Formality Score", ".2f"),
+    ("avg_readability", "Readability Grade", ".2f"),
+    ("avg_grammar_errors", "Grammar Errors (per 100 words)", ".2f"),
+    ("avg_word_count", "Word Count", ".2f"),
+    ("avg_conciseness", "Conciseness Score", ".2f"),
+    ("avg_lexical_diversity", "Lexical Diversity", ".2f"),
+    ("avg_sentiment_balance", "Sentiment Balance", ".2f"),
+    ("avg_passive_ratio", "Passive Voice Ratio", ".2f"),
+    ("avg_perplexity", "Perplexity", ".2f"),
+    ("avg_coherence", "Coherence Score", ".2f"),
+    ("avg_coherence_all_pairs", "All-Pairs Coherence", ".2f"),
+    ("avg_coherence_windowed", "Windowed Coherence", ".2f"),
+    ("avg_email_structure", "Email Structure Score", ".2f"),
+]
 
-# Print scores in a structured format
-print("\nModel Evaluation Results:")
-print("=" * 80)
-for model, scores in final_scores.items():
-    print(f"\n{model}:")
-    print(f"  - Formality Score: {scores['avg_formality']:.2f}")
-    print(f"  - Readability Grade: {scores['avg_readability']:.2f}")
-    print(f"  - Grammar Errors (per 100 words): {scores['avg_grammar_errors']:.2f}")
-    print(f"  - Word Count: {scores['avg_word_count']:.2f}")
-    print(f"  - Conciseness Score: {scores['avg_conciseness']:.2f}")
-    print(f"  - Lexical Diversity: {scores['avg_lexical_diversity']:.2f}")
-    print(f"  - Sentiment Balance: {scores['avg_sentiment_balance']:.2f}")
-    print(f"  - Passive Voice Ratio: {scores['avg_passive_ratio']:.2f}")
-    print(f"  - Perplexity: {scores['avg_perplexity']:.2f}")
-    print(f"  - Coherence Score: {scores['avg_coherence']:.2f}")
-    print(f"  - Email Structure Score: {scores['avg_email_structure']:.2f}")
-print("=" * 80)
-
-# Normalize scores for fair comparison
-normalized_scores = {}
-metrics_to_normalize = [
+# Metrics that are normalized and weighted into the final score
+METRICS_TO_NORMALIZE = [
     "avg_formality", "avg_readability", "avg_grammar_errors", "avg_conciseness",
     "avg_lexical_diversity", "avg_sentiment_balance", "avg_passive_ratio",
     "avg_perplexity", "avg_coherence", "avg_email_structure"
 ]
 
-for metric in metrics_to_normalize:
-    values = np.array([final_scores[model][metric] for model in final_scores])
-
-    # Handle the special case where min_val equals max_val
-    min_val, max_val = values.min(), values.max()
-    if max_val == min_val:
-        normalized_scores[metric] = {model: 0.5 for model in final_scores}
-    else:
-        # For metrics where lower is better, invert the normalization
-        if metric in ["avg_grammar_errors", "avg_passive_ratio", "avg_perplexity"]:
-            normalized_scores[metric] = {
-                model: 1 - ((final_scores[model][metric] - min_val) / (max_val - min_val))
-                for model in final_scores
-            }
-        else:
-            normalized_scores[metric] = {
-                model: (final_scores[model][metric] - min_val) / (max_val - min_val)
-                for model in final_scores
-            }
+# Metrics where lower is better; their normalization is inverted
+LOWER_IS_BETTER = ["avg_grammar_errors", "avg_passive_ratio", "avg_perplexity"]
 
 # Define weights for each metric
-weights = {
+WEIGHTS = {
     "avg_formality": 0.15,              # Importance of formal tone
     "avg_readability": 0.10,            # Appropriate reading level
     "avg_grammar_errors": 0.15,         # Grammatical correctness
@@ -464,104 +835,308 @@ weights = {
     "avg_email_structure": 0.10         # Professional structure
 }
 
-# Compute weighted scores
-model_scores = {}
-print("\nFinal Weighted Scores:")
-print("=" * 50)
-for model in final_scores:
-    model_scores[model] = sum(weights[metric] * normalized_scores[metric][model] for metric in weights)
-    print(f"{model}: {model_scores[model]:.4f}")
-print("=" * 50)
-
-# Determine the best model
-best_model = max(model_scores, key=model_scores.get)
-print(f"\nBest AI Model for Formal Emails: {best_model}\n")
-
-# Visualization - Multiple metrics comparison
-models = list(final_scores.keys())
-metrics = metrics_to_normalize
-colors = plt.cm.tab10(np.linspace(0, 1, len(models)))
-
-# Create a figure with multiple subplots
-num_metrics = len(metrics)
-rows = int(np.ceil(num_metrics / 2))  # Calculate number of rows needed
-plt.figure(figsize=(15, rows * 4))
-
-for i, metric in enumerate(metrics):
-    plt.subplot(rows, 2, i + 1)
-    values = [final_scores[model][metric] for model in models]
-    bars = plt.bar(models, values, color=colors)
-
-    # Format the title based on the metric name
-    title = metric.replace("avg_", "").replace("_", " ").title()
-    plt.title(title, fontsize=14, fontweight='bold')
-    plt.xticks(rotation=30, fontsize=9)
-    plt.ylabel("Score", fontsize=12)
-    plt.grid(axis='y', linestyle='--', alpha=0.7)
-
-    # Add value labels on bars
-    for bar in bars:
-        yval = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2, yval * 0.9, f"{yval:.2f}",
-                ha='center', va='top', fontsize=9, color='white', fontweight='bold')
-
-plt.tight_layout()
-plt.savefig("metrics_comparison.png", dpi=300)
-plt.show()
-
-# Final model score comparison graph
-plt.figure(figsize=(10, 6))
-final_values = [model_scores[model] for model in models]
-bars = plt.bar(models, final_values, color=colors)
-plt.title("Final Model Scores", fontsize=16, fontweight='bold')
-plt.xticks(rotation=30, fontsize=12)
-plt.ylabel("Score", fontsize=14)
-plt.grid(axis='y', linestyle='--', alpha=0.7)
-
-for bar in bars:
-    yval = bar.get_height()
-    plt.text(bar.get_x() + bar.get_width()/2, yval * 0.9, f"{yval:.4f}",
-            ha='center', va='top', fontsize=11, color='white', fontweight='bold')
-
-plt.tight_layout()
-plt.savefig("final_scores.png", dpi=300)
-plt.show()
-
-# Create radar chart for visual comparison
-plt.figure(figsize=(10, 8))
-ax = plt.subplot(111, polar=True)
-
 # Select key metrics for radar chart
-radar_metrics = ["avg_formality", "avg_readability", "avg_grammar_errors",
-                "avg_lexical_diversity", "avg_coherence", "avg_email_structure"]
-
-# Number of variables
-N = len(radar_metrics)
-
-# What will be the angle of each axis in the plot
-angles = [n / float(N) * 2 * np.pi for n in range(N)]
-angles += angles[:1]  # Close the loop
-
-# Draw one axis per variable + add labels
-plt.xticks(angles[:-1], [m.replace("avg_", "").replace("_", " ").title() for m in radar_metrics], size=12)
-
-# Draw ylabels
-ax.set_rlabel_position(0)
-plt.yticks([0.25, 0.5, 0.75], ["0.25", "0.5", "0.75"], color="grey", size=10)
-plt.ylim(0, 1)
-
-# Plot each model
-for i, model in enumerate(models):
-    values = [normalized_scores[metric][model] for metric in radar_metrics]
-    values += values[:1]  # Close the loop
-
-    ax.plot(angles, values, linewidth=2, linestyle='solid', label=model, color=colors[i])
-    ax.fill(angles, values, color=colors[i], alpha=0.1)
-
-# Add legend
-plt.legend(loc='upper right', bbox_to_anchor=(0.1, 0.1))
-plt.title("Model Comparison", size=16, y=1.1)
+RADAR_METRICS = ["avg_formality", "avg_readability", "avg_grammar_errors",
+                 "avg_lexical_diversity", "avg_coherence", "avg_email_structure"]
+
+# Define function to get per-model averages from a StreamingAggregator
+def aggregate_scores(aggregator):
+    return aggregator.means(AGGREGATES)
+
+# Define function to get per-model spread (std, median and 95th percentile
+# from the quantile sketch) from a StreamingAggregator
+def aggregate_spread(aggregator):
+    return aggregator.spread(AGGREGATES)
+
+# Define function to print scores in a structured format, with each
+# metric's spread when given
+def print_results(final_scores, spread=None):
+    print("\nModel Evaluation Results:")
+    print("=" * 80)
+    for model, scores in final_scores.items():
+        print(f"\n{model}:")
+        for key, label, fmt in REPORT_LINES:
+            if key in scores:
+                line = f"  - {label}: {scores[key]:{fmt}}"
+                if spread is not None and key in spread.get(model, {}):
+                    values = spread[model][key]
+                    line += (f" (std {values['std']:{fmt}}, p50 {values['p50']:{fmt}}, "
+                             f"p95 {values['p95']:{fmt}})")
+                print(line)
+    print("=" * 80)
+
+# Define function to normalize scores for fair comparison
+def normalize_scores(final_scores):
+    normalized_scores = {}
+    available = next(iter(final_scores.values()), {})
+    for metric in METRICS_TO_NORMALIZE:
+        if metric not in available:
+            continue
+        values = np.array([final_scores[model][metric] for model in final_scores])
+
+        # Handle the special case where min_val equals max_val
+        min_val, max_val = values.min(), values.max()
+        if max_val == min_val:
+            normalized_scores[metric] = {model: 0.5 for model in final_scores}
+        else:
+            # For metrics where lower is better, invert the normalization
+            if metric in LOWER_IS_BETTER:
+                normalized_scores[metric] = {
+                    model: 1 - ((final_scores[model][metric] - min_val) / (max_val - min_val))
+                    for model in final_scores
+                }
+            else:
+                normalized_scores[metric] = {
+                    model: (final_scores[model][metric] - min_val) / (max_val - min_val)
+                    for model in final_scores
+                }
+    return normalized_scores
+
+# Define function to compute weighted scores over the metrics that were run
+def compute_weighted_scores(normalized_scores, weights=WEIGHTS):
+    models = next(iter(normalized_scores.values()), {})
+    return {
+        model: sum(weights[metric] * normalized_scores[metric][model]
+                   for metric in weights if metric in normalized_scores)
+        for model in models
+    }
 
-plt.tight_layout()
-plt.savefig("radar_comparison.png", dpi=300)
-plt.show()
+# Define function to gather each model's per-email scores for the given
+# aggregated keys into an (n_emails x n_keys) matrix
+def per_email_matrices(results, keys):
+    return {model: np.column_stack([results.model_column(model, AGGREGATES[key])
+                                    for key in keys])
+            for model in results.models}
+
+# Define function to bootstrap the per-email scores: confidence intervals for
+# each metric mean and for the weighted score, and pairwise win probabilities
+def bootstrap_scores(results, final_scores, n_resamples=DEFAULT_RESAMPLES,
+                     confidence=DEFAULT_CONFIDENCE, seed=0):
+    available = next(iter(final_scores.values()), {})
+    keys = [key for key in METRICS_TO_NORMALIZE if key in available]
+    return BootstrapResult(per_email_matrices(results, keys), keys, WEIGHTS,
+                           LOWER_IS_BETTER, n_resamples, confidence, seed)
+
+# Define function to rank the models within each group of a label (category
+# or scenario): per-(model, group) means and stds come from one grouped pass
+# over the per-email results, then each group is normalized and weighted on
+# its own. Returns {group: {"emails", "model_scores", "best_model", "means",
+# "stds"}}, where means and stds cover the weighted metrics.
+def grouped_rankings(results, label):
+    grouped = GroupedStats(results, ("model", label))
+    emails = {key: int(rows) for key, rows in zip(grouped.keys, grouped.rows)}
+    weighted = {key: AGGREGATES[key] for key in METRICS_TO_NORMALIZE}
+    stds = scores_by_group(grouped.stds(weighted))
+    rankings = {}
+    for group, final_scores in scores_by_group(grouped.means(AGGREGATES)).items():
+        model_scores = compute_weighted_scores(normalize_scores(final_scores))
+        rankings["" if group is None else str(group)] = {
+            "emails": {model: emails[(model, group)] for model in final_scores},
+            "model_scores": model_scores,
+            "best_model": max(model_scores, key=model_scores.get) if model_scores else None,
+            "means": {model: {key: scores[key] for key in weighted if key in scores}
+                      for model, scores in final_scores.items()},
+            "stds": stds[group],
+        }
+    return rankings
+
+# Define function to print the best model of every group of a label
+def print_group_rankings(label, rankings):
+    print(f"\nBest Model by {label.title()}:")
+    print("=" * 80)
+    for group, ranking in sorted(rankings.items()):
+        scores = sorted(ranking["model_scores"].values(), reverse=True)
+        margin = scores[0] - scores[1] if len(scores) > 1 else 0.0
+        print(f"{group}: {ranking['best_model']} ({scores[0]:.4f}, "
+              f"+{margin:.4f} over next; {sum(ranking['emails'].values())} emails)")
+    print("=" * 80)
+
+# Define function to print the current ranking while a run is in progress
+def print_leaderboard(aggregator, model, processed):
+    model_scores = compute_weighted_scores(normalize_scores(aggregate_scores(aggregator)))
+    print(f"\nLeaderboard after {processed} emails of {model}:")
+    for rank, (name, score) in enumerate(sorted(model_scores.items(),
+                                                key=lambda item: -item[1]), 1):
+        print(f"  {rank}. {name}: {score:.4f} ({aggregator.email_count(name)} emails)")
+
+# Define function to split a comma-separated CLI option
+def _split_option(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+# Define function to map model files given on the command line to model names
+def select_json_files(files):
+    names_by_file = {file: model for model, file in DEFAULT_JSON_FILES.items()}
+    return {names_by_file.get(file, os.path.splitext(os.path.basename(file))[0]): file
+            for file in files}
+
+# Define function to parse command-line options
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate and compare AI-generated emails.")
+    parser.add_argument("--metrics", type=_split_option, default=None,
+                        help="comma-separated metrics to run (default: all). "
+                             f"Available: {', '.join(METRICS)}")
+    parser.add_argument("--models", type=_split_option, default=None,
+                        help="comma-separated model JSON files (default: "
+                             f"{','.join(DEFAULT_JSON_FILES.values())})")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH,
+                        help="path of the on-disk metric cache")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="recompute every metric without reading or writing the cache")
+    parser.add_argument("--perplexity-backend", default=PERPLEXITY_BACKEND,
+                        help="perplexity model: gpt2, gpt2-int8 or distilgpt2 "
+                             "(compare them with `python perplexity.py`)")
+    parser.add_argument("--perplexity-threads", type=int, default=PERPLEXITY_THREADS,
+                        help="PyTorch CPU threads for perplexity scoring (worker "
+                             "processes use 1)")
+    parser.add_argument("--batch-size", type=int, default=PARSE_BATCH_SIZE,
+                        help="spaCy nlp.pipe batch size")
+    parser.add_argument("--n-process", type=int, default=PARSE_N_PROCESS,
+                        help="spaCy parse worker processes, started once per run "
+                             "(ignored when --workers > 1)")
+    parser.add_argument("--workers", type=int, default=EVAL_WORKERS,
+                        help="worker processes for sharded evaluation (1 = in-process)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE,
+                        help="emails per work shard when --workers > 1")
+    parser.add_argument("--chunk-size", type=int, default=INGEST_CHUNK_SIZE,
+                        help="records read and evaluated at a time per model file")
+    parser.add_argument("--save-results", default=DEFAULT_RESULTS_PATH,
+                        help="write per-email scores to this .npz file")
+    parser.add_argument("--load-results", default=None,
+                        help="reload per-email scores from a .npz file instead of scoring")
+    parser.add_argument("--stream", action="store_true",
+                        help="keep only running per-model statistics instead of per-email "
+                             "rows (nothing is saved)")
+    parser.add_argument("--live", action="store_true",
+                        help="print the current leaderboard after every chunk")
+    parser.add_argument("--bootstrap", type=int, default=DEFAULT_RESAMPLES,
+                        help="bootstrap resamples for confidence intervals and win "
+                             "probabilities (0 = off; needs per-email results)")
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE,
+                        help="confidence level of the bootstrap intervals")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the bootstrap")
+    parser.add_argument("--group-by", type=_split_option, default=["category"],
+                        help="comma-separated labels to rank the models within: "
+                             f"{', '.join(GROUP_LABELS)} (empty = off; needs per-email results)")
+    parser.add_argument("--save-aggregates", default=DEFAULT_AGGREGATES_PATH,
+                        help="write the aggregate scores used by report.py to this JSON file")
+    parser.add_argument("--report-dir", default=".",
+                        help="directory for the rendered charts and HTML report")
+    parser.add_argument("--no-plots", action="store_true",
+                        help="skip rendering the charts and HTML report")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every metric call and print a per-metric summary")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="profile and also record allocations per call (slower)")
+    parser.add_argument("--trace", default=None,
+                        help="profile and write the calls as a Chrome trace-event JSON "
+                             f"file (e.g. {DEFAULT_TRACE_PATH})")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.metrics or [] if name not in METRICS]
+    if unknown:
+        parser.error(f"unknown metrics: {', '.join(unknown)}")
+    unknown = [label for label in args.group_by if label not in GROUP_LABELS]
+    if unknown:
+        parser.error(f"unknown group labels: {', '.join(unknown)}")
+    if args.perplexity_backend != PERPLEXITY_BACKEND:
+        from perplexity import PERPLEXITY_BACKENDS
+        if args.perplexity_backend not in PERPLEXITY_BACKENDS:
+            parser.error(f"unknown perplexity backend: {args.perplexity_backend}")
+    return args
+
+# Define function to score every email, reusing cached metric values from
+# earlier runs; scores are added to aggregator as they arrive
+def run_evaluation(args, json_files, aggregator):
+    global PROFILER, GRAMMAR_SENTENCE_CACHE_PATH
+    print("Starting model evaluation...")
+    if not args.no_cache:
+        GRAMMAR_SENTENCE_CACHE_PATH = args.cache
+    if args.profile or args.profile_memory or args.trace:
+        PROFILER = Profiler(trace_memory=args.profile_memory)
+    options = dict(workers=args.workers, shard_size=args.shard_size,
+                   chunk_size=args.chunk_size, aggregator=aggregator,
+                   keep_rows=not args.stream,
+                   on_chunk=functools.partial(print_leaderboard, aggregator) if args.live else None)
+    try:
+        if args.no_cache:
+            return evaluate_models(json_files, args.metrics, args.batch_size, args.n_process,
+                                   **options)
+        with MetricCache(args.cache, namespace="comparemore") as metric_cache:
+            return evaluate_models(json_files, args.metrics, args.batch_size,
+                                   args.n_process, cache=metric_cache, **options)
+    finally:
+        close_resources()
+        if PROFILER is not None:
+            PROFILER.print_summary()
+            if args.trace:
+                PROFILER.export_chrome_trace(args.trace)
+                print(f"Wrote metric trace to {args.trace}")
+            PROFILER = None
+
+def main(argv=None):
+    args = parse_args(argv)
+    set_perplexity_backend(args.perplexity_backend)
+    if not args.load_results and "perplexity" in (args.metrics or METRICS):
+        import torch
+        torch.set_num_threads(args.perplexity_threads)
+    json_files = select_json_files(args.models) if args.models else DEFAULT_JSON_FILES
+
+    if args.load_results:
+        print(f"Loading per-email scores from {args.load_results}...")
+        results = ResultsTable.load(args.load_results)
+        aggregator = StreamingAggregator.from_table(results)
+    else:
+        aggregator = StreamingAggregator()
+        results = run_evaluation(args, json_files, aggregator)
+        if results is not None:
+            results.save(args.save_results)
+            print(f"\nSaved per-email scores for {len(results)} emails to {args.save_results}")
+
+    # Aggregate scores
+    final_scores = aggregate_scores(aggregator)
+    spread = aggregate_spread(aggregator)
+    print_results(final_scores, spread)
+
+    normalized_scores = normalize_scores(final_scores)
+    if not normalized_scores:
+        return
+
+    # Compute weighted scores
+    model_scores = compute_weighted_scores(normalized_scores)
+    print("\nFinal Weighted Scores:")
+    print("=" * 50)
+    for model, score in model_scores.items():
+        print(f"{model}: {score:.4f}")
+    print("=" * 50)
+
+    # Bootstrap the per-email scores to see whether the gaps are real
+    bootstrap = None
+    if results is not None and args.bootstrap > 0 and len(model_scores) > 1:
+        bootstrap = bootstrap_scores(results, final_scores, args.bootstrap,
+                                     args.confidence, args.seed)
+        print_bootstrap(final_scores, model_scores, bootstrap)
+
+    # Determine the best model
+    best_model = max(model_scores, key=model_scores.get)
+    print(f"\nBest AI Model for Formal Emails: {best_model}\n")
+
+    # Rank the models within each category / scenario
+    groups = {}
+    if results is not None:
+        for label in args.group_by:
+            groups[label] = grouped_rankings(results, label)
+            print_group_rankings(label, groups[label])
+
+    # Store the aggregates so report.py can re-render without rescoring
+    report = build_report(final_scores, normalized_scores, model_scores,
+                          METRICS_TO_NORMALIZE, RADAR_METRICS, bootstrap, weights=WEIGHTS,
+                          groups=groups, spread=spread)
+    save_aggregates(report, args.save_aggregates)
+    print(f"Saved aggregate scores to {args.save_aggregates}")
+
+    if not args.no_plots:
+        for path in render_report(report, args.report_dir).values():
+            print(f"Wrote {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import re
+
+# Default rule file, next to this module
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "email_rules.json")
+
+# Structure flags, in report order; the last one is computed from paragraphs
+# rather than from rules
+STRUCTURE_FLAGS = ("has_greeting", "has_signoff", "has_cta", "has_subject", "good_paragraphing")
+
+# Rule categories and the flag each one sets
+CATEGORY_FLAGS = {
+    "greeting": "has_greeting",
+    "signoff": "has_signoff",
+    "cta": "has_cta",
+    "subject": "has_subject",
+}
+
+# Gap allowed between a rule's terms and its then_terms: whitespace, then any
+# characters up to the end of the line
+DEFAULT_GAP = r"\s[^\n]*?"
+
+
+# Define function to compile a list of literal terms into a trie-shaped regex,
+# so matching cost depends on term length rather than on the number of terms
+def trie_pattern(terms):
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def build(node):
+        optional = "" in node
+        branches = [re.escape(char) + build(child)
+                    for char, child in sorted(node.items()) if char != ""]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if optional else group
+
+    return build(trie)
+
+
+# Define function to turn one rule from the rule file into a regex string.
+# A rule is either {"pattern": regex} or {"terms": [...]} with optional
+# "then" (regex that must follow), "then_terms" (terms that must follow on
+# the same line) and "gap" (regex between terms and then_terms).
+def rule_pattern(rule):
+    if "pattern" in rule:
+        return rule["pattern"]
+    pattern = "(?:" + trie_pattern(rule["terms"]) + ")"
+    if "then_terms" in rule:
+        pattern += rule.get("gap", DEFAULT_GAP) + "(?:" + trie_pattern(rule["then_terms"]) + ")"
+    if "then" in rule:
+        pattern += rule["then"]
+    return pattern
+
+
+# Define function to hash a rule file; used as part of the metric cache version
+def rules_digest(path=DEFAULT_RULES_PATH):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()[:12]
+    except OSError:
+        return "missing"
+
+
+# Rule engine for email structure features. Each category's rules are
+# compiled once into a single combined regex: rules anchored at the start of
+# the email are only tried there, the rest are found with one search. An
+# email is lowercased once and every flag is emitted from one scan() call.
+class EmailRuleEngine:
+    def __init__(self, rules):
+        self.anchored = {}
+        self.unanchored = {}
+        for category in CATEGORY_FLAGS:
+            category_rules = rules.get(category, [])
+            start = [rule_pattern(rule) for rule in category_rules if rule.get("anchor") == "start"]
+            anywhere = [rule_pattern(rule) for rule in category_rules if rule.get("anchor") != "start"]
+            if start:
+                self.anchored[category] = re.compile("|".join(f"(?:{p})" for p in start))
+            if anywhere:
+                self.unanchored[category] = re.compile("|".join(f"(?:{p})" for p in anywhere))
+
+    # Define function to build an engine from a JSON rule file
+    @classmethod
+    def from_file(cls, path=DEFAULT_RULES_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    # Define function to compute every structure flag for one email
+    def scan(self, text):
+        lowered = text.lower()
+        flags = {}
+        for category, flag in CATEGORY_FLAGS.items():
+            found = False
+            anchored = self.anchored.get(category)
+            if anchored is not None and anchored.match(lowered):
+                found = True
+            if not found:
+                unanchored = self.unanchored.get(category)
+                found = unanchored is not None and unanchored.search(lowered) is not None
+            flags[flag] = int(found)
+
+        # Check for paragraphing
+        paragraphs = [p for p in text.split('\n\n') if p.strip()]
+        flags["good_paragraphing"] = int(len(paragraphs) > 1)
+
+        flags["structure_score"] = sum(flags[flag] for flag in STRUCTURE_FLAGS) / len(STRUCTURE_FLAGS)
+        return flags
+
+    # Define function to compute structure flags for a batch of emails
+    def scan_many(self, texts):
+        return [self.scan(text) for text in texts]
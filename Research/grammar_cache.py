@@ -0,0 +1,337 @@
+import argparse
+import hashlib
+import re
+import sys
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+from metric_cache import MetricCache
+
+# Default number of sentences kept in the in-memory LRU tier
+SENTENCE_CACHE_SIZE = 100000
+
+# Cache version of the per-sentence matches; bump it when the segmentation or
+# the stored match fields change, or when LanguageTool is upgraded
+SENTENCE_CACHE_VERSION = "2"
+
+# Sentences written to the on-disk tier are buffered and committed together
+DISK_FLUSH_SIZE = 256
+
+# Emails are checked sentence by sentence. A segment starts at a
+# non-whitespace character and runs to sentence-final punctuation (plus any
+# closing quotes or brackets) followed by whitespace, or to the end of the
+# line. It keeps the spaces after it up to the next sentence, so repeated
+# whitespace between sentences is still checked; segments never cross lines
+# and keep their exact offsets.
+_SEGMENT = re.compile(r"\S(?:[^\n]*?(?:[.!?]+[\"')\]’”]*(?=\s)|$))[^\S\n]*", re.MULTILINE)
+
+# Words whose period does not end the sentence: titles before a name and
+# abbreviations followed by more of the same sentence
+ABBREVIATIONS = frozenset({"mr.", "mrs.", "ms.", "dr.", "prof.", "e.g.", "i.e.", "vs.", "cf.",
+                           "approx.", "incl."})
+
+# A segment that is only a list marker ("1.", "b.") belongs to the item after it
+_LIST_MARKER = re.compile(r"(?:\d{1,3}|[A-Za-z])\.")
+
+# Characters a new sentence can start with besides upper-case letters and digits
+_SENTENCE_OPENERS = "\"'“‘(["
+
+# The match fields that are cached; offsets are relative to the sentence
+# until an email's matches are reassembled
+GrammarMatch = namedtuple("GrammarMatch", "ruleId message offset errorLength category")
+
+
+# Define function to decide whether a segment continues the previous one on
+# the same line: the previous segment ends in an abbreviation or is a list
+# marker, or the segment does not start like a sentence (e.g. "ABC Corp. and
+# ..." continues after "Corp.")
+def _continues(previous, start, sentence):
+    previous_start, previous_sentence = previous
+    if previous_start + len(previous_sentence) != start:
+        return False
+    last = previous_sentence.rstrip()
+    if last.split()[-1].lower() in ABBREVIATIONS or _LIST_MARKER.fullmatch(last):
+        return True
+    first = sentence[0]
+    return not (first.isupper() or first.isdigit() or first in _SENTENCE_OPENERS)
+
+
+# Define function to split a text into (start offset, sentence) segments
+def split_sentences(text):
+    segments = []
+    for m in _SEGMENT.finditer(text):
+        start, sentence = m.start(), m.group()
+        if segments and _continues(segments[-1], start, sentence):
+            previous_start, previous_sentence = segments[-1]
+            segments[-1] = (previous_start, previous_sentence + sentence)
+        else:
+            segments.append((start, sentence))
+    return segments
+
+
+# Define function to hash a sentence; the hash is the cache key
+def sentence_hash(sentence):
+    return hashlib.sha256(sentence.encode("utf-8")).hexdigest()
+
+
+# Define function to keep the cached fields of a LanguageTool match.
+# language_tool_python 3.x names the fields rule_id and error_length; older
+# releases use ruleId and errorLength.
+def _to_match(match):
+    rule_id = getattr(match, "rule_id", None) or getattr(match, "ruleId", None)
+    error_length = getattr(match, "error_length", None)
+    if error_length is None:
+        error_length = match.errorLength
+    return GrammarMatch(rule_id, match.message, match.offset, error_length,
+                        getattr(match, "category", None))
+
+
+# Two-tier sentence cache: a bounded in-memory LRU of {hash: [GrammarMatch]}
+# in front of an optional MetricCache on disk. Disk writes are buffered and
+# committed DISK_FLUSH_SIZE sentences at a time.
+class SentenceCache:
+    def __init__(self, max_entries=SENTENCE_CACHE_SIZE, path=None):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._disk = MetricCache(path, namespace="grammar_sentences") if path else None
+        self._pending = []
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # Define function to look up many sentence hashes; returns {hash: matches}
+    def get_many(self, hashes):
+        found = {}
+        missing = []
+        for key in hashes:
+            matches = self._entries.get(key)
+            if matches is None:
+                missing.append(key)
+            else:
+                self._entries.move_to_end(key)
+                found[key] = matches
+        self.hits += len(found)
+
+        if missing and self._disk is not None:
+            stored = self._disk.get_many(missing, "grammar", SENTENCE_CACHE_VERSION)
+            for key, values in stored.items():
+                found[key] = self._remember(key, [GrammarMatch(*value) for value in values])
+            self.disk_hits += len(stored)
+        self.misses += len(hashes) - len(found)
+        return found
+
+    # Define function to store one sentence's matches in both tiers
+    def put(self, key, matches):
+        self._remember(key, matches)
+        if self._disk is not None:
+            self._pending.append((key, [list(match) for match in matches]))
+            if len(self._pending) >= DISK_FLUSH_SIZE:
+                self.flush()
+
+    def _remember(self, key, matches):
+        self._entries[key] = matches
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return matches
+
+    # Define function to drop every sentence from the in-memory tier; buffered
+    # sentences are committed first so the disk tier still has them
+    def clear(self):
+        self.flush()
+        self._entries.clear()
+
+    # Define function to commit buffered sentences to the disk tier
+    def flush(self):
+        if self._disk is not None and self._pending:
+            self._disk.put_many("grammar", SENTENCE_CACHE_VERSION, self._pending)
+            self._pending = []
+
+    def close(self):
+        self.flush()
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+
+# Result of one email's sentence-level check. result() waits for the
+# sentences that had to be checked, stores them in the cache and returns the
+# email's matches with offsets shifted back into the email text.
+class EmailCheck:
+    def __init__(self, checker, segments, keys, known, futures):
+        self._checker = checker
+        self._segments = segments
+        self._keys = keys
+        self._known = known
+        self._futures = futures
+
+    def result(self):
+        for key, future in self._futures.items():
+            if key not in self._known:
+                self._known[key] = self._checker._resolve(key, future)
+        matches = []
+        for (start, _), key in zip(self._segments, self._keys):
+            matches.extend(match._replace(offset=match.offset + start)
+                           for match in self._known[key])
+        return matches
+
+
+# Sentence-level grammar checker in front of a LanguageToolPool, with the
+# same submit/submit_many/close interface. Each email is split into
+# sentences; sentences already in the cache are reused, sentences already
+# being checked for another email share that check, and only unseen
+# sentences are sent to LanguageTool. Checks still run concurrently on the
+# pool's threads; the cache is only touched from the calling thread.
+#
+# The matches are those of a whole-text check minus the rules that need text
+# across a segment boundary, so the grammar metric counts sentence-level
+# errors only. Tolerated differences from whole-text checking:
+# - matches of cross-sentence and paragraph rules (repeated sentence
+#   openings, a paragraph missing its final punctuation, whitespace or
+#   punctuation spanning two segments) are dropped;
+# - no other match may change. A match that only the sentence-level check
+#   reports means a sentence was split badly; `python grammar_cache.py`
+#   lists both kinds on the corpus and exits with 1 when there is any of the
+#   latter.
+# The splitter's cases are covered by tests/test_grammar_cache.py.
+class SentenceGrammarChecker:
+    def __init__(self, pool, cache=None):
+        self.pool = pool
+        self.cache = cache if cache is not None else SentenceCache()
+        self._in_flight = {}
+        self.checked = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.cache.close()
+        self.pool.close()
+
+    # Define function to queue the check of one email; returns an EmailCheck
+    # whose result() gives the matches. wrap is passed on to the pool for
+    # every sentence actually checked.
+    def submit(self, text, wrap=None):
+        segments = split_sentences(text)
+        keys = [sentence_hash(sentence) for _, sentence in segments]
+        unique = list(dict.fromkeys(keys))
+        known = self.cache.get_many(unique)
+
+        futures = {}
+        sentences = {key: sentence for key, (_, sentence) in zip(keys, segments)}
+        for key in unique:
+            if key in known:
+                continue
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._in_flight[key] = self.pool.submit(sentences[key], wrap=wrap)
+                self.checked += 1
+            futures[key] = future
+        return EmailCheck(self, segments, keys, known, futures)
+
+    # Define function to check many emails; returns EmailChecks in input order
+    def submit_many(self, texts):
+        return [self.submit(text) for text in texts]
+
+    # Define function to check one email synchronously
+    def check(self, text):
+        return self.submit(text).result()
+
+    # Define function to collect one sentence's check and cache it. A failed
+    # check is not cached, so the sentence is retried by later emails.
+    def _resolve(self, key, future):
+        try:
+            matches = [_to_match(match) for match in future.result()]
+        except Exception:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+            raise
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+            self.cache.put(key, matches)
+        return matches
+
+    # Define function to summarize cache use so far. Sentences shared with an
+    # in-flight check count as reused.
+    def stats(self):
+        cache = self.cache
+        lookups = cache.hits + cache.disk_hits + cache.misses
+        return {"sentences": lookups, "memory_hits": cache.hits, "disk_hits": cache.disk_hits,
+                "checked": self.checked,
+                "hit_rate": 1 - self.checked / lookups if lookups else 0.0}
+
+
+# Define function to compare sentence-level checks with whole-text
+# tool.check on the same LanguageTool pool. Matches are compared as (rule,
+# offset, length) per email. Returns the number of identical emails, the
+# match totals of both sides, the rules found only by the whole-text check
+# (cross-sentence rules) and only by the sentence-level check (segmentation
+# errors), and both run times.
+def compare_with_whole_text(pool, texts):
+    start = time.perf_counter()
+    whole = [[_to_match(match) for match in future.result()]
+             for future in pool.submit_many(texts)]
+    whole_seconds = time.perf_counter() - start
+
+    checker = SentenceGrammarChecker(pool)
+    start = time.perf_counter()
+    sentence = [check.result() for check in checker.submit_many(texts)]
+    sentence_seconds = time.perf_counter() - start
+
+    identical = 0
+    whole_only = Counter()
+    sentence_only = Counter()
+    for a, b in zip(whole, sentence):
+        a = Counter((m.ruleId, m.offset, m.errorLength) for m in a)
+        b = Counter((m.ruleId, m.offset, m.errorLength) for m in b)
+        identical += a == b
+        whole_only.update(rule for rule, _, _ in (a - b).elements())
+        sentence_only.update(rule for rule, _, _ in (b - a).elements())
+    return {"emails": len(texts), "identical": identical,
+            "whole_matches": sum(map(len, whole)), "sentence_matches": sum(map(len, sentence)),
+            "whole_only": whole_only, "sentence_only": sentence_only,
+            "whole_seconds": whole_seconds, "sentence_seconds": sentence_seconds}
+
+
+def main(argv=None):
+    from grammar_pool import LanguageToolPool
+    from ingest import iter_records
+
+    parser = argparse.ArgumentParser(
+        description="Check sentence-level grammar checks against whole-text LanguageTool "
+                    "checks on the email corpus.")
+    parser.add_argument("files", nargs="*",
+                        default=["gpt.json", "gemini.json", "claude.json", "llama.json"],
+                        help="model JSON files whose emails are compared")
+    parser.add_argument("--limit", type=int, default=None, help="compare only the first N emails")
+    parser.add_argument("--servers", type=int, default=2, help="local LanguageTool servers")
+    args = parser.parse_args(argv)
+
+    texts = [record["email"] for file in args.files for record in iter_records(file)]
+    texts = texts[:args.limit] if args.limit else texts
+    with LanguageToolPool("en-US", size=args.servers) as pool:
+        result = compare_with_whole_text(pool, texts)
+
+    print(f"\nSentence-level vs whole-text grammar checks on {result['emails']} emails:")
+    print("=" * 60)
+    print(f"identical matches:  {result['identical']} emails")
+    print(f"matches:            {result['whole_matches']} whole-text, "
+          f"{result['sentence_matches']} sentence-level")
+    for label, rules in (("whole-text only", result["whole_only"]),
+                         ("sentence-level only", result["sentence_only"])):
+        listed = ", ".join(f"{rule} ({count})" for rule, count in rules.most_common(10))
+        print(f"{label + ':':<20}{listed or 'none'}")
+    print("-" * 60)
+    print(f"whole-text:         {result['whole_seconds']:.2f}s")
+    print(f"sentence-level:     {result['sentence_seconds']:.2f}s (cold cache)")
+    print("=" * 60)
+
+    # Rules that only fire across sentences are expected on the whole-text
+    # side; matches only the sentence-level check finds point to bad splits
+    return 0 if not result["sentence_only"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from language_tool_python import LanguageTool
+
+
+# Pool of local LanguageTool servers. Each LanguageTool instance starts its own
+# Java server on a free port; checks are dispatched round-robin across them
+# from a bounded thread pool, so at most max_concurrency requests are in
+# flight at once. Grammar checking is I/O-bound on the local HTTP servers and
+# can therefore overlap with CPU-bound work in the calling thread.
+class LanguageToolPool:
+    def __init__(self, language="en-US", size=2, max_concurrency=None):
+        self.size = max(1, size)
+        self.max_concurrency = max_concurrency or self.size * 2
+        self._servers = [LanguageTool(language) for _ in range(self.size)]
+        self._next_server = itertools.cycle(self._servers)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                            thread_name_prefix="languagetool")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for server in self._servers:
+            server.close()
+
+    def _check(self, text):
+        with self._lock:
+            server = next(self._next_server)
+        return server.check(text)
+
+    # Define function to queue one grammar check; returns a Future of the matches.
+    # wrap, if given, is applied to the check function (e.g. to time it on
+    # the thread that runs it).
+    def submit(self, text, wrap=None):
+        check = self._check if wrap is None else wrap(self._check)
+        return self._executor.submit(check, text)
+
+    # Define function to check many texts concurrently; returns Futures in input order
+    def submit_many(self, texts):
+        return [self.submit(text) for text in texts]
+
+    # Define function to check one text synchronously
+    def check(self, text):
+        return self.submit(text).result()
@@ -0,0 +1,97 @@
+import numpy as np
+
+# Label columns of a ResultsTable that emails can be grouped by (besides model)
+GROUP_LABELS = ("category", "scenario")
+
+
+# Define function to combine label code columns into one integer group id per
+# row. The codes are mixed into a single int64 key, and np.unique maps the
+# keys that occur to dense ids. Returns (ids, keys) where keys[i] is the
+# tuple of label values of group i.
+def group_ids(table, by):
+    combined = np.zeros(len(table), dtype=np.int64)
+    sizes = [max(1, len(table.labels[label])) for label in by]
+    for label, size in zip(by, sizes):
+        combined = combined * size + table.codes(label)
+    present, ids = np.unique(combined, return_inverse=True)
+
+    # Decode each present key back into its per-label codes
+    codes = []
+    remainder = present
+    for size in reversed(sizes):
+        codes.append(remainder % size)
+        remainder = remainder // size
+    codes.reverse()
+    keys = [tuple(table.labels[label][code] for label, code in zip(by, key_codes))
+            for key_codes in zip(*(c.tolist() for c in codes))]
+    return ids.ravel(), keys
+
+
+# Grouped aggregation over a per-email ResultsTable. Rows are assigned a
+# group id from the integer-coded labels, and every column's per-group count,
+# missing count, sum and sum of squares come from bincount over those ids:
+# one pass per column, with memory for only one column at a time. Values are
+# shifted by the column's overall mean first, so the one-pass variance stays
+# accurate. Means follow RunningStats: NaN when a group has a missing value;
+# std is the sample standard deviation.
+class GroupedStats:
+    def __init__(self, table, by=("model", "category"), columns=None):
+        self.by = tuple(by)
+        self.columns = list(columns or table.columns)
+        ids, self.keys = group_ids(table, self.by)
+        n_groups = len(self.keys)
+        shape = (n_groups, len(self.columns))
+
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.missing = np.zeros(shape, dtype=np.int64)
+        self.mean = np.full(shape, np.nan)
+        self.std = np.full(shape, np.nan)
+        rows = self.rows = np.bincount(ids, minlength=n_groups)
+
+        for j, column in enumerate(self.columns):
+            values = table.column(column).astype(np.float64)
+            missing = np.isnan(values)
+            present = np.where(missing, 0.0, values)
+            shift = present.sum() / max(1, len(values) - int(missing.sum()))
+            shifted = np.where(missing, 0.0, present - shift)
+
+            self.missing[:, j] = np.bincount(ids, weights=missing, minlength=n_groups)
+            count = self.count[:, j] = rows - self.missing[:, j]
+            sums = np.bincount(ids, weights=shifted, minlength=n_groups)
+            squares = np.bincount(ids, weights=shifted * shifted, minlength=n_groups)
+
+            with np.errstate(invalid="ignore", divide="ignore"):
+                centered_mean = sums / count
+                variance = (squares - sums * centered_mean) / (count - 1)
+            self.mean[:, j] = np.where((self.missing[:, j] > 0) | (count == 0), np.nan,
+                                       centered_mean + shift)
+            self.std[:, j] = np.where(count > 1, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+
+    # Define function to get each group's means for aggregated report keys,
+    # keyed by the group's label tuple; aggregates maps report key -> column
+    def means(self, aggregates):
+        return self._by_key(self.mean, aggregates)
+
+    # Define function to get each group's standard deviations, in the same
+    # shape as means()
+    def stds(self, aggregates):
+        return self._by_key(self.std, aggregates)
+
+    def _by_key(self, values, aggregates):
+        index = {column: j for j, column in enumerate(self.columns)}
+        return {
+            key: {name: float(values[g, index[column]])
+                  for name, column in aggregates.items() if column in index}
+            for g, key in enumerate(self.keys)
+        }
+
+
+# Define function to split (model, group) means (or stds) into one
+# final_scores dict per group value: {group value: {model: {report key: mean}}}
+def scores_by_group(grouped_means):
+    groups = {}
+    for (model, *group), means in grouped_means.items():
+        value = group[0] if len(group) == 1 else tuple(group)
+        groups.setdefault(value, {})[model] = means
+    return groups
+
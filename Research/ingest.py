@@ -0,0 +1,123 @@
+import json
+from itertools import islice
+
+# Bytes read from a model file at a time; the parse buffer never holds more
+# than this plus one partially read record
+READ_SIZE = 1 << 16
+
+RECORD_FIELDS = ("scenario", "category", "email")
+
+_decoder = json.JSONDecoder()
+
+
+# Define function to keep only the fields the metric pipeline uses; every
+# record must be a JSON object
+def _to_record(obj, position):
+    if not isinstance(obj, dict):
+        raise ValueError(f"{position}: expected a JSON object, got {type(obj).__name__}")
+    return {field: obj.get(field) for field in RECORD_FIELDS}
+
+
+# Define function to incrementally decode the elements of a top-level JSON
+# array. Accepts exactly what json.load accepts: elements separated by one
+# comma, no leading or trailing comma, and nothing but whitespace after the
+# closing bracket. Yields (element number, element).
+def _iter_json_array(f, read_size):
+    buf = ""
+    while not buf:
+        chunk = f.read(read_size)
+        buf = chunk.lstrip()
+        if not chunk:
+            break
+    if not buf.startswith("["):
+        raise ValueError("expected a JSON array")
+    pos = 1
+    eof = False
+    count = 0
+    after_value = False  # An element was read and no comma has followed it yet
+    after_comma = False
+
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n":
+            pos += 1
+        if pos < len(buf):
+            char = buf[pos]
+            if char == "]" and not after_comma:
+                rest = buf[pos + 1:]
+                while True:
+                    if rest.strip():
+                        raise ValueError("extra data after the JSON array")
+                    rest = f.read(read_size)
+                    if not rest:
+                        return
+            if after_value:
+                if char != ",":
+                    raise ValueError(f"element {count}: expected ',' or ']' after it")
+                pos += 1
+                after_value, after_comma = False, True
+                continue
+            if char in ",]":
+                raise ValueError(f"element {count + 1}: expected a value, got {char!r}")
+            try:
+                obj, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                count += 1
+                yield count, obj
+                pos = end
+                after_value, after_comma = True, False
+                continue
+        if eof:
+            raise ValueError("unterminated JSON array")
+
+        # Need more input: drop what has been consumed and read the next block
+        chunk = f.read(read_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+
+# Define function to decode a JSON Lines file one line at a time. Yields
+# (line number, value).
+def _iter_json_lines(f):
+    for line_number, line in enumerate(f, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"line {line_number}: {e}") from e
+
+
+# Define function to stream {"scenario", "category", "email"} records from a
+# model file. Accepts the existing JSON array format and JSONL, detected from
+# the first non-whitespace character.
+def iter_records(file_path, read_size=READ_SIZE):
+    with open(file_path, "r", encoding="utf-8") as f:
+        first = ""
+        while True:
+            char = f.read(1)
+            if not char or not char.isspace():
+                first = char
+                break
+        f.seek(0)
+
+        if first == "[":
+            for number, obj in _iter_json_array(f, read_size):
+                yield _to_record(obj, f"element {number}")
+        else:
+            for number, obj in _iter_json_lines(f):
+                yield _to_record(obj, f"line {number}")
+
+
+# Define function to group a record stream into lists of at most size records
+def iter_chunks(records, size):
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,189 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+
+# Percentiles reported per metric in the summary table
+SUMMARY_PERCENTILES = (50, 95)
+
+# Default location of the exported Chrome trace
+DEFAULT_TRACE_PATH = "metric_trace.json"
+
+
+# One timed metric call: wall and CPU seconds, and (when memory tracing is on)
+# the net allocation change and the peak allocation above the starting point,
+# in bytes. email is None for spans covering a whole batch.
+class SpanRecord:
+    __slots__ = ("name", "model", "email", "start", "wall", "cpu", "alloc", "peak",
+                 "pid", "tid", "args")
+
+    def __init__(self, name, model, email, start, wall, cpu, alloc, peak, pid, tid, args):
+        self.name = name
+        self.model = model
+        self.email = email
+        self.start = start
+        self.wall = wall
+        self.cpu = cpu
+        self.alloc = alloc
+        self.peak = peak
+        self.pid = pid
+        self.tid = tid
+        self.args = args
+
+
+# Context manager timing one span; created by Profiler.span()
+class _Span:
+    __slots__ = ("profiler", "name", "model", "email", "args", "start", "cpu", "memory")
+
+    def __init__(self, profiler, name, model, email, args):
+        self.profiler = profiler
+        self.name = name
+        self.model = model
+        self.email = email
+        self.args = args
+
+    def __enter__(self):
+        if self.profiler.trace_memory:
+            self.memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        self.cpu = time.thread_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.start
+        cpu = time.thread_time() - self.cpu
+        alloc = peak = None
+        if self.profiler.trace_memory:
+            current, high = tracemalloc.get_traced_memory()
+            alloc = current - self.memory
+            peak = high - self.memory
+        self.profiler.records.append(SpanRecord(
+            self.name, self.model, self.email, self.start, wall, cpu, alloc, peak,
+            os.getpid(), threading.get_ident(), self.args))
+        return False
+
+
+# Collects one SpanRecord per (model, email, metric) call. Evaluation code
+# holds a Profiler only when profiling is enabled and otherwise skips it with
+# a single `is None` check, so a disabled profiler costs nothing per call.
+# CPU time is per thread (time.thread_time), so work done on native library
+# threads such as PyTorch's intra-op pool is not counted. Memory tracing uses
+# tracemalloc, which is process-wide: allocations made concurrently by other
+# threads (e.g. grammar checks) are attributed to whichever span is open.
+class Profiler:
+    def __init__(self, trace_memory=False, origin=None):
+        self.trace_memory = trace_memory
+        self.origin = time.perf_counter() if origin is None else origin
+        self.records = []
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # Define function to return the settings needed to recreate this profiler
+    # in another process, with timestamps on the same clock origin
+    def options(self):
+        return {"trace_memory": self.trace_memory, "origin": self.origin}
+
+    # Define function to time a block: `with profiler.span("formality", model, idx):`
+    def span(self, name, model=None, email=None, **args):
+        return _Span(self, name, model, email, args)
+
+    # Define function to wrap a callable so each call is recorded as one span;
+    # used for work that runs on other threads
+    def wrap(self, name, model=None, email=None, **args):
+        def decorator(func):
+            def wrapped(*func_args, **func_kwargs):
+                with self.span(name, model, email, **args):
+                    return func(*func_args, **func_kwargs)
+            return wrapped
+        return decorator
+
+    # Define function to time each step of an iterator of (key, value) pairs
+    # whose keys are (model, email) tuples. Work done in batches is
+    # attributed to the item that triggered the batch.
+    def iter_spans(self, name, iterator):
+        iterator = iter(iterator)
+        while True:
+            span = _Span(self, name, None, None, {})
+            span.__enter__()
+            try:
+                key, value = next(iterator)
+            except StopIteration:
+                return
+            span.model, span.email = key
+            span.__exit__(None, None, None)
+            yield key, value
+
+    # Define function to remove and return every recorded span
+    def drain(self):
+        records, self.records = self.records, []
+        return records
+
+    # Define function to add spans recorded elsewhere (e.g. in pool workers)
+    def extend(self, records):
+        self.records.extend(records)
+
+    # Define function to compute per-metric statistics over the recorded spans.
+    # Times are reported in milliseconds and memory in KiB.
+    def summary(self):
+        by_name = defaultdict(list)
+        for record in self.records:
+            by_name[record.name].append(record)
+
+        summary = {}
+        for name, records in by_name.items():
+            wall = np.array([record.wall for record in records]) * 1000
+            cpu = np.array([record.cpu for record in records]) * 1000
+            stats = {"calls": len(records), "total_ms": float(wall.sum())}
+            for q, value in zip(SUMMARY_PERCENTILES, np.percentile(wall, SUMMARY_PERCENTILES)):
+                stats[f"p{q}_ms"] = float(value)
+            stats["max_ms"] = float(wall.max())
+            stats["cpu_total_ms"] = float(cpu.sum())
+            peaks = [record.peak for record in records if record.peak is not None]
+            if peaks:
+                stats["max_peak_kb"] = max(peaks) / 1024
+            summary[name] = stats
+        return summary
+
+    # Define function to print the per-metric summary, slowest metric first
+    def print_summary(self):
+        summary = self.summary()
+        print("\nMetric Timing Summary:")
+        print("=" * 82)
+        print(f"{'metric':<22}{'calls':>7}{'total s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+              f"{'max ms':>10}{'cpu s':>9}{'peak KiB':>10}")
+        print("-" * 82)
+        for name, stats in sorted(summary.items(), key=lambda item: -item[1]["total_ms"]):
+            peak = f"{stats['max_peak_kb']:>10.1f}" if "max_peak_kb" in stats else f"{'-':>10}"
+            print(f"{name:<22}{stats['calls']:>7}{stats['total_ms'] / 1000:>10.2f}"
+                  f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['max_ms']:>10.2f}"
+                  f"{stats['cpu_total_ms'] / 1000:>9.2f}{peak}")
+        print("=" * 82)
+
+    # Define function to export the spans as Chrome trace-event JSON, viewable
+    # in chrome://tracing or Perfetto
+    def export_chrome_trace(self, path=DEFAULT_TRACE_PATH):
+        events = []
+        for record in self.records:
+            args = {"model": record.model, "email": record.email,
+                    "cpu_ms": record.cpu * 1000}
+            if record.alloc is not None:
+                args["alloc_kb"] = record.alloc / 1024
+                args["peak_kb"] = record.peak / 1024
+            args.update(record.args)
+            events.append({
+                "name": record.name,
+                "cat": record.model or "",
+                "ph": "X",
+                "ts": (record.start - self.origin) * 1e6,
+                "dur": record.wall * 1e6,
+                "pid": record.pid,
+                "tid": record.tid,
+                "args": args,
+            })
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,199 @@
+import argparse
+import math
+import string
+import sys
+import time
+
+import numpy as np
+
+# Tokenization follows lexicalrichness's default preprocess + tokenize, so
+# every measure matches LexicalRichness(text) for the same text: lowercase,
+# drop ASCII digits and dashes, turn the remaining ASCII punctuation into
+# spaces and split on whitespace
+_DROPPED = "0123456789-–—"
+_TOKEN_TABLE = str.maketrans({**{p: " " for p in string.punctuation},
+                              **{c: None for c in _DROPPED}})
+
+# Defaults used by analyze_lexical_diversity
+MTLD_THRESHOLD = 0.72
+HDD_DRAWS = 42
+
+
+# Define function to split a text into lexicalrichness-compatible tokens
+def tokenize(text):
+    return text.lower().translate(_TOKEN_TABLE).split()
+
+
+# Define function to encode a token list as integer type ids (in order of
+# first appearance) plus the frequency of every type
+def encode(tokens):
+    index = {}
+    ids = np.fromiter((index.setdefault(token, len(index)) for token in tokens),
+                      dtype=np.int64, count=len(tokens))
+    return ids, np.bincount(ids, minlength=len(index))
+
+
+# Define function to compute one directional MTLD pass over integer type ids.
+# Each type remembers the segment it was last seen in, so starting a new
+# segment is a counter increment rather than rebuilding a set.
+def _mtld_pass(ids, n_types, threshold):
+    last_segment = [-1] * n_types
+    segment = 0
+    types = 0
+    words = 0
+    factors = 0.0
+    ttr = 1.0
+    for token in ids:
+        words += 1
+        if last_segment[token] != segment:
+            last_segment[token] = segment
+            types += 1
+        ttr = types / words
+        if ttr <= threshold:
+            segment += 1
+            types = words = 0
+            factors += 1
+
+    # Partial factor for the last, unfinished segment
+    if words > 0:
+        factors += (1 - ttr) / (1 - threshold)
+
+    # The TTR never dropped below the threshold
+    if factors == 0:
+        total_ttr = n_types / len(ids)
+        factors = 1 if total_ttr == 1 else (1 - total_ttr) / (1 - threshold)
+
+    return len(ids) / factors
+
+
+# Define function to compute MTLD: the mean of a forward and a backward pass
+def mtld(ids, n_types, threshold=MTLD_THRESHOLD):
+    ids = ids.tolist()
+    forward = _mtld_pass(ids, n_types, threshold)
+    backward = _mtld_pass(ids[::-1], n_types, threshold)
+    return (forward + backward) / 2
+
+
+# Define function to compute HD-D from the type-frequency array. A type with
+# frequency k is absent from a draw of n tokens out of N with probability
+# prod_{i<n} (N - k - i) / (N - i); types sharing a frequency share that
+# term, so it is evaluated once per distinct frequency as one
+# (frequencies x draws) product.
+def hdd(freqs, draws=HDD_DRAWS):
+    total = int(freqs.sum())
+    if total < draws:
+        raise ValueError(f"Number of draws should be less than the total sample size of {total}")
+    if draws < 1:
+        raise ValueError("Number of draws must be a positive integer")
+
+    values, multiplicity = np.unique(freqs, return_counts=True)
+    steps = np.arange(draws)
+    ratios = (total - values[:, None] - steps) / (total - steps)
+    absent = np.clip(ratios, 0.0, None).prod(axis=1)
+    return float(((1 - absent) / draws) @ multiplicity)
+
+
+# Lexical-diversity engine: each email is tokenized once and encoded as
+# integer type ids; TTR and RTTR come from the type count, MTLD from one
+# forward and one backward pass over the ids and HD-D from the
+# type-frequency array.
+class LexicalDiversityEngine:
+    def __init__(self, threshold=MTLD_THRESHOLD, draws=HDD_DRAWS):
+        self.threshold = threshold
+        self.draws = draws
+
+    # Define function to compute every measure from a token list. HD-D is
+    # capped at 1.0 for normalization; raises like lexicalrichness on token
+    # lists too short for the measures.
+    def analyze_tokens(self, tokens):
+        ids, freqs = encode(tokens)
+        words = len(ids)
+        n_types = len(freqs)
+        metrics = {
+            "ttr": n_types / words,
+            "rttr": n_types / math.sqrt(words),
+            "mtld": mtld(ids, n_types, self.threshold),
+            "hdd": min(1.0, hdd(freqs, self.draws)),
+        }
+        metrics["average"] = sum(metrics.values()) / 4
+        return metrics
+
+    # Define function to compute every measure for one text
+    def analyze(self, text):
+        return self.analyze_tokens(tokenize(text))
+
+
+# Define function to compute the same measures with lexicalrichness
+def lexicalrichness_metrics(text, threshold=MTLD_THRESHOLD, draws=HDD_DRAWS):
+    from lexicalrichness import LexicalRichness
+    lex = LexicalRichness(text)
+    metrics = {
+        "ttr": lex.ttr,
+        "rttr": lex.rttr,
+        "mtld": lex.mtld(threshold=threshold),
+        "hdd": min(1.0, lex.hdd(draws=draws)),
+    }
+    metrics["average"] = sum(metrics.values()) / 4
+    return metrics
+
+
+# Define function to compute measures, or None where the computation raises
+def _safe(analyze, text):
+    try:
+        return analyze(text)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+# Define function to compare the engine with lexicalrichness on a list of
+# texts. Returns the largest absolute difference per measure, the number of
+# texts where only one side raised, and both run times.
+def compare_with_lexicalrichness(texts, engine=None):
+    engine = engine or LexicalDiversityEngine()
+
+    start = time.perf_counter()
+    ours = [_safe(engine.analyze, text) for text in texts]
+    engine_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reference = [_safe(lexicalrichness_metrics, text) for text in texts]
+    reference_seconds = time.perf_counter() - start
+
+    pairs = [(a, b) for a, b in zip(ours, reference) if a is not None and b is not None]
+    mismatched = sum(1 for a, b in zip(ours, reference) if (a is None) != (b is None))
+    max_diff = {key: max((abs(a[key] - b[key]) for a, b in pairs), default=0.0)
+                for key in ("ttr", "rttr", "mtld", "hdd", "average")}
+    return max_diff, mismatched, engine_seconds, reference_seconds
+
+
+def main(argv=None):
+    from ingest import iter_records
+
+    parser = argparse.ArgumentParser(
+        description="Check the lexical-diversity engine against lexicalrichness on the email corpus.")
+    parser.add_argument("files", nargs="*",
+                        default=["gpt.json", "gemini.json", "claude.json", "llama.json"],
+                        help="model JSON files whose emails are compared")
+    parser.add_argument("--tolerance", type=float, default=1e-9,
+                        help="largest allowed absolute difference per measure")
+    args = parser.parse_args(argv)
+
+    texts = [record["email"] for file in args.files for record in iter_records(file)]
+    max_diff, mismatched, engine_seconds, reference_seconds = compare_with_lexicalrichness(texts)
+
+    print(f"\nLexical-diversity engine vs lexicalrichness on {len(texts)} emails:")
+    print("=" * 50)
+    for key, diff in max_diff.items():
+        status = "ok" if diff <= args.tolerance else "MISMATCH"
+        print(f"{key:<18}max diff {diff:>10.2e}  {status}")
+    print(f"{'errors':<18}differ on {mismatched} emails")
+    print("-" * 50)
+    print(f"engine:          {engine_seconds:.2f}s")
+    print(f"lexicalrichness: {reference_seconds:.2f}s "
+          f"({reference_seconds / engine_seconds if engine_seconds else float('inf'):.1f}x slower)")
+    print("=" * 50)
+    ok = mismatched == 0 and all(diff <= args.tolerance for diff in max_diff.values())
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
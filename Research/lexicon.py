@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Default lexicon file, next to this module
+DEFAULT_LEXICONS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexicons.json")
+
+# Features that are a property of the token text rather than a word list;
+# each is evaluated once per distinct lowercase form and memoized
+PREDICATES = {
+    "contraction": lambda text: "'" in text,
+}
+
+
+# Define function to hash a lexicon file; used as part of the metric cache version
+def lexicons_digest(path=DEFAULT_LEXICONS_PATH):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()[:12]
+    except OSError:
+        return "missing"
+
+
+# Lexicon feature engine. Every word list is compiled once into spaCy's
+# 64-bit string hashes: one sorted array of all distinct hashes plus a
+# (hash x lexicon) membership matrix. An email is counted in a single pass
+# over doc.to_array([LOWER, IS_ALPHA]): one searchsorted locates every token
+# in the sorted array, and summing the matched membership rows gives every
+# lexicon's count at once. Cost grows with log(lexicon size), not with the
+# number of lexicons times the number of entries. spaCy is imported when an
+# engine is built, so importing this module stays cheap.
+class LexiconEngine:
+    def __init__(self, lexicons, predicates=PREDICATES):
+        from spacy.attrs import IS_ALPHA, LOWER
+        from spacy.strings import hash_string
+
+        self.attrs = [LOWER, IS_ALPHA]
+        self.names = list(lexicons)
+        words = sorted({word.lower() for entries in lexicons.values() for word in entries})
+        hashes = np.array([hash_string(word) for word in words], dtype=np.uint64)
+        order = np.argsort(hashes)
+        self.ids = hashes[order]
+        membership = np.zeros((len(words), len(self.names)), dtype=np.int64)
+        index = {word: i for i, word in enumerate(np.array(words, dtype=object)[order])}
+        for j, name in enumerate(self.names):
+            for word in lexicons[name]:
+                membership[index[word.lower()], j] = 1
+        self.membership = membership
+        self.predicates = dict(predicates)
+        self._predicate_memo = {name: {} for name in self.predicates}
+
+    # Define function to build an engine from a JSON lexicon file
+    @classmethod
+    def from_file(cls, path=DEFAULT_LEXICONS_PATH, predicates=PREDICATES):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), predicates)
+
+    # Define function to evaluate a predicate for each distinct lowercase hash;
+    # results are memoized across emails
+    def _predicate_flags(self, name, unique_ids, strings):
+        memo = self._predicate_memo[name]
+        predicate = self.predicates[name]
+        flags = np.empty(len(unique_ids), dtype=np.int64)
+        for i, key in enumerate(unique_ids.tolist()):
+            flag = memo.get(key)
+            if flag is None:
+                try:
+                    flag = memo[key] = int(predicate(strings[key]))
+                except KeyError:
+                    flag = memo[key] = 0
+            flags[i] = flag
+        return flags
+
+    # Define function to count every lexicon and predicate in one Doc. Returns
+    # {name: count} including "alpha_words", the number of alphabetic tokens.
+    def count(self, doc):
+        counts = dict.fromkeys(self.names, 0)
+        counts.update(dict.fromkeys(self.predicates, 0))
+        counts["alpha_words"] = 0
+        if not len(doc):
+            return counts
+
+        array = doc.to_array(self.attrs)
+        lower = array[:, 0]
+        counts["alpha_words"] = int(array[:, 1].sum())
+
+        if len(self.ids):
+            positions = np.searchsorted(self.ids, lower)
+            positions[positions == len(self.ids)] = 0
+            hits = positions[self.ids[positions] == lower]
+            for name, value in zip(self.names, self.membership[hits].sum(axis=0).tolist()):
+                counts[name] = value
+
+        if self.predicates:
+            unique_ids, inverse = np.unique(lower, return_inverse=True)
+            occurrences = np.bincount(inverse.ravel(), minlength=len(unique_ids))
+            for name in self.predicates:
+                flags = self._predicate_flags(name, unique_ids, doc.vocab.strings)
+                counts[name] = int(flags @ occurrences)
+        return counts
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import sqlite3
+
+# Default location of the on-disk metric cache (relative to the working directory)
+DEFAULT_CACHE_PATH = "metric_cache.sqlite"
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_CHUNK = 500
+
+
+# Define function to hash an email's text; the hash is the cache key
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# Define function to make NumPy scalars JSON-serializable
+def _to_json(value):
+    if hasattr(value, "item"):
+        return value.item()
+    raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+
+# Content-addressed metric cache backed by SQLite. Each row is keyed by
+# (namespace, text hash, metric name, metric version), so bumping one metric's
+# version invalidates only that metric, and edited emails miss naturally.
+class MetricCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, namespace="default"):
+        self.path = path
+        self.namespace = namespace
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS metrics ("
+            " namespace TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " metric TEXT NOT NULL,"
+            " version TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " PRIMARY KEY (namespace, text_hash, metric, version))"
+        )
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    # Define function to fetch cached values for many emails; returns {hash: value}
+    def get_many(self, hashes, metric, version):
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        for start in range(0, len(unique), _LOOKUP_CHUNK):
+            chunk = unique[start:start + _LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                "SELECT text_hash, value FROM metrics"
+                " WHERE namespace = ? AND metric = ? AND version = ?"
+                f" AND text_hash IN ({placeholders})",
+                [self.namespace, metric, str(version), *chunk],
+            )
+            for key, value in rows:
+                found[key] = json.loads(value)
+        return found
+
+    # Define function to store computed values; items is an iterable of (hash, value)
+    def put_many(self, metric, version, items):
+        rows = [(self.namespace, key, metric, str(version), json.dumps(value, default=_to_json))
+                for key, value in items]
+        if not rows:
+            return
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO metrics (namespace, text_hash, metric, version, value)"
+            " VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+        self.conn.commit()
@@ -0,0 +1,428 @@
+import argparse
+import json
+import sys
+import zlib
+
+import numpy as np
+
+from lexical_diversity import tokenize
+
+# MinHash settings: NUM_PERM hash permutations per signature, split into
+# BANDS bands of NUM_PERM // BANDS rows for locality-sensitive hashing. Two
+# emails land in the same bucket of at least one band with probability
+# 1 - (1 - J^rows)^bands for Jaccard similarity J. With 16 bands of 8 rows
+# the S-curve's midpoint, (1 / bands)^(1 / rows), is about 0.71: pairs at
+# J = 0.5 become candidates 6% of the time and pairs at J = 0.85 99.7% of
+# the time. The curve sits at THRESHOLD, so emails that merely share a
+# template's greeting and sign-off are rarely compared, and candidates join a
+# duplicate cluster only when their estimated similarity reaches THRESHOLD.
+NUM_PERM = 128
+BANDS = 16
+THRESHOLD = 0.7
+
+# Emails are compared as sets of SHINGLE_SIZE-word shingles
+SHINGLE_SIZE = 3
+
+# Templatedness is measured on the shingles themselves: a shingle counts as
+# template text when it appears in at least this share of the reference
+# emails (and in at least one other email). Template openings and sign-offs
+# are shared by far more emails than that, while the emails as a whole stay
+# well below THRESHOLD similarity (on the bundled corpus the median nearest
+# neighbour is at about 0.13 Jaccard), so the duplicate clusters cannot show
+# them.
+TEMPLATE_SHARE = 0.02
+
+# Permutations are multiply-shift hashes of the 32-bit shingle hashes:
+# the top 32 bits of (a * x + b) mod 2^64 for random 64-bit a (odd) and b.
+# uint64 arithmetic wraps, so the modulus is free.
+_SHIFT = np.uint64(32)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+# Initial number of signatures preallocated; capacity doubles when full
+INITIAL_CAPACITY = 1024
+
+# Default location of a saved index
+DEFAULT_INDEX_PATH = "near_duplicates.npz"
+
+
+# Define function to draw the permutation coefficients of a seed
+def permutations(num_perm=NUM_PERM, seed=1):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 1 << 64, size=num_perm, dtype=np.uint64, endpoint=False) | np.uint64(1)
+    b = rng.integers(0, 1 << 64, size=num_perm, dtype=np.uint64, endpoint=False)
+    return a, b
+
+
+# Union-find over email ids. The smaller id always becomes the root, so a
+# cluster's id is the id of its earliest inserted email and does not change
+# when later inserts join it.
+class Clusters:
+    def __init__(self):
+        self.parent = []
+
+    # Define function to add a singleton cluster for the next id
+    def add(self):
+        self.parent.append(len(self.parent))
+
+    # Define function to find the cluster id of an email
+    def find(self, i):
+        parent = self.parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    # Define function to merge the clusters of two emails
+    def union(self, i, j):
+        a, b = self.find(i), self.find(j)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+
+# MinHash/LSH near-duplicate index. Each email is tokenized like the
+# lexical-diversity metric, turned into a set of word shingles and reduced to
+# a NUM_PERM MinHash signature in one vectorized (shingles x permutations)
+# pass. Each band of the signature is a bucket key, so an insert only
+# compares the new email with emails sharing a bucket; building the index is
+# near-linear in the number of emails. For every email the index tracks its
+# duplicate cluster and its highest estimated similarity to a candidate
+# (similarities well below THRESHOLD mostly read as 0), both within its own
+# model and across models. Templatedness is computed separately from the
+# stored shingles (see templatedness()). Emails without any words are not
+# indexed: they would all share one signature and form a single spurious
+# cluster.
+class NearDuplicateIndex:
+    def __init__(self, num_perm=NUM_PERM, bands=BANDS, threshold=THRESHOLD,
+                 shingle_size=SHINGLE_SIZE, seed=1, template_share=TEMPLATE_SHARE):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.band_rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.template_share = template_share
+        self.a, self.b = permutations(num_perm, seed)
+
+        self.keys = []
+        self.skipped = []
+        self.models = []
+        self.size = 0
+        self._signatures = np.zeros((INITIAL_CAPACITY, num_perm), dtype=np.uint32)
+        self._model_codes = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self._model_index = {}
+        self._ids = {}
+        self._buckets = [{} for _ in range(bands)]
+        self._token_hashes = {}
+        self._shingles = []
+
+        self.similarity_within = []
+        self.similarity_across = []
+        self.within_clusters = Clusters()
+        self.across_clusters = Clusters()
+
+    def __len__(self):
+        return self.size
+
+    # Define function to hash a token list into its distinct 32-bit shingle
+    # hashes; token hashes are memoized across emails
+    def shingles(self, tokens):
+        memo = self._token_hashes
+        hashes = np.fromiter((memo.setdefault(token, zlib.crc32(token.encode("utf-8")))
+                              for token in tokens), dtype=np.uint64, count=len(tokens))
+        k = min(self.shingle_size, len(hashes))
+        if k == 0:
+            return np.zeros(1, dtype=np.uint64)
+        # Combine k consecutive token hashes with a polynomial rolling hash
+        combined = np.zeros(len(hashes) - k + 1, dtype=np.uint64)
+        for offset in range(k):
+            combined = combined * np.uint64(1000003) + hashes[offset:len(hashes) - k + 1 + offset]
+        return np.unique(combined & _MAX_HASH)
+
+    # Define function to compute the MinHash signature of one text
+    def signature(self, text):
+        return self.signature_of_shingles(self.shingles(tokenize(text)))
+
+    # Define function to compute the MinHash signature of a shingle set
+    def signature_of_shingles(self, shingles):
+        permuted = (shingles[:, None] * self.a + self.b) >> _SHIFT
+        return permuted.min(axis=0).astype(np.uint32)
+
+    # Define function to grow the signature arrays to at least the given capacity
+    def _reserve(self, capacity):
+        if capacity <= len(self._signatures):
+            return
+        new_capacity = max(capacity, 2 * len(self._signatures))
+        signatures = np.zeros((new_capacity, self.num_perm), dtype=np.uint32)
+        signatures[:self.size] = self._signatures[:self.size]
+        model_codes = np.zeros(new_capacity, dtype=np.int32)
+        model_codes[:self.size] = self._model_codes[:self.size]
+        self._signatures = signatures
+        self._model_codes = model_codes
+
+    # Define function to insert one email under a (model, email index) key.
+    # Returns its id in the index; a key that is already indexed is skipped,
+    # so re-adding a model file only inserts its new emails. Emails without
+    # words are recorded in skipped and return None.
+    def insert(self, key, text):
+        i = self._ids.get(key)
+        if i is not None:
+            return i
+        tokens = tokenize(text)
+        if not tokens:
+            if key not in self.skipped:
+                self.skipped.append(key)
+            return None
+        shingles = self.shingles(tokens)
+        return self.insert_signature(key, self.signature_of_shingles(shingles), shingles)
+
+    # Define function to insert a precomputed signature and its shingle hashes
+    def insert_signature(self, key, signature, shingles):
+        i = self._ids.get(key)
+        if i is not None:
+            return i
+        model = key[0]
+        code = self._model_index.get(model)
+        if code is None:
+            code = self._model_index[model] = len(self.models)
+            self.models.append(model)
+
+        i = self.size
+        self._reserve(i + 1)
+        self._signatures[i] = signature
+        self._model_codes[i] = code
+        self.keys.append(key)
+        self._ids[key] = i
+        self._shingles.append(np.asarray(shingles, dtype=np.uint64))
+        self.similarity_within.append(0.0)
+        self.similarity_across.append(0.0)
+        self.within_clusters.add()
+        self.across_clusters.add()
+        self.size += 1
+
+        # Collect every earlier email sharing a bucket in any band
+        candidates = set()
+        for band, buckets in enumerate(self._buckets):
+            bucket_key = signature[band * self.band_rows:(band + 1) * self.band_rows].tobytes()
+            members = buckets.setdefault(bucket_key, [])
+            candidates.update(members)
+            members.append(i)
+        if not candidates:
+            return i
+
+        # Estimated Jaccard similarity: the fraction of equal signature entries
+        candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        similarity = (self._signatures[candidates] == signature).mean(axis=1)
+        same_model = self._model_codes[candidates] == code
+        for j, s, same in zip(candidates.tolist(), similarity.tolist(), same_model.tolist()):
+            scores = self.similarity_within if same else self.similarity_across
+            scores[i] = max(scores[i], s)
+            scores[j] = max(scores[j], s)
+            if s >= self.threshold:
+                self.across_clusters.union(i, j)
+                if same:
+                    self.within_clusters.union(i, j)
+        return i
+
+    # Define function to insert every email of one model, in file order
+    def add_model(self, model, texts):
+        for idx, text in enumerate(texts):
+            self.insert((model, idx), text)
+
+    # Define function to compute every email's templatedness: the share of its
+    # shingles that count as template text (see TEMPLATE_SHARE) among all
+    # indexed emails, among the other emails of its own model, and among the
+    # emails of the other models. Shingle document frequencies come from one
+    # np.unique over every stored shingle and two bincounts, so the scores
+    # always reflect the whole index, including emails inserted later.
+    # Returns three arrays (overall, within, across) in insertion order.
+    def templatedness(self):
+        n = self.size
+        if not n:
+            return np.zeros(0), np.zeros(0), np.zeros(0)
+        lengths = np.array([len(shingles) for shingles in self._shingles])
+        owner = np.repeat(np.arange(n), lengths)
+        _, shingle_ids = np.unique(np.concatenate(self._shingles), return_inverse=True)
+        shingle_ids = shingle_ids.ravel()
+
+        # Shingles are distinct within an email, so occurrence counts are
+        # counts of emails
+        codes = self._model_codes[:n].astype(np.int64)
+        model_sizes = np.bincount(codes, minlength=len(self.models))[codes][owner]
+        model_keys = shingle_ids * len(self.models) + codes[owner]
+        total = np.bincount(shingle_ids)[shingle_ids]
+        own = np.bincount(model_keys)[model_keys]
+
+        share = self.template_share
+        flags = (total >= np.maximum(2, share * n),
+                 own >= np.maximum(2, share * model_sizes),
+                 total - own >= np.maximum(1, share * (n - model_sizes)))
+        return tuple(np.bincount(owner, weights=flag, minlength=n) / lengths for flag in flags)
+
+    # Define function to get the results of every email as one dict per email:
+    # model, email index, templatedness overall, within the model and across
+    # models, the highest estimated similarity to another email of the same
+    # and of other models, and both duplicate cluster ids, given as the
+    # (model, email index) key of the cluster's first email
+    def rows(self):
+        overall, within, across = self.templatedness()
+        rows = []
+        for i, (model, idx) in enumerate(self.keys):
+            within_root = self.keys[self.within_clusters.find(i)]
+            across_root = self.keys[self.across_clusters.find(i)]
+            rows.append({
+                "model": model,
+                "email_index": idx,
+                "templatedness": float(overall[i]),
+                "templatedness_within": float(within[i]),
+                "templatedness_across": float(across[i]),
+                "similarity_within": self.similarity_within[i],
+                "similarity_across": self.similarity_across[i],
+                "cluster_within": f"{within_root[0]}:{within_root[1]}",
+                "cluster_across": f"{across_root[0]}:{across_root[1]}",
+            })
+        return rows
+
+    # Define function to list the duplicate clusters with more than one email,
+    # largest first; across=False lists the within-model clusters
+    def clusters(self, across=True):
+        union_find = self.across_clusters if across else self.within_clusters
+        members = {}
+        for i in range(self.size):
+            members.setdefault(union_find.find(i), []).append(self.keys[i])
+        return sorted((group for group in members.values() if len(group) > 1),
+                      key=len, reverse=True)
+
+    # Define function to summarize every model: mean templatedness overall,
+    # within and across models, and the share of its emails in a multi-email
+    # cluster
+    def summary(self):
+        summary = {}
+        codes = self._model_codes[:self.size]
+        overall, within, across = self.templatedness()
+        clustered = np.zeros(self.size, dtype=bool)
+        for union_find in (self.within_clusters, self.across_clusters):
+            roots = np.array([union_find.find(i) for i in range(self.size)], dtype=np.int64)
+            sizes = np.bincount(roots, minlength=self.size)
+            clustered |= sizes[roots] > 1
+        for code, model in enumerate(self.models):
+            mask = codes == code
+            summary[model] = {
+                "emails": int(mask.sum()),
+                "templatedness": float(overall[mask].mean()),
+                "templatedness_within": float(within[mask].mean()),
+                "templatedness_across": float(across[mask].mean()),
+                "duplicate_share": float(clustered[mask].mean()),
+            }
+        return summary
+
+    # Define function to store the signatures, shingle hashes and keys in one
+    # .npz file; buckets and clusters are rebuilt on load
+    def save(self, path=DEFAULT_INDEX_PATH):
+        np.savez(path,
+                 signatures=self._signatures[:self.size],
+                 shingles=np.concatenate(self._shingles or [np.zeros(0, dtype=np.uint64)]),
+                 shingle_counts=np.array([len(s) for s in self._shingles], dtype=np.int64),
+                 models=np.array([model for model, _ in self.keys], dtype=str),
+                 email_index=np.array([idx for _, idx in self.keys], dtype=np.int64),
+                 settings=np.array([self.num_perm, self.bands, self.shingle_size, self.seed]),
+                 threshold=np.array(self.threshold),
+                 template_share=np.array(self.template_share))
+
+    # Define function to reload a saved index, optionally with a new
+    # duplicate threshold or template share; new emails can then be inserted
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_PATH, threshold=None, template_share=None):
+        with np.load(path) as data:
+            num_perm, bands, shingle_size, seed = (int(v) for v in data["settings"])
+            if threshold is None:
+                threshold = float(data["threshold"])
+            if template_share is None:
+                template_share = float(data["template_share"])
+            index = cls(num_perm, bands, threshold, shingle_size, seed, template_share)
+            index._reserve(len(data["signatures"]))
+            shingles = np.split(data["shingles"], np.cumsum(data["shingle_counts"])[:-1])
+            for model, idx, signature, email_shingles in zip(
+                    data["models"], data["email_index"].tolist(), data["signatures"], shingles):
+                index.insert_signature((str(model), idx), signature, email_shingles)
+        return index
+
+
+# Define function to print the per-model summary and the largest clusters
+def print_report(index, texts_by_key, top=5):
+    print("\nNear-Duplicate Summary:")
+    print("=" * 80)
+    print(f"{'model':<26}{'emails':>8}{'templated':>10}{'within':>10}{'across':>10}"
+          f"{'in cluster':>14}")
+    print("-" * 80)
+    for model, row in index.summary().items():
+        print(f"{model:<26}{row['emails']:>8}{row['templatedness']:>10.3f}"
+              f"{row['templatedness_within']:>10.3f}{row['templatedness_across']:>10.3f}"
+              f"{row['duplicate_share']:>14.1%}")
+    print("=" * 80)
+
+    if index.skipped:
+        print(f"Skipped {len(index.skipped)} emails without any words")
+
+    clusters = index.clusters()
+    print(f"\n{len(clusters)} duplicate clusters (similarity >= {index.threshold})")
+    for group in clusters[:top]:
+        models = sorted({model for model, _ in group})
+        sample = " ".join(texts_by_key.get(group[0], "").split()[:12])
+        print(f"- {len(group)} emails from {', '.join(models)}: \"{sample}...\"")
+
+
+def main(argv=None):
+    from comparemore import DEFAULT_JSON_FILES, select_json_files, _split_option
+    from ingest import iter_records
+
+    parser = argparse.ArgumentParser(
+        description="Find templated and near-duplicate emails within and across models.")
+    parser.add_argument("--models", type=_split_option, default=None,
+                        help="comma-separated model JSON files (default: "
+                             f"{','.join(DEFAULT_JSON_FILES.values())})")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="estimated Jaccard similarity at which emails are duplicates")
+    parser.add_argument("--template-share", type=float, default=None,
+                        help="share of emails a shingle must appear in to count as template "
+                             f"text (default: {TEMPLATE_SHARE})")
+    parser.add_argument("--index", default=None,
+                        help="saved index to load first; the model files are added to it")
+    parser.add_argument("--save-index", default=None,
+                        help="store the index (signatures and keys) in this .npz file")
+    parser.add_argument("--output", default=None,
+                        help="write every email's templatedness and cluster ids as JSON")
+    parser.add_argument("--top", type=int, default=5, help="largest clusters to print")
+    args = parser.parse_args(argv)
+
+    json_files = select_json_files(args.models) if args.models else DEFAULT_JSON_FILES
+    if args.index:
+        index = NearDuplicateIndex.load(args.index, args.threshold, args.template_share)
+        print(f"Loaded {len(index)} emails from {args.index}")
+    else:
+        index = NearDuplicateIndex(threshold=args.threshold,
+                                   template_share=args.template_share or TEMPLATE_SHARE)
+
+    texts_by_key = {}
+    for model, path in json_files.items():
+        print(f"Indexing {model}...")
+        texts = [record["email"] for record in iter_records(path)]
+        texts_by_key.update(((model, idx), text) for idx, text in enumerate(texts))
+        index.add_model(model, texts)
+
+    print_report(index, texts_by_key, args.top)
+
+    if args.save_index:
+        index.save(args.save_index)
+        print(f"\nSaved index with {len(index)} emails to {args.save_index}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(index.rows(), f, indent=4)
+        print(f"Wrote per-email results to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+import argparse
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from transformers import GPT2LMHeadModel, GPT2TokenizerFast
+from transformers.pytorch_utils import Conv1D
+
+from timing import measure
+
+# GPT-2 context window used for scoring, and the rough chars-per-token ratio
+# used to pre-truncate very long texts before tokenizing
+MAX_LENGTH = 512
+CHARS_PER_TOKEN = 4
+
+# Value reported when an email cannot be scored
+DEFAULT_PERPLEXITY = 100
+
+# Sequence positions whose vocabulary logits are materialized at once when
+# computing the token loss (8 x 64 x 50257 float32 logits are about 100 MB)
+LOSS_CHUNK_SIZE = 64
+
+
+# Selectable perplexity backends: name -> (checkpoint, quantization,
+# local_files_only). The distilled checkpoint is only read from the local
+# Hugging Face cache, never downloaded during a scoring run.
+PERPLEXITY_BACKENDS = {
+    "gpt2": ("gpt2", None, False),             # Full-precision GPT-2 (reference)
+    "gpt2-int8": ("gpt2", "int8", False),      # GPT-2 with dynamic int8 linear layers
+    "distilgpt2": ("distilgpt2", None, True),  # Distilled 6-layer GPT-2
+}
+
+DEFAULT_BACKEND = "gpt2"
+
+
+# Define function to load the GPT-2 model and fast tokenizer
+def load_gpt2(model_name="gpt2", local_files_only=False):
+    tokenizer = GPT2TokenizerFast.from_pretrained(model_name, local_files_only=local_files_only)
+    model = GPT2LMHeadModel.from_pretrained(model_name, local_files_only=local_files_only)
+    model.eval()
+    return model, tokenizer
+
+
+# Define function to replace GPT-2's Conv1D layers (transposed linear layers)
+# with equivalent nn.Linear modules, so dynamic quantization can reach them
+def conv1d_to_linear(module):
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features)
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+        else:
+            conv1d_to_linear(child)
+    return module
+
+
+# Define function to quantize a model's linear layers to int8 weights with
+# dynamically quantized activations (CPU only)
+def quantize_int8(model):
+    conv1d_to_linear(model)
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+# Define function to load a perplexity backend by name; returns (model, tokenizer)
+def load_backend(backend=DEFAULT_BACKEND):
+    checkpoint, quantization, local_files_only = PERPLEXITY_BACKENDS[backend]
+    model, tokenizer = load_gpt2(checkpoint, local_files_only=local_files_only)
+    if quantization == "int8":
+        model = quantize_int8(model)
+    return model, tokenizer
+
+
+# Batched perplexity engine: the corpus is tokenized once, grouped into
+# length-sorted, right-padded batches with attention masks, and each batch is
+# scored with a single forward pass through the transformer. The LM head and
+# the per-token loss are then applied loss_chunk_size positions at a time, so
+# the full (batch x length x vocabulary) logits tensor is never built, and
+# padding never contributes to an email's score. The PyTorch thread count is
+# process-wide state and is left to the caller (see main).
+class PerplexityEngine:
+    def __init__(self, model, tokenizer, batch_size=8, max_length=MAX_LENGTH,
+                 loss_chunk_size=LOSS_CHUNK_SIZE):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.batch_size = max(1, batch_size)
+        self.max_length = max_length
+        self.loss_chunk_size = max(1, loss_chunk_size)
+        self.pad_token_id = tokenizer.eos_token_id
+
+    # Define function to tokenize a list of texts in one call, applying the
+    # same character pre-truncation and token truncation as single-email scoring
+    def tokenize(self, texts):
+        max_chars = self.max_length * CHARS_PER_TOKEN
+        texts = [text[:max_chars] if len(text) > max_chars else text for text in texts]
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+        return encoded["input_ids"]
+
+    # Define function to score one padded batch; returns a perplexity per row
+    def _score_batch(self, batch_ids):
+        longest = max(len(ids) for ids in batch_ids)
+        input_ids = torch.full((len(batch_ids), longest), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(batch_ids), longest), dtype=torch.long)
+        for row, ids in enumerate(batch_ids):
+            input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, :len(ids)] = 1
+
+        # Shift so each position predicts the next token, then mask out padding
+        shift_labels = input_ids[:, 1:]
+        shift_mask = attention_mask[:, 1:].float()
+        token_loss = torch.zeros(shift_labels.shape, dtype=torch.float32)
+        with torch.no_grad():
+            hidden = self.model.transformer(input_ids=input_ids,
+                                            attention_mask=attention_mask).last_hidden_state
+            for start in range(0, longest - 1, self.loss_chunk_size):
+                end = min(start + self.loss_chunk_size, longest - 1)
+                logits = self.model.lm_head(hidden[:, start:end]).float()
+                token_loss[:, start:end] = F.cross_entropy(
+                    logits.transpose(1, 2), shift_labels[:, start:end], reduction="none"
+                )
+        token_counts = shift_mask.sum(dim=1)
+        # A one-token email has no predicted positions; like the labels= path,
+        # its mean loss is undefined (NaN)
+        seq_loss = (token_loss * shift_mask).sum(dim=1) / token_counts
+        return torch.exp(seq_loss).tolist()
+
+    # Define function to score pre-tokenized sequences, returned in input order.
+    # Indices of sequences that fail get DEFAULT_PERPLEXITY and are added to
+    # failed when a list is given.
+    def score_ids(self, all_ids, failed=None):
+        results = [DEFAULT_PERPLEXITY] * len(all_ids)
+        order = sorted((i for i, ids in enumerate(all_ids) if ids),
+                       key=lambda i: len(all_ids[i]), reverse=True)
+
+        for start in range(0, len(order), self.batch_size):
+            batch_idx = order[start:start + self.batch_size]
+            try:
+                values = self._score_batch([all_ids[i] for i in batch_idx])
+            except Exception as e:
+                print(f"Perplexity batch error: {e}; scoring emails individually")
+                values = []
+                for i in batch_idx:
+                    try:
+                        values.extend(self._score_batch([all_ids[i]]))
+                    except Exception as e:
+                        print(f"Perplexity calculation error: {e}")
+                        values.append(DEFAULT_PERPLEXITY)
+                        if failed is not None:
+                            failed.append(i)
+            for i, value in zip(batch_idx, values):
+                results[i] = value
+
+        return results
+
+    # Define function to compute perplexity for every text in a corpus; see
+    # score_ids for failed
+    def score(self, texts, failed=None):
+        try:
+            all_ids = self.tokenize(texts)
+        except Exception as e:
+            print(f"Perplexity tokenization error: {e}")
+            if failed is not None:
+                failed.extend(range(len(texts)))
+            return [DEFAULT_PERPLEXITY] * len(texts)
+        return self.score_ids(all_ids, failed)
+
+
+# Define function to compute Spearman rank correlation (ranks by argsort;
+# ties are rare for perplexities and are broken by position)
+def spearman(a, b):
+    ranks_a = np.argsort(np.argsort(a)).astype(np.float64)
+    ranks_b = np.argsort(np.argsort(b)).astype(np.float64)
+    return float(np.corrcoef(ranks_a, ranks_b)[0, 1])
+
+
+# Define function to compare backends against full GPT-2 on a list of texts.
+# Returns {backend: {"emails_per_sec", "spearman", "median_ratio"}} where the
+# correlation and ratio are relative to the reference backend's scores.
+# Throughput is measured with timing.measure (warm-up, then the fastest of
+# `repeat` runs), the same harness as the perplexity[batch] benchmark.
+def calibrate(texts, backends, reference=DEFAULT_BACKEND, batch_size=8, repeat=1):
+    results = {}
+    scores = {}
+    for backend in [reference] + [name for name in backends if name != reference]:
+        print(f"Scoring {len(texts)} emails with {backend}...")
+        try:
+            model, tokenizer = load_backend(backend)
+        except Exception as e:
+            print(f"Could not load {backend}: {e}")
+            continue
+        engine = PerplexityEngine(model, tokenizer, batch_size=batch_size)
+        scored = []
+        timing = measure(lambda batch: scored.append(engine.score(batch)), texts, repeat,
+                         memory=False)
+        scores[backend] = np.array(scored[-1], dtype=np.float64)
+        results[backend] = {"emails_per_sec": timing["emails_per_sec"]}
+
+    if reference in scores:
+        for backend, values in scores.items():
+            valid = np.isfinite(values) & np.isfinite(scores[reference])
+            results[backend]["spearman"] = spearman(values[valid], scores[reference][valid])
+            results[backend]["median_ratio"] = float(np.median(values[valid] / scores[reference][valid]))
+    return results
+
+
+def main(argv=None):
+    from ingest import iter_records
+
+    parser = argparse.ArgumentParser(
+        description="Calibrate perplexity backends against full GPT-2 on the email corpus.")
+    parser.add_argument("files", nargs="*",
+                        default=["gpt.json", "gemini.json", "claude.json", "llama.json"],
+                        help="model JSON files whose emails are scored")
+    parser.add_argument("--backends", default=",".join(PERPLEXITY_BACKENDS),
+                        help="comma-separated backends to compare")
+    parser.add_argument("--limit", type=int, default=None, help="score at most this many emails")
+    parser.add_argument("--batch-size", type=int, default=8, help="emails per forward pass")
+    parser.add_argument("--threads", type=int, default=None, help="PyTorch CPU threads")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="timed runs per backend; the fastest is reported")
+    args = parser.parse_args(argv)
+
+    texts = [record["email"] for file in args.files for record in iter_records(file)]
+    texts = texts[:args.limit]
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+    unknown = [name for name in backends if name not in PERPLEXITY_BACKENDS]
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(unknown)}")
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    results = calibrate(texts, backends, batch_size=args.batch_size, repeat=args.repeat)
+
+    print("\nPerplexity Backend Calibration:")
+    print("=" * 60)
+    print(f"{'backend':<14}{'emails/s':>12}{'speedup':>10}{'spearman':>11}{'median ratio':>13}")
+    print("-" * 60)
+    reference_speed = results.get(DEFAULT_BACKEND, {}).get("emails_per_sec")
+    for backend, result in results.items():
+        speedup = result["emails_per_sec"] / reference_speed if reference_speed else float("nan")
+        print(f"{backend:<14}{result['emails_per_sec']:>12.2f}{speedup:>9.2f}x"
+              f"{result.get('spearman', float('nan')):>11.4f}"
+              f"{result.get('median_ratio', float('nan')):>13.3f}")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
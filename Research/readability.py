@@ -0,0 +1,221 @@
+import argparse
+import math
+import os
+import re
+import sys
+import time
+
+from pyphen import Pyphen
+
+# Dale-Chall easy word list (the list textstat ships), next to this module
+DEFAULT_EASY_WORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                       "easy_words.txt")
+
+# Word, sentence and syllable rules follow textstat 0.7.3-0.7.4 (en_US, default
+# settings; later releases count syllables with cmudict instead of pyphen),
+# so every index matches textstat.<index>(text) for the same text:
+# - words: whitespace-split after removing punctuation (apostrophes included)
+# - sentences: regex runs ending in . ! or ?, ignoring runs of two words or fewer
+# - syllables: pyphen hyphenation points + 1 per word
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s")
+_SENTENCE = re.compile(r"\b[^.!?]+[.!?]*", re.UNICODE)
+_DIFFICULT_CANDIDATE = re.compile(r"[\w\='‘’]+")
+
+# Syllable thresholds of the difficult-word counts: Gunning fog (textstat's
+# English setting), Dale-Chall (every word outside the easy list) and the
+# difficult-word ratio reported by analyze_readability
+FOG_SYLLABLES = 3
+DALE_CHALL_SYLLABLES = 0
+DIFFICULT_SYLLABLES = 2
+
+# Grade-level indices averaged into average_grade
+GRADE_INDICES = ("flesch_kincaid", "gunning_fog", "smog", "coleman_liau", "ari")
+
+
+# Define function to round like textstat's legacy rounding (half away from zero)
+def legacy_round(number, points=0):
+    p = 10 ** points
+    return float(math.floor((number * p) + math.copysign(0.5, number))) / p
+
+
+# Define function to load the Dale-Chall easy word list, one word per line
+def load_easy_words(path=DEFAULT_EASY_WORDS_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+# Single-pass readability engine. Each email is tokenized once into the base
+# counts (words, sentences, syllables, polysyllables, characters, letters and
+# difficult words at every threshold), and every index is derived from those
+# counts. Syllables are looked up once per word type and memoized across
+# emails.
+class ReadabilityEngine:
+    def __init__(self, lang="en_US", easy_words=None):
+        self.pyphen = Pyphen(lang=lang)
+        self.easy_words = load_easy_words() if easy_words is None else set(easy_words)
+        self._syllables = {}
+
+    # Define function to count the syllables of one cleaned, lowercased word
+    def syllables(self, word):
+        count = self._syllables.get(word)
+        if count is None:
+            count = self._syllables[word] = len(self.pyphen.positions(word)) + 1 if word else 0
+        return count
+
+    # Define function to compute the base counts of one text
+    def counts(self, text):
+        words = _PUNCTUATION.sub("", text.lower()).split()
+        sentences = _SENTENCE.findall(text)
+        short = sum(1 for sentence in sentences
+                    if len(_PUNCTUATION.sub("", sentence).split()) <= 2)
+
+        # Polysyllables are counted over the raw whitespace-separated tokens
+        polysyllables = sum(1 for token in text.split()
+                            if self.syllables(_PUNCTUATION.sub("", token.lower())) >= 3)
+
+        # Difficult words are distinct words outside the easy list; record the
+        # syllable count of each so every threshold comes from one lookup
+        difficult = [self.syllables(_PUNCTUATION.sub("", word))
+                     for word in set(_DIFFICULT_CANDIDATE.findall(text.lower()))
+                     if word not in self.easy_words]
+
+        no_spaces = _WHITESPACE.sub("", text)
+        return {
+            "words": len(words),
+            "sentences": max(1, len(sentences) - short),
+            "syllables": sum(self.syllables(word) for word in words),
+            "polysyllables": polysyllables,
+            "characters": len(no_spaces),
+            "letters": len(_PUNCTUATION.sub("", no_spaces)),
+            "tokens": len(text.split()),
+            "difficult_fog": sum(1 for n in difficult if n >= FOG_SYLLABLES),
+            "difficult_dale_chall": sum(1 for n in difficult if n >= DALE_CHALL_SYLLABLES),
+            "difficult": sum(1 for n in difficult if n >= DIFFICULT_SYLLABLES),
+        }
+
+    # Define function to derive every index from the base counts, with
+    # textstat's intermediate rounding and zero-division fallbacks
+    def indices(self, counts):
+        words = counts["words"]
+        sentences = counts["sentences"]
+
+        avg_sentence_length = legacy_round(words / sentences, 1)
+        avg_syllables = legacy_round(counts["syllables"] / words, 1) if words else 0.0
+
+        flesch_kincaid = legacy_round(0.39 * avg_sentence_length + 11.8 * avg_syllables - 15.59, 1)
+
+        if words:
+            fog = legacy_round(0.4 * (avg_sentence_length
+                                      + counts["difficult_fog"] / words * 100), 2)
+        else:
+            fog = 0.0
+
+        if sentences >= 3:
+            smog = legacy_round(1.043 * (30 * (counts["polysyllables"] / sentences)) ** .5
+                                + 3.1291, 1)
+        else:
+            smog = 0.0
+
+        letters = legacy_round((legacy_round(counts["letters"] / words, 2) if words else 0.0)
+                               * 100, 2)
+        sentence_rate = legacy_round((legacy_round(sentences / words, 2) if words else 0.0)
+                                     * 100, 2)
+        coleman_liau = legacy_round(0.058 * letters - 0.296 * sentence_rate - 15.8, 2)
+
+        if words:
+            ari = legacy_round(4.71 * legacy_round(counts["characters"] / words, 2)
+                               + 0.5 * legacy_round(words / sentences, 2) - 21.43, 1)
+        else:
+            ari = 0.0
+
+        if words:
+            per_difficult = 100 - (words - counts["difficult_dale_chall"]) / words * 100
+            dale_chall = 0.1579 * per_difficult + 0.0496 * avg_sentence_length
+            if per_difficult > 5:
+                dale_chall += 3.6365
+            dale_chall = legacy_round(dale_chall, 2)
+        else:
+            dale_chall = 0.0
+
+        return {
+            "flesch_kincaid": flesch_kincaid,
+            "gunning_fog": fog,
+            "smog": smog,
+            "coleman_liau": coleman_liau,
+            "ari": ari,
+            "dale_chall": dale_chall,
+            "difficult_words": counts["difficult"] / max(1, counts["tokens"]),
+        }
+
+    # Define function to compute every readability metric for one text,
+    # including the average of the grade-level indices
+    def analyze(self, text):
+        metrics = self.indices(self.counts(text))
+        metrics["average_grade"] = sum(metrics[m] for m in GRADE_INDICES) / len(GRADE_INDICES)
+        return metrics
+
+
+# Define function to compute the same metrics with textstat, one call per index
+def textstat_metrics(text):
+    import textstat
+    metrics = {
+        "flesch_kincaid": textstat.flesch_kincaid_grade(text),
+        "gunning_fog": textstat.gunning_fog(text),
+        "smog": textstat.smog_index(text),
+        "coleman_liau": textstat.coleman_liau_index(text),
+        "ari": textstat.automated_readability_index(text),
+        "dale_chall": textstat.dale_chall_readability_score(text),
+        "difficult_words": textstat.difficult_words(text) / max(1, len(text.split()))
+    }
+    metrics["average_grade"] = sum(metrics[m] for m in GRADE_INDICES) / len(GRADE_INDICES)
+    return metrics
+
+
+# Define function to compare the engine with textstat on a list of texts.
+# Returns the largest absolute difference per metric and both run times.
+def compare_with_textstat(texts, engine=None):
+    engine = engine or ReadabilityEngine()
+
+    start = time.perf_counter()
+    ours = [engine.analyze(text) for text in texts]
+    engine_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reference = [textstat_metrics(text) for text in texts]
+    textstat_seconds = time.perf_counter() - start
+
+    max_diff = {key: max((abs(a[key] - b[key]) for a, b in zip(ours, reference)), default=0.0)
+                for key in reference[0]} if texts else {}
+    return max_diff, engine_seconds, textstat_seconds
+
+
+def main(argv=None):
+    from ingest import iter_records
+
+    parser = argparse.ArgumentParser(
+        description="Check the readability engine against textstat on the email corpus.")
+    parser.add_argument("files", nargs="*",
+                        default=["gpt.json", "gemini.json", "claude.json", "llama.json"],
+                        help="model JSON files whose emails are compared")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="largest allowed absolute difference per metric")
+    args = parser.parse_args(argv)
+
+    texts = [record["email"] for file in args.files for record in iter_records(file)]
+    max_diff, engine_seconds, textstat_seconds = compare_with_textstat(texts)
+
+    print(f"\nReadability engine vs textstat on {len(texts)} emails:")
+    print("=" * 50)
+    for key, diff in max_diff.items():
+        status = "ok" if diff <= args.tolerance else "MISMATCH"
+        print(f"{key:<18}max diff {diff:>10.6f}  {status}")
+    print("-" * 50)
+    print(f"engine:   {engine_seconds:.2f}s")
+    print(f"textstat: {textstat_seconds:.2f}s "
+          f"({textstat_seconds / engine_seconds if engine_seconds else float('inf'):.1f}x slower)")
+    print("=" * 50)
+    return 0 if all(diff <= args.tolerance for diff in max_diff.values()) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,380 @@
+import argparse
+import base64
+import html
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Default locations of the stored aggregates and the rendered report
+DEFAULT_AGGREGATES_PATH = "model_scores.json"
+DEFAULT_HTML_NAME = "report.html"
+
+# Figure file names, written to the output directory (with an optional prefix)
+FIGURE_FILES = {
+    "metrics": "metrics_comparison.png",
+    "final": "final_scores.png",
+    "radar": "radar_comparison.png",
+}
+
+REPORT_DPI = 300
+
+# Figures are rendered on up to this many processes
+RENDER_WORKERS = min(len(FIGURE_FILES), os.cpu_count() or 1)
+
+
+# Define function to import pyplot with the non-interactive Agg backend, so
+# rendering never opens a window or blocks, including on headless servers
+def _pyplot():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+# Define function to turn an aggregate key into a chart title
+def metric_title(metric):
+    return metric.replace("avg_", "").replace("_", " ").title()
+
+
+# Define function to collect everything the report stage needs into one
+# JSON-serializable dict. metrics lists the charted metrics in order;
+# bootstrap (optional) is a BootstrapResult whose intervals and win
+# probabilities are included; weights (optional) are the metric weights
+# behind model_scores, stored for sensitivity.py; groups (optional) maps a
+# label to its per-group rankings and metric means and stds from
+# comparemore.grouped_rankings();
+# spread (optional) holds each model's per-metric std, p50 and p95 from
+# StreamingAggregator.spread().
+def build_report(final_scores, normalized_scores, model_scores, metrics,
+                 radar_metrics=(), bootstrap=None, title="Model Comparison", weights=None,
+                 groups=None, spread=None):
+    report = {
+        "title": title,
+        "models": list(final_scores),
+        "metrics": [metric for metric in metrics if metric in normalized_scores],
+        "radar_metrics": [metric for metric in radar_metrics if metric in normalized_scores],
+        "final_scores": final_scores,
+        "normalized_scores": normalized_scores,
+        "model_scores": model_scores,
+    }
+    if weights is not None:
+        report["weights"] = {metric: weights[metric] for metric in weights
+                             if metric in normalized_scores}
+    if groups:
+        report["groups"] = groups
+    if spread:
+        report["spread"] = {model: {metric: values for metric, values in spread[model].items()
+                                    if metric in report["metrics"]}
+                            for model in report["models"] if model in spread}
+    if bootstrap is not None:
+        report["confidence"] = bootstrap.confidence
+        report["score_intervals"] = bootstrap.score_intervals()
+        report["best_probabilities"] = bootstrap.best_probabilities()
+        report["win_probabilities"] = {a: {b: bootstrap.win_probability(a, b)
+                                           for b in bootstrap.models if b != a}
+                                       for a in bootstrap.models}
+    return report
+
+
+# Define function to store the report data as JSON
+def save_aggregates(report, path=DEFAULT_AGGREGATES_PATH):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+
+
+# Define function to load report data written by save_aggregates()
+def load_aggregates(path=DEFAULT_AGGREGATES_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# Define function to draw one bar subplot per metric
+def render_metric_subplots(report, path, dpi=REPORT_DPI):
+    plt = _pyplot()
+    models = report["models"]
+    metrics = report["metrics"]
+    colors = plt.cm.tab10(np.linspace(0, 1, len(models)))
+
+    rows = int(np.ceil(len(metrics) / 2))  # Calculate number of rows needed
+    fig = plt.figure(figsize=(15, rows * 4))
+
+    for i, metric in enumerate(metrics):
+        plt.subplot(rows, 2, i + 1)
+        values = [report["final_scores"][model][metric] for model in models]
+        bars = plt.bar(models, values, color=colors)
+
+        plt.title(metric_title(metric), fontsize=14, fontweight='bold')
+        plt.xticks(rotation=30, fontsize=9)
+        plt.ylabel("Score", fontsize=12)
+        plt.grid(axis='y', linestyle='--', alpha=0.7)
+
+        # Add value labels on bars
+        for bar in bars:
+            yval = bar.get_height()
+            plt.text(bar.get_x() + bar.get_width()/2, yval * 0.9, f"{yval:.2f}",
+                     ha='center', va='top', fontsize=9, color='white', fontweight='bold')
+
+    plt.tight_layout()
+    fig.savefig(path, dpi=dpi)
+    plt.close(fig)
+    return path
+
+
+# Define function to draw the final weighted score of each model, with
+# bootstrap confidence intervals as error bars when available
+def render_final_scores(report, path, dpi=REPORT_DPI):
+    plt = _pyplot()
+    models = report["models"]
+    colors = plt.cm.tab10(np.linspace(0, 1, len(models)))
+    final_values = [report["model_scores"][model] for model in models]
+
+    yerr = None
+    intervals = report.get("score_intervals")
+    if intervals:
+        yerr = np.array([[value - intervals[model][0], intervals[model][1] - value]
+                         for model, value in zip(models, final_values)]).T.clip(min=0)
+
+    fig = plt.figure(figsize=(10, 6))
+    bars = plt.bar(models, final_values, color=colors, yerr=yerr, capsize=6)
+    plt.title("Final Model Scores", fontsize=16, fontweight='bold')
+    plt.xticks(rotation=30, fontsize=12)
+    plt.ylabel("Score", fontsize=14)
+    plt.grid(axis='y', linestyle='--', alpha=0.7)
+
+    for bar in bars:
+        yval = bar.get_height()
+        plt.text(bar.get_x() + bar.get_width()/2, yval * 0.9, f"{yval:.4f}",
+                 ha='center', va='top', fontsize=11, color='white', fontweight='bold')
+
+    plt.tight_layout()
+    fig.savefig(path, dpi=dpi)
+    plt.close(fig)
+    return path
+
+
+# Define function to draw the radar chart of normalized scores
+def render_radar(report, path, dpi=REPORT_DPI):
+    plt = _pyplot()
+    models = report["models"]
+    radar_metrics = report["radar_metrics"]
+    colors = plt.cm.tab10(np.linspace(0, 1, len(models)))
+
+    fig = plt.figure(figsize=(10, 8))
+    ax = plt.subplot(111, polar=True)
+
+    # What will be the angle of each axis in the plot
+    N = len(radar_metrics)
+    angles = [n / float(N) * 2 * np.pi for n in range(N)]
+    angles += angles[:1]  # Close the loop
+
+    # Draw one axis per variable + add labels
+    plt.xticks(angles[:-1], [metric_title(m) for m in radar_metrics], size=12)
+
+    # Draw ylabels
+    ax.set_rlabel_position(0)
+    plt.yticks([0.25, 0.5, 0.75], ["0.25", "0.5", "0.75"], color="grey", size=10)
+    plt.ylim(0, 1)
+
+    # Plot each model
+    for i, model in enumerate(models):
+        values = [report["normalized_scores"][metric][model] for metric in radar_metrics]
+        values += values[:1]  # Close the loop
+
+        ax.plot(angles, values, linewidth=2, linestyle='solid', label=model, color=colors[i])
+        ax.fill(angles, values, color=colors[i], alpha=0.1)
+
+    plt.legend(loc='upper right', bbox_to_anchor=(0.1, 0.1))
+    plt.title(report["title"], size=16, y=1.1)
+
+    plt.tight_layout()
+    fig.savefig(path, dpi=dpi)
+    plt.close(fig)
+    return path
+
+
+RENDERERS = {
+    "metrics": render_metric_subplots,
+    "final": render_final_scores,
+    "radar": render_radar,
+}
+
+
+# Define function to render every figure the report has data for, each on its
+# own process when workers > 1. Returns {figure name: path}.
+def render_figures(report, out_dir=".", prefix="", workers=RENDER_WORKERS, dpi=REPORT_DPI):
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = {name: os.path.join(out_dir, prefix + file) for name, file in FIGURE_FILES.items()}
+    if not report["metrics"]:
+        jobs.pop("metrics")
+    if len(report["radar_metrics"]) < 3:  # Radar needs at least three axes
+        jobs.pop("radar")
+
+    if workers <= 1 or len(jobs) <= 1:
+        return {name: RENDERERS[name](report, path, dpi) for name, path in jobs.items()}
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+        futures = {name: executor.submit(RENDERERS[name], report, path, dpi)
+                   for name, path in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+# Define function to build an HTML table; cells are already formatted strings
+def _html_table(header, rows):
+    head = "".join(f"<th>{html.escape(str(cell))}</th>" for cell in header)
+    body = "".join("<tr>" + "".join(f"<td>{html.escape(str(cell))}</td>" for cell in row)
+                   + "</tr>" for row in rows)
+    return f"<table><thead><tr>{head}</tr></thead><tbody>{body}</tbody></table>"
+
+
+# Define function to write a self-contained HTML report: score tables, and
+# the figures embedded as base64 PNGs so the file can be shared on its own
+def write_html(report, figures, path):
+    models = report["models"]
+    intervals = report.get("score_intervals")
+    best = report.get("best_probabilities")
+
+    header = ["Model", "Weighted Score"]
+    if intervals:
+        header += [f"{report['confidence']:.0%} CI", "P(best)"]
+    score_rows = []
+    for model in sorted(models, key=lambda m: -report["model_scores"][m]):
+        row = [model, f"{report['model_scores'][model]:.4f}"]
+        if intervals:
+            low, high = intervals[model]
+            row += [f"[{low:.4f}, {high:.4f}]", f"{best[model]:.2f}"]
+        score_rows.append(row)
+
+    metric_rows = [[metric_title(metric)] + [f"{report['final_scores'][model][metric]:.2f}"
+                                             for model in models]
+                   for metric in report["metrics"]]
+
+    sections = [
+        f"<h1>{html.escape(report['title'])}</h1>",
+        "<h2>Final Weighted Scores</h2>", _html_table(header, score_rows),
+        "<h2>Metric Averages</h2>", _html_table(["Metric"] + models, metric_rows),
+    ]
+
+    spread = report.get("spread")
+    if spread:
+        spread_rows = [[metric_title(metric), model,
+                        f"{report['final_scores'][model][metric]:.2f}"]
+                       + [f"{spread[model][metric][field]:.2f}" for field in ("std", "p50", "p95")]
+                       for metric in report["metrics"] for model in models
+                       if metric in spread.get(model, {})]
+        sections += ["<h2>Metric Distributions</h2>",
+                     _html_table(["Metric", "Model", "Mean", "Std", "P50", "P95"], spread_rows)]
+
+    wins = report.get("win_probabilities")
+    if wins:
+        win_rows = [[a] + ["" if a == b else f"{wins[a][b]:.3f}" for b in models]
+                    for a in models]
+        sections += ["<h2>Pairwise Win Probabilities (row beats column)</h2>",
+                     _html_table([""] + models, win_rows)]
+
+    for label, rankings in report.get("groups", {}).items():
+        group_rows = [[group, ranking["best_model"] or ""]
+                      + [f"{ranking['model_scores'][model]:.4f}"
+                         if model in ranking["model_scores"] else "" for model in models]
+                      for group, ranking in sorted(rankings.items())]
+        sections += [f"<h2>Weighted Scores by {html.escape(label.title())}</h2>",
+                     _html_table([label.title(), "Best"] + models, group_rows)]
+
+        # Mean ± std of each weighted metric per group and model
+        spread_metrics = [metric for metric in report["metrics"]
+                          if any(metric in stds for ranking in rankings.values()
+                                 for stds in ranking.get("stds", {}).values())]
+        if spread_metrics:
+            spread_rows = [[group, model, ranking["emails"][model]]
+                           + [f"{ranking['means'][model][metric]:.2f} ± "
+                              f"{ranking['stds'][model][metric]:.2f}"
+                              if metric in ranking["stds"].get(model, {}) else ""
+                              for metric in spread_metrics]
+                           for group, ranking in sorted(rankings.items())
+                           for model in models if model in ranking.get("stds", {})]
+            sections += [f"<h2>Metric Mean ± Std by {html.escape(label.title())}</h2>",
+                         _html_table([label.title(), "Model", "Emails"]
+                                     + [metric_title(metric) for metric in spread_metrics],
+                                     spread_rows)]
+
+    for name, figure_path in figures.items():
+        with open(figure_path, "rb") as f:
+            encoded = base64.b64encode(f.read()).decode("ascii")
+        sections.append(f'<figure><img src="data:image/png;base64,{encoded}" '
+                        f'alt="{html.escape(name)}"></figure>')
+
+    style = ("body{font-family:sans-serif;margin:2em auto;max-width:1100px;color:#222}"
+             "table{border-collapse:collapse;margin-bottom:1.5em}"
+             "th,td{border:1px solid #ccc;padding:4px 10px;text-align:right}"
+             "th:first-child,td:first-child{text-align:left}"
+             "img{max-width:100%}")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+                f"<title>{html.escape(report['title'])}</title><style>{style}</style></head>"
+                f"<body>{''.join(sections)}</body></html>")
+    return path
+
+
+# Define function to run the whole report stage: figures, then the HTML report
+def render_report(report, out_dir=".", prefix="", workers=RENDER_WORKERS, dpi=REPORT_DPI,
+                  html_report=True):
+    figures = render_figures(report, out_dir, prefix, workers, dpi)
+    if html_report:
+        figures["html"] = write_html(report, figures,
+                                     os.path.join(out_dir, prefix + DEFAULT_HTML_NAME))
+    return figures
+
+
+# Define function to build the report data from a stored per-email results
+# table, using the comparemore.py aggregation, normalization and weights
+def report_from_results(path, bootstrap_resamples=0, group_by=("category",)):
+    import comparemore
+    from results_store import ResultsTable
+    from streaming_stats import StreamingAggregator
+
+    results = ResultsTable.load(path)
+    aggregator = StreamingAggregator.from_table(results)
+    final_scores = comparemore.aggregate_scores(aggregator)
+    normalized_scores = comparemore.normalize_scores(final_scores)
+    model_scores = comparemore.compute_weighted_scores(normalized_scores)
+    bootstrap = None
+    if bootstrap_resamples > 0 and len(model_scores) > 1:
+        bootstrap = comparemore.bootstrap_scores(results, final_scores, bootstrap_resamples)
+    return build_report(final_scores, normalized_scores, model_scores,
+                        comparemore.METRICS_TO_NORMALIZE, comparemore.RADAR_METRICS, bootstrap,
+                        weights=comparemore.WEIGHTS,
+                        spread=comparemore.aggregate_spread(aggregator),
+                        groups={label: comparemore.grouped_rankings(results, label)
+                                for label in group_by})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Render the comparison charts and HTML report from stored results.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--aggregates", default=None,
+                        help=f"stored aggregates JSON (default: {DEFAULT_AGGREGATES_PATH})")
+    source.add_argument("--results", default=None,
+                        help="stored per-email results (.npz) to aggregate instead")
+    parser.add_argument("--bootstrap", type=int, default=0,
+                        help="with --results, bootstrap resamples for confidence intervals")
+    parser.add_argument("--out-dir", default=".", help="directory for the figures and report")
+    parser.add_argument("--prefix", default="", help="prefix for output file names")
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS,
+                        help="processes used to render figures in parallel")
+    parser.add_argument("--dpi", type=int, default=REPORT_DPI, help="figure resolution")
+    parser.add_argument("--no-html", action="store_true", help="only render the figures")
+    args = parser.parse_args(argv)
+
+    if args.results:
+        report = report_from_results(args.results, args.bootstrap)
+    else:
+        report = load_aggregates(args.aggregates or DEFAULT_AGGREGATES_PATH)
+
+    outputs = render_report(report, args.out_dir, args.prefix, args.workers, args.dpi,
+                            html_report=not args.no_html)
+    for path in outputs.values():
+        print(f"Wrote {path}")
+
+if __name__ == "__main__":
+    main()
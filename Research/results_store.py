@@ -0,0 +1,123 @@
+import numpy as np
+
+# Initial number of rows preallocated per column; capacity doubles when full
+INITIAL_CAPACITY = 1024
+
+# Integer-coded label columns stored alongside the metric columns
+LABEL_COLUMNS = ("model", "scenario", "category")
+
+
+# Columnar per-email results table: one float32 array per score column, plus
+# int32-coded model/scenario/category columns and the email's index within its
+# model file. Rows are appended as emails are scored; save() and load() use a
+# single uncompressed .npz file so later stages can reload without rescoring.
+class ResultsTable:
+    def __init__(self, columns, capacity=INITIAL_CAPACITY):
+        self.columns = list(columns)
+        self.size = 0
+        self._capacity = max(1, capacity)
+        self._values = {column: np.full(self._capacity, np.nan, dtype=np.float32)
+                        for column in self.columns}
+        self._codes = {label: np.zeros(self._capacity, dtype=np.int32)
+                       for label in LABEL_COLUMNS}
+        self._email_index = np.zeros(self._capacity, dtype=np.int32)
+        self.labels = {label: [] for label in LABEL_COLUMNS}
+        self._label_codes = {label: {} for label in LABEL_COLUMNS}
+
+    def __len__(self):
+        return self.size
+
+    # Define function to grow every column to at least the requested capacity
+    def _reserve(self, capacity):
+        if capacity <= self._capacity:
+            return
+        new_capacity = max(capacity, self._capacity * 2)
+        for column, array in self._values.items():
+            grown = np.full(new_capacity, np.nan, dtype=np.float32)
+            grown[:self.size] = array[:self.size]
+            self._values[column] = grown
+        for label, array in self._codes.items():
+            grown = np.zeros(new_capacity, dtype=np.int32)
+            grown[:self.size] = array[:self.size]
+            self._codes[label] = grown
+        grown = np.zeros(new_capacity, dtype=np.int32)
+        grown[:self.size] = self._email_index[:self.size]
+        self._email_index = grown
+        self._capacity = new_capacity
+
+    # Define function to map a label value to its integer code
+    def _encode(self, label, value):
+        codes = self._label_codes[label]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.labels[label])
+            self.labels[label].append(value)
+        return code
+
+    # Define function to append one email's scores; row maps column -> value
+    def append(self, model, scenario, category, email_index, row):
+        self._reserve(self.size + 1)
+        i = self.size
+        self._codes["model"][i] = self._encode("model", model)
+        self._codes["scenario"][i] = self._encode("scenario", scenario)
+        self._codes["category"][i] = self._encode("category", category)
+        self._email_index[i] = email_index
+        for column in self.columns:
+            self._values[column][i] = row.get(column, np.nan)
+        self.size += 1
+
+    # Define function to get a score column (a view over the filled rows)
+    def column(self, name):
+        return self._values[name][:self.size]
+
+    # Define function to get the integer codes of a label column
+    def codes(self, label):
+        return self._codes[label][:self.size]
+
+    @property
+    def email_index(self):
+        return self._email_index[:self.size]
+
+    @property
+    def models(self):
+        return list(self.labels["model"])
+
+    # Define function to get one model's rows of a score column
+    def model_column(self, model, name):
+        code = self._label_codes["model"][model]
+        return self.column(name)[self.codes("model") == code]
+
+    # Define function to save the table as a single .npz file. Label values
+    # are stored as strings, with a mask marking the values that were None.
+    def save(self, path):
+        arrays = {f"score:{column}": self.column(column) for column in self.columns}
+        for label in LABEL_COLUMNS:
+            arrays[f"code:{label}"] = self.codes(label)
+            arrays[f"label:{label}"] = np.array(["" if value is None else str(value)
+                                                 for value in self.labels[label]], dtype=str)
+            arrays[f"missing:{label}"] = np.array([value is None for value in self.labels[label]],
+                                                  dtype=bool)
+        arrays["email_index"] = self.email_index
+        np.savez(path, **arrays)
+
+    # Define function to load a table written by save()
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            columns = [key.split(":", 1)[1] for key in data.files if key.startswith("score:")]
+            size = len(data["email_index"])
+            table = cls(columns, capacity=size)
+            for column in columns:
+                table._values[column][:size] = data[f"score:{column}"]
+            for label in LABEL_COLUMNS:
+                table._codes[label][:size] = data[f"code:{label}"]
+                values = data[f"label:{label}"].tolist()
+                if f"missing:{label}" in data.files:
+                    values = [None if missing else value for value, missing
+                              in zip(values, data[f"missing:{label}"].tolist())]
+                table.labels[label] = values
+                table._label_codes[label] = {value: code for code, value
+                                             in enumerate(table.labels[label])}
+            table._email_index[:size] = data["email_index"]
+            table.size = size
+        return table
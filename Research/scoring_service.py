@@ -0,0 +1,378 @@
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import math
+import sys
+import time
+from http import HTTPStatus
+
+import comparemore
+from metric_cache import DEFAULT_CACHE_PATH, MetricCache, _to_json
+
+# Defaults of the micro-batcher: a batch is scored as soon as it holds
+# MAX_BATCH_SIZE emails, or MAX_WAIT_MS after its first email arrived
+MAX_BATCH_SIZE = 32
+MAX_WAIT_MS = 10
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Largest accepted request body
+MAX_BODY_BYTES = 4 * 1024 * 1024
+
+
+# Synchronous scorer run on the batcher's single worker thread. The models
+# stay loaded between batches; spaCy, GPT-2 and the SQLite cache are only
+# ever touched from that one thread.
+class BatchScorer:
+    def __init__(self, metric_names, cache_path=None, parse_batch_size=MAX_BATCH_SIZE):
+        self.metric_names = list(metric_names)
+        self.cache_path = cache_path
+        self.parse_batch_size = parse_batch_size
+        self.cache = None
+        self.emails_scored = 0
+
+    # Define function to load every model and open the cache; the grammar
+    # sentence cache shares the metric cache file
+    def open(self):
+        comparemore.GRAMMAR_SENTENCE_CACHE_PATH = self.cache_path
+        comparemore.load_resources(self.metric_names)
+        if self.cache_path:
+            self.cache = MetricCache(self.cache_path, namespace="comparemore")
+
+    # Define function to release the cache and external processes
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+        comparemore.close_resources()
+
+    # Define function to score one batch of texts; metric_sets[i] names the
+    # metrics requested for texts[i]. Texts are grouped by metric set and each
+    # group is scored with only its own metrics, its texts sharing one
+    # nlp.pipe stream and one padded perplexity pass, so a readability-only
+    # request never waits on GPT-2 or LanguageTool for a neighbour in the same
+    # batch. Returns one {metric: value} dict per text.
+    def score(self, texts, metric_sets):
+        groups = {}
+        for i, names in enumerate(metric_sets):
+            groups.setdefault(frozenset(names), []).append(i)
+
+        values = [None] * len(texts)
+        for names, indices in groups.items():
+            selected = [comparemore.METRICS[name] for name in self.metric_names if name in names]
+            group_values = comparemore.evaluate_chunk(
+                "service", [{"email": texts[i]} for i in indices], self.emails_scored,
+                selected, cache=self.cache, batch_size=self.parse_batch_size)
+            self.emails_scored += len(indices)
+            for i, email_values in zip(indices, group_values):
+                values[i] = email_values
+        return values
+
+
+# Dynamic micro-batcher. Requests put (text, metric names, future) entries on
+# a queue; one collector task takes the first waiting entry, keeps adding
+# entries until the batch is full or max_wait has passed, and scores the
+# batch on the worker thread while the next batch collects; each email is
+# scored with only the metrics its request asked for. Under light load an
+# email waits at most max_wait; under heavy load batches fill up at once.
+class MicroBatcher:
+    def __init__(self, scorer, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.scorer = scorer
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms / 1000)
+        self.queue = asyncio.Queue()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.task = None
+        self.batches = 0
+        self.emails = 0
+        self.busy_seconds = 0.0
+
+    # Define function to load the models and start collecting batches
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.scorer.open)
+        self.task = asyncio.create_task(self._run())
+
+    # Define function to stop collecting and release the models
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.scorer.close)
+        self.executor.shutdown()
+
+    # Define function to score one email; resolves to its {metric: value} dict
+    async def score(self, text, metric_names):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, frozenset(metric_names), future))
+        return await future
+
+    # Define function to collect the next batch: waits for one entry, then
+    # takes more until the batch is full or the wait window closes
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            try:
+                if timeout <= 0:
+                    batch.append(self.queue.get_nowait())
+                else:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Entries whose client went away are dropped before scoring
+            batch = [entry for entry in await self._collect() if not entry[2].done()]
+            if not batch:
+                continue
+            texts = [text for text, _, _ in batch]
+            metric_sets = [names for _, names, _ in batch]
+
+            start = time.perf_counter()
+            try:
+                values = await loop.run_in_executor(self.executor, self.scorer.score,
+                                                    texts, metric_sets)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.busy_seconds += time.perf_counter() - start
+
+            self.batches += 1
+            self.emails += len(batch)
+            for (_, names, future), email_values in zip(batch, values):
+                if not future.done():
+                    future.set_result({name: email_values[name] for name in names})
+
+    # Define function to summarize batching so far
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "emails": self.emails,
+            "mean_batch_size": self.emails / self.batches if self.batches else 0.0,
+            "busy_seconds": self.busy_seconds,
+            "queued": self.queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+# Define function to replace non-finite numbers (NaN scores, infinite
+# perplexities) with None, recursively; NumPy scalars become Python numbers
+def json_safe(value):
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+# Define function to encode a response payload as strict JSON: non-finite
+# values are written as null rather than the bare NaN/Infinity tokens
+def encode_json(payload):
+    return json.dumps(json_safe(payload), default=_to_json, allow_nan=False).encode("utf-8")
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# HTTP front end. POST /score takes {"email": text} or {"emails": [items]},
+# where each item is a text or an object with a "text" field, optionally
+# with "metrics": [names] (default: every metric the service loaded), and
+# returns {"results": [{"metrics": {...}, "scores": {...}}]}
+# in request order. GET /health reports the loaded metrics and batch
+# statistics. Connections are kept alive between requests.
+class ScoringService:
+    def __init__(self, batcher, metric_names):
+        self.batcher = batcher
+        self.metric_names = list(metric_names)
+
+    # Define function to score the emails of one /score request
+    async def score(self, payload):
+        if not isinstance(payload, dict):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "expected a JSON object")
+        if "emails" in payload:
+            texts = payload["emails"]
+        elif "email" in payload:
+            texts = [payload["email"]]
+        else:
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'missing "email" or "emails"')
+        if not isinstance(texts, list):
+            raise RequestError(HTTPStatus.BAD_REQUEST, '"emails" must be a list')
+        texts = [text.get("text") if isinstance(text, dict) else text for text in texts]
+        if not all(isinstance(text, str) for text in texts):
+            raise RequestError(HTTPStatus.BAD_REQUEST,
+                               'each email must be a string or an object with a string "text"')
+
+        names = payload.get("metrics") or self.metric_names
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise RequestError(HTTPStatus.BAD_REQUEST, '"metrics" must be a list of names')
+        unknown = [name for name in names if name not in self.metric_names]
+        if unknown:
+            raise RequestError(HTTPStatus.BAD_REQUEST,
+                               f"metrics not loaded by this service: {', '.join(unknown)}")
+
+        metrics = [comparemore.METRICS[name] for name in self.metric_names if name in names]
+        values = await asyncio.gather(*(self.batcher.score(text, names) for text in texts))
+        return {"results": [{"metrics": email_values,
+                             "scores": comparemore.score_row(email_values, metrics)}
+                            for email_values in values]}
+
+    # Define function to route one request; returns (status, body)
+    async def dispatch(self, method, path, body):
+        if path == "/health" and method == "GET":
+            return HTTPStatus.OK, {"status": "ok", "metrics": self.metric_names,
+                                   "batching": self.batcher.stats()}
+        if path == "/score" and method == "POST":
+            try:
+                payload = json.loads(body or b"null")
+            except ValueError:
+                raise RequestError(HTTPStatus.BAD_REQUEST, "invalid JSON body")
+            return HTTPStatus.OK, await self.score(payload)
+        if path in ("/health", "/score"):
+            raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} not allowed")
+        raise RequestError(HTTPStatus.NOT_FOUND, f"unknown path {path}")
+
+    # Define function to read one HTTP request; returns None at end of stream
+    async def read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        try:
+            method, target, version = request_line.decode("latin-1").split()
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "malformed request line")
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "request body too large")
+        body = await reader.readexactly(length) if length else b""
+        keep_alive = (headers.get("connection", "").lower() != "close"
+                      and version != "HTTP/1.0")
+        return method, target.split("?", 1)[0], body, keep_alive
+
+    # Define function to write one JSON response
+    async def write_response(self, writer, status, payload, keep_alive):
+        body = encode_json(payload)
+        head = (f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    # Define function to serve one client connection
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await self.read_request(reader)
+                    if request is None:
+                        break
+                    method, path, body, keep_alive = request
+                    status, payload = await self.dispatch(method, path, body)
+                except RequestError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, payload = (HTTPStatus.INTERNAL_SERVER_ERROR,
+                                       {"error": f"{type(e).__name__}: {e}"})
+                await self.write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+# Define function to run the service until interrupted
+async def serve(args):
+    metric_names = args.metrics or list(comparemore.METRICS)
+    scorer = BatchScorer(metric_names, None if args.no_cache else args.cache,
+                         parse_batch_size=args.max_batch_size)
+    batcher = MicroBatcher(scorer, args.max_batch_size, args.max_wait_ms)
+
+    print(f"Loading models for: {', '.join(metric_names)}...")
+    await batcher.start()
+    service = ScoringService(batcher, metric_names)
+    server = await asyncio.start_server(service.handle, args.host, args.port)
+    print(f"Scoring service listening on http://{args.host}:{args.port} "
+          f"(max batch {batcher.max_batch_size}, max wait {args.max_wait_ms} ms)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve the email analyzers over HTTP with dynamic micro-batching.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on")
+    parser.add_argument("--metrics", type=comparemore._split_option, default=None,
+                        help="comma-separated metrics to load and serve (default: all). "
+                             f"Available: {', '.join(comparemore.METRICS)}")
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE,
+                        help="largest number of emails scored together")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS,
+                        help="longest time an email waits for its batch to fill")
+    parser.add_argument("--perplexity-backend", default=comparemore.PERPLEXITY_BACKEND,
+                        help="perplexity model (see perplexity.py)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE_PATH,
+                        help="path of the on-disk metric cache")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="score every email without reading or writing the cache")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.metrics or [] if name not in comparemore.METRICS]
+    if unknown:
+        parser.error(f"unknown metrics: {', '.join(unknown)}")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    comparemore.set_perplexity_backend(args.perplexity_backend)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("\nScoring service stopped")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+import argparse
+import json
+import math
+import sys
+import time
+
+import numpy as np
+
+from report import DEFAULT_AGGREGATES_PATH, load_aggregates, metric_title
+
+# Default number of random weight vectors
+DEFAULT_SAMPLES = 100000
+
+# Points per metric in the one-at-a-time sweeps
+SWEEP_STEPS = 101
+
+# Upper bound on (weight vectors x models) scores computed at once; samples
+# are scored in blocks so memory stays bounded for millions of vectors
+BLOCK_ENTRIES = 1 << 22
+
+# Largest simplex grid generated in grid mode
+MAX_GRID_POINTS = 5_000_000
+
+
+# Define function to gather the normalized (model x metric) matrix and the
+# weight vector from stored aggregates. Only metrics that are both weighted
+# and normalized take part; weights default to comparemore.WEIGHTS for
+# aggregates saved without them.
+def score_matrix(report, weights=None):
+    if weights is None:
+        weights = report.get("weights")
+    if weights is None:
+        from comparemore import WEIGHTS
+        weights = WEIGHTS
+    normalized = report["normalized_scores"]
+    models = list(report["models"])
+    metrics = [metric for metric in weights if metric in normalized]
+    matrix = np.array([[normalized[metric][model] for metric in metrics] for model in models])
+    base = np.array([weights[metric] for metric in metrics], dtype=np.float64)
+    return models, metrics, matrix, base
+
+
+# Define function to get each metric's sign (+1 or -1) and the base weight
+# magnitudes scaled to sum to 1. Sampled weight vectors keep the signs of the
+# base weights (compare.py weights grammar errors negatively) and vary the
+# magnitudes over the simplex.
+def _signs_and_shares(base):
+    signs = np.where(base < 0, -1.0, 1.0)
+    magnitude = np.abs(base)
+    total = magnitude.sum()
+    shares = magnitude / total if total > 0 else np.full(len(base), 1 / len(base))
+    return signs, shares
+
+
+# Define function to draw random weight vectors: uniform over the simplex,
+# or concentrated around the base weights (larger concentration = closer)
+def random_weights(n, base, concentration=None, rng=None):
+    rng = np.random.default_rng(rng)
+    signs, shares = _signs_and_shares(base)
+    if concentration is None:
+        alpha = np.ones(len(base))
+    else:
+        alpha = np.maximum(concentration * shares, 1e-3)
+    return rng.dirichlet(alpha, size=n) * signs
+
+
+# Define function to enumerate every weight vector on a simplex grid of
+# resolution 1 / steps (each weight a multiple of 1 / steps, summing to 1).
+# The integer compositions of steps are built one metric at a time: every
+# partial row with r units left expands into r + 1 rows taking 0..r of them,
+# via np.repeat, so no Python loop runs per grid point. Rows come out in
+# lexicographic order.
+def grid_weights(steps, base):
+    k = len(base)
+    count = math.comb(steps + k - 1, k - 1)
+    if count > MAX_GRID_POINTS:
+        raise ValueError(f"a grid of {steps} steps over {k} metrics has {count} points; "
+                         f"use fewer steps or random sampling")
+    signs, _ = _signs_and_shares(base)
+    parts = np.zeros((1, k), dtype=np.int32)
+    remaining = np.array([steps], dtype=np.int32)
+    for m in range(k - 1):
+        expand = remaining + 1
+        rows = np.repeat(np.arange(len(parts)), expand)
+        taken = np.arange(len(rows), dtype=np.int32) - np.repeat(np.cumsum(expand) - expand,
+                                                                 expand).astype(np.int32)
+        parts = parts[rows]
+        parts[:, m] = taken
+        remaining = remaining[rows] - taken
+    parts[:, k - 1] = remaining
+    return parts / steps * signs
+
+
+# Define function to score weight vectors against the (model x metric)
+# matrix, one matrix product per block. Returns the (model x rank position)
+# counts, and per model the weight vector closest (L1 distance, as shares)
+# to the base weights at which that model ranks first, with its distance.
+def rank_weights(matrix, weights, base, block_entries=BLOCK_ENTRIES):
+    n_models = len(matrix)
+    rank_counts = np.zeros((n_models, n_models), dtype=np.int64)
+    _, base_shares = _signs_and_shares(base)
+    nearest = np.full(n_models, np.inf)
+    nearest_weights = np.zeros((n_models, len(base)))
+
+    block = max(1, block_entries // max(1, n_models))
+    for start in range(0, len(weights), block):
+        chunk = weights[start:start + block]
+        scores = chunk @ matrix.T
+        order = np.argsort(-scores, axis=1, kind="stable")
+        for position in range(n_models):
+            rank_counts[:, position] += np.bincount(order[:, position], minlength=n_models)
+
+        winners = order[:, 0]
+        shares = np.abs(chunk) / np.abs(chunk).sum(axis=1, keepdims=True)
+        distance = np.abs(shares - base_shares).sum(axis=1)
+        for m in range(n_models):
+            mine = np.flatnonzero(winners == m)
+            if len(mine):
+                best = mine[distance[mine].argmin()]
+                if distance[best] < nearest[m]:
+                    nearest[m] = distance[best]
+                    nearest_weights[m] = chunk[best]
+    return rank_counts, nearest, nearest_weights
+
+
+# Define function to sweep each metric's weight share from 0 to 1 while the
+# other weights keep their base proportions. All sweeps are scored in one
+# matrix product. Returns, per metric, the base share and the regions
+# (share from, share to, winning model index) where the top model is
+# constant; the index is -1 where the top models tie.
+def sweep_metrics(matrix, base, steps=SWEEP_STEPS):
+    k = len(base)
+    signs, shares = _signs_and_shares(base)
+    t = np.linspace(0.0, 1.0, steps)
+
+    # (k x steps x k) weight vectors: metric m gets share t, the others share
+    # 1 - t in their base proportions
+    weights = np.empty((k, steps, k))
+    for m in range(k):
+        others = shares.copy()
+        others[m] = 0.0
+        total = others.sum()
+        others = others / total if total > 0 else others
+        weights[m] = (1 - t)[:, None] * others
+        weights[m, :, m] = t
+    scores = (weights * signs).reshape(k * steps, k) @ matrix.T
+    winners = scores.argmax(axis=1)
+    if len(matrix) > 1:
+        top_two = np.sort(scores, axis=1)[:, -2:]
+        winners[np.isclose(top_two[:, 0], top_two[:, 1])] = -1
+    winners = winners.reshape(k, steps)
+
+    sweeps = []
+    for m in range(k):
+        changes = np.flatnonzero(np.diff(winners[m])) + 1
+        starts = np.concatenate([[0], changes])
+        ends = np.concatenate([changes - 1, [steps - 1]])
+        regions = [(float(t[s]), float(t[e]), int(winners[m, s])) for s, e in zip(starts, ends)]
+        sweeps.append({"base_share": float(shares[m]), "regions": regions})
+    return sweeps
+
+
+# Define function to run the full analysis on stored aggregates
+def analyze(report, samples=DEFAULT_SAMPLES, grid_steps=None, concentration=None,
+            sweep_steps=SWEEP_STEPS, seed=0, weights=None):
+    models, metrics, matrix, base = score_matrix(report, weights)
+    if grid_steps:
+        sampled = grid_weights(grid_steps, base)
+    else:
+        sampled = random_weights(samples, base, concentration, seed)
+
+    rank_counts, nearest, nearest_weights = rank_weights(matrix, sampled, base)
+    base_scores = matrix @ base
+    base_winner = int(base_scores.argmax())
+    positions = np.arange(1, len(models) + 1)
+
+    return {
+        "models": models,
+        "metrics": metrics,
+        "weights": dict(zip(metrics, base.tolist())),
+        "base_winner": models[base_winner],
+        "base_scores": dict(zip(models, base_scores.tolist())),
+        "samples": len(sampled),
+        "mode": "grid" if grid_steps else "random",
+        "first_probabilities": dict(zip(models, (rank_counts[:, 0] / len(sampled)).tolist())),
+        "mean_ranks": dict(zip(models, (rank_counts @ positions / len(sampled)).tolist())),
+        "rank_counts": {model: rank_counts[i].tolist() for i, model in enumerate(models)},
+        "nearest_wins": {
+            model: None if not np.isfinite(nearest[i]) else {
+                "distance": float(nearest[i]),
+                "weights": dict(zip(metrics, nearest_weights[i].tolist())),
+            }
+            for i, model in enumerate(models) if i != base_winner
+        },
+        "sweeps": {
+            metric: {"base_share": sweep["base_share"],
+                     "regions": [{"from": low, "to": high, "winner": models[winner] if winner >= 0 else "tie"}
+                                 for low, high, winner in sweep["regions"]]}
+            for metric, sweep in zip(metrics, sweep_metrics(matrix, base, sweep_steps))
+        },
+    }
+
+
+# Define function to print the analysis
+def print_analysis(result, seconds=None):
+    print(f"\nWeight Sensitivity ({result['samples']:,} {result['mode']} weight vectors):")
+    print("=" * 70)
+    print(f"{'model':<28}{'base score':>12}{'P(first)':>12}{'mean rank':>12}")
+    print("-" * 70)
+    for model in result["models"]:
+        print(f"{model:<28}{result['base_scores'][model]:>12.4f}"
+              f"{result['first_probabilities'][model]:>12.1%}"
+              f"{result['mean_ranks'][model]:>12.2f}")
+    print("=" * 70)
+
+    print(f"\nWith the current weights {result['base_winner']} ranks first.")
+    for model, nearest in result["nearest_wins"].items():
+        if nearest is None:
+            print(f"- {model} never ranks first in the sampled weights")
+        else:
+            print(f"- {model} ranks first {nearest['distance']:.2f} away "
+                  "(L1 distance between weight shares)")
+
+    print("\nTop model as one metric's weight share goes from 0 to 1 "
+          "(others keep their proportions):")
+    for metric, sweep in result["sweeps"].items():
+        regions = ", ".join(f"{region['from']:.2f}-{region['to']:.2f} {region['winner']}"
+                            for region in sweep["regions"])
+        print(f"{metric_title(metric):<24}(now {sweep['base_share']:.2f})  {regions}")
+
+    if seconds is not None:
+        print(f"\nSweep took {seconds * 1000:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Analyze how the model ranking depends on the metric weights, "
+                    "using stored aggregates (no emails are rescored).")
+    parser.add_argument("--aggregates", default=DEFAULT_AGGREGATES_PATH,
+                        help="stored aggregates JSON written by comparemore.py or compare.py")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES,
+                        help="random weight vectors to evaluate")
+    parser.add_argument("--grid", type=int, default=None, metavar="STEPS",
+                        help="evaluate every weight vector on a simplex grid with this many "
+                             "steps per unit instead of random sampling")
+    parser.add_argument("--concentration", type=float, default=None,
+                        help="sample around the current weights (larger = closer) instead "
+                             "of uniformly over all weightings")
+    parser.add_argument("--sweep-steps", type=int, default=SWEEP_STEPS,
+                        help="points per metric in the one-at-a-time sweeps")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--output", default=None, help="also write the analysis as JSON")
+    args = parser.parse_args(argv)
+
+    report = load_aggregates(args.aggregates)
+    start = time.perf_counter()
+    try:
+        result = analyze(report, args.samples, args.grid, args.concentration,
+                         args.sweep_steps, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    seconds = time.perf_counter() - start
+
+    print_analysis(result, seconds)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=4)
+        print(f"Wrote {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
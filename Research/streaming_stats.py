@@ -0,0 +1,234 @@
+import math
+import random
+
+import numpy as np
+
+# Capacity of each level of the quantile sketch. Memory per sketch is about
+# SKETCH_CAPACITY * log2(n / SKETCH_CAPACITY) values; quantiles are exact
+# while fewer than SKETCH_CAPACITY values have been seen.
+SKETCH_CAPACITY = 256
+
+
+# Mergeable quantile sketch (a KLL-style stack of compactors). Values enter
+# level 0; when a level fills up it is sorted and every other value, starting
+# at a random offset, moves up one level with twice the weight. Memory grows
+# with log(n) rather than n, and quantile error shrinks as the capacity grows.
+class QuantileSketch:
+    def __init__(self, capacity=SKETCH_CAPACITY, seed=0):
+        self.capacity = max(2, capacity)
+        self.levels = [[]]
+        self.count = 0
+        self._rng = random.Random(seed)
+
+    # Define function to add one value
+    def add(self, value):
+        self.levels[0].append(value)
+        self.count += 1
+        if len(self.levels[0]) >= self.capacity:
+            self._compact()
+
+    # Define function to add many values
+    def add_many(self, values):
+        for value in values:
+            self.add(value)
+
+    # Define function to compact every full level into the one above it
+    def _compact(self):
+        for level, items in enumerate(self.levels):
+            if len(items) < self.capacity:
+                continue
+            items.sort()
+            # An odd value out stays at this level so no weight is lost
+            keep = [items.pop()] if len(items) % 2 else []
+            promoted = items[self._rng.randint(0, 1)::2]
+            self.levels[level] = keep
+            if level + 1 == len(self.levels):
+                self.levels.append([])
+            self.levels[level + 1].extend(promoted)
+
+    # Define function to fold another sketch into this one
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+        self.count += other.count
+        self._compact()
+
+    # Define function to estimate the q-quantiles (q in [0, 1]) of the values
+    # seen so far; returns NaN when the sketch is empty
+    def quantiles(self, qs):
+        values = np.array([value for items in self.levels for value in items], dtype=np.float64)
+        if not len(values):
+            return [math.nan for _ in qs]
+        weights = np.concatenate([np.full(len(items), 2.0 ** level)
+                                  for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        values, cumulative = values[order], np.cumsum(weights[order])
+        targets = np.asarray(qs, dtype=np.float64) * cumulative[-1]
+        positions = np.minimum(np.searchsorted(cumulative, targets, side="left"), len(values) - 1)
+        return values[positions].tolist()
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+
+# Running statistics for one stream of values: count, mean, variance (Welford),
+# min and max, plus a quantile sketch. NaN values are counted as missing and,
+# as with np.mean, make the mean NaN.
+class RunningStats:
+    __slots__ = ("count", "missing", "_mean", "_m2", "min", "max", "sketch")
+
+    def __init__(self, sketch_capacity=SKETCH_CAPACITY):
+        self.count = 0
+        self.missing = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketch = QuantileSketch(sketch_capacity)
+
+    # Define function to add one value (Welford's update)
+    def add(self, value):
+        value = float(value)
+        if value != value:
+            self.missing += 1
+            return
+        self.count += 1
+        delta = value - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (value - self._mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.sketch.add(value)
+
+    # Define function to add an array of values at once: the batch's moments
+    # are computed with NumPy and combined with Chan's parallel update
+    def add_many(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        missing = np.isnan(values)
+        self.missing += int(missing.sum())
+        values = values[~missing]
+        if not len(values):
+            return
+        self._combine(len(values), float(values.mean()),
+                      float(((values - values.mean()) ** 2).sum()),
+                      float(values.min()), float(values.max()))
+        self.sketch.add_many(values.tolist())
+
+    # Define function to fold another accumulator into this one
+    def merge(self, other):
+        self.missing += other.missing
+        if other.count:
+            self._combine(other.count, other._mean, other._m2, other.min, other.max)
+            self.sketch.merge(other.sketch)
+
+    def _combine(self, count, mean, m2, low, high):
+        total = self.count + count
+        delta = mean - self._mean
+        self._mean += delta * count / total
+        self._m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+
+    @property
+    def mean(self):
+        if self.missing or not self.count:
+            return math.nan
+        return self._mean
+
+    # Sample variance (n - 1 denominator); NaN with fewer than two values
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def quantile(self, q):
+        return self.sketch.quantile(q)
+
+    # Define function to summarize the accumulator as a plain dict
+    def to_dict(self, quantiles=(0.5, 0.95)):
+        summary = {"count": self.count, "missing": self.missing, "mean": self.mean,
+                   "std": self.std if self.count > 1 else math.nan,
+                   "min": self.min if self.count else math.nan,
+                   "max": self.max if self.count else math.nan}
+        for q, value in zip(quantiles, self.sketch.quantiles(quantiles)):
+            summary[f"p{round(q * 100)}"] = value
+        return summary
+
+
+# Streaming aggregator holding one RunningStats per (model, column). Memory
+# depends on the number of models and columns, not on the number of emails,
+# so it can follow unbounded email streams and report while a run is going.
+class StreamingAggregator:
+    def __init__(self, sketch_capacity=SKETCH_CAPACITY):
+        self.sketch_capacity = sketch_capacity
+        self.stats = {}
+
+    # Define function to get (creating if needed) the accumulator of one column
+    def get(self, model, column):
+        model_stats = self.stats.setdefault(model, {})
+        stats = model_stats.get(column)
+        if stats is None:
+            stats = model_stats[column] = RunningStats(self.sketch_capacity)
+        return stats
+
+    # Define function to add one email's scores; row maps column -> value
+    def add_row(self, model, row):
+        for column, value in row.items():
+            self.get(model, column).add(value)
+
+    # Define function to add a whole column of one model's values
+    def add_column(self, model, column, values):
+        self.get(model, column).add_many(values)
+
+    # Define function to build an aggregator from a per-email ResultsTable
+    @classmethod
+    def from_table(cls, table, sketch_capacity=SKETCH_CAPACITY):
+        aggregator = cls(sketch_capacity)
+        for model in table.models:
+            for column in table.columns:
+                aggregator.add_column(model, column, table.model_column(model, column))
+        return aggregator
+
+    @property
+    def models(self):
+        return list(self.stats)
+
+    # Define function to count the emails seen for a model
+    def email_count(self, model):
+        model_stats = self.stats.get(model, {})
+        return max((stats.count + stats.missing for stats in model_stats.values()), default=0)
+
+    # Define function to get per-model means for aggregated report keys;
+    # aggregates maps report key -> column. Columns never seen are left out.
+    def means(self, aggregates):
+        return {
+            model: {key: model_stats[column].mean
+                    for key, column in aggregates.items() if column in model_stats}
+            for model, model_stats in self.stats.items()
+        }
+
+    # Define function to get per-model spread for aggregated report keys, in
+    # the same shape as means(): {model: {key: {"std", "p50", "p95", ...}}}
+    def spread(self, aggregates, quantiles=(0.5, 0.95)):
+        fields = ["std"] + [f"p{round(q * 100)}" for q in quantiles]
+        spread = {}
+        for model, model_stats in self.stats.items():
+            spread[model] = {}
+            for key, column in aggregates.items():
+                if column in model_stats:
+                    summary = model_stats[column].to_dict(quantiles)
+                    spread[model][key] = {field: summary[field] for field in fields}
+        return spread
+
+    # Define function to summarize every accumulator as nested plain dicts
+    def summary(self, quantiles=(0.5, 0.95)):
+        return {model: {column: stats.to_dict(quantiles) for column, stats in model_stats.items()}
+                for model, model_stats in self.stats.items()}
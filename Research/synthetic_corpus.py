@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import random
+import re
+
+from ingest import iter_records
+
+# Model files whose email bodies seed the synthetic sentence bank
+DEFAULT_SEED_FILES = ["gpt.json", "claude.json", "gemini.json", "llama.json"]
+
+# Fallback sentences used when no seed file is available
+FALLBACK_SENTENCES = [
+    "I hope this message finds you well.",
+    "I am writing to follow up on our recent discussion regarding the project timeline.",
+    "Please let me know if you have any questions or require further information.",
+    "We have reviewed the proposal and would like to schedule a meeting to discuss next steps.",
+    "Your feedback on the attached document would be greatly appreciated.",
+    "The team has made significant progress on the deliverables outlined last week.",
+    "Could you please confirm your availability for a call later this week?",
+    "We appreciate your continued support and look forward to working together.",
+]
+
+SCENARIOS = [
+    "Follow-up after a business meeting",
+    "Request for project status update",
+    "Scheduling a meeting",
+    "Responding to a client complaint",
+    "Requesting feedback on a proposal",
+]
+
+CATEGORIES = ["Client Communication", "Internal Communication", "Project Management"]
+
+GREETINGS = ["Dear Alex Carter,", "Hello Jordan,", "Good morning Taylor,", "Hi Sam,"]
+
+SIGNOFFS = ["Best regards,", "Sincerely,", "Warm regards,", "Thank you,", "Kind regards,"]
+
+SIGNATURES = ["John Doe\nSenior Manager\nABC Corp.", "Jane Smith\nProject Lead", "Chris Lee"]
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+
+# Define function to collect body sentences from existing model files; the
+# subject, greeting and sign-off paragraphs are skipped
+def load_sentence_bank(seed_files=DEFAULT_SEED_FILES):
+    sentences = []
+    for path in seed_files:
+        if not os.path.exists(path):
+            continue
+        for record in iter_records(path):
+            paragraphs = [p.strip() for p in (record["email"] or "").split("\n\n") if p.strip()]
+            for paragraph in paragraphs[2:-2]:
+                if "\n" in paragraph:
+                    continue
+                sentences.extend(s for s in _SENTENCE_SPLIT.split(paragraph) if len(s.split()) >= 4)
+    return sentences or list(FALLBACK_SENTENCES)
+
+
+# Define function to generate one email with roughly the requested number of
+# body words spread over the requested number of paragraphs
+def generate_email(rng, sentences, words=180, paragraphs=4, subject=True, greeting=True,
+                   signoff=True):
+    body = []
+    target = max(1, words)
+    count = 0
+    while count < target:
+        sentence = rng.choice(sentences)
+        body.append(sentence)
+        count += len(sentence.split())
+
+    paragraphs = max(1, min(paragraphs, len(body)))
+    per_paragraph = -(-len(body) // paragraphs)
+    blocks = [" ".join(body[i:i + per_paragraph]) for i in range(0, len(body), per_paragraph)]
+
+    parts = []
+    if subject:
+        parts.append(f"Subject: {rng.choice(SCENARIOS)}")
+    if greeting:
+        parts.append(rng.choice(GREETINGS))
+    parts.extend(blocks)
+    if signoff:
+        parts.append(rng.choice(SIGNOFFS))
+        parts.append(rng.choice(SIGNATURES))
+    return "\n\n".join(parts)
+
+
+# Define function to generate a corpus of records shaped like the model files.
+# Each email's length varies uniformly by +/- length_jitter around words.
+def generate_corpus(n, words=180, paragraphs=4, length_jitter=0.2, structure_rate=1.0,
+                    seed=0, seed_files=DEFAULT_SEED_FILES):
+    rng = random.Random(seed)
+    sentences = load_sentence_bank(seed_files)
+    records = []
+    for _ in range(n):
+        length = int(words * rng.uniform(1 - length_jitter, 1 + length_jitter))
+        email = generate_email(
+            rng, sentences, words=length, paragraphs=paragraphs,
+            subject=rng.random() < structure_rate,
+            greeting=rng.random() < structure_rate,
+            signoff=rng.random() < structure_rate,
+        )
+        records.append({
+            "scenario": rng.choice(SCENARIOS),
+            "category": rng.choice(CATEGORIES),
+            "email": email,
+        })
+    return records
+
+
+# Define function to write records in the model-file JSON array format
+def write_corpus(records, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(records, f, indent=4)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic email corpus.")
+    parser.add_argument("--emails", type=int, default=100, help="number of emails")
+    parser.add_argument("--words", type=int, default=180, help="mean body words per email")
+    parser.add_argument("--paragraphs", type=int, default=4, help="body paragraphs per email")
+    parser.add_argument("--structure-rate", type=float, default=1.0,
+                        help="probability of including each of subject, greeting and sign-off")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--out", default="synthetic.json", help="output JSON file")
+    args = parser.parse_args(argv)
+
+    records = generate_corpus(args.emails, args.words, args.paragraphs,
+                              structure_rate=args.structure_rate, seed=args.seed)
+    write_corpus(records, args.out)
+    print(f"Wrote {len(records)} synthetic emails to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+import bootstrap
+from bootstrap import BootstrapResult, bootstrap_means
+
+RESAMPLES = 200
+
+
+# Define function to draw bootstrap means one resample at a time, consuming
+# the generator in the same order as bootstrap_means
+def naive_means(values, n_resamples, rng):
+    n = len(values)
+    return np.array([values[rng.integers(0, n, size=n)].mean(axis=0)
+                     for _ in range(n_resamples)])
+
+
+# Define function to score every resample with plain loops: min-max
+# normalize each metric across models (tie_value when all models tie),
+# invert lower-is-better metrics, weight, then count pairwise wins
+def naive_result(values_by_model, keys, weights, lower_is_better, seed, tie_value):
+    rng = np.random.default_rng(seed)
+    models = list(values_by_model)
+    means = {model: naive_means(values_by_model[model], RESAMPLES, rng) for model in models}
+    scores = np.zeros((RESAMPLES, len(models)))
+    for r in range(RESAMPLES):
+        for k, key in enumerate(keys):
+            column = [means[model][r, k] for model in models]
+            low, high = min(column), max(column)
+            for m, value in enumerate(column):
+                if high == low:
+                    normalized = tie_value
+                else:
+                    normalized = (value - low) / (high - low)
+                    if key in lower_is_better:
+                        normalized = 1 - normalized
+                scores[r, m] += weights[key] * normalized
+    wins = np.zeros((len(models), len(models)))
+    for a in range(len(models)):
+        for b in range(len(models)):
+            wins[a, b] = np.mean([1.0 if s[a] > s[b] else 0.5 if s[a] == s[b] else 0.0
+                                  for s in scores])
+    return means, scores, wins
+
+
+@pytest.fixture
+def values_by_model():
+    rng = np.random.default_rng(11)
+    # The last metric is constant, so every model ties on it in every resample
+    return {model: np.column_stack([rng.normal(loc, 1.0, size=n), rng.exponential(1.0, size=n),
+                                    np.full(n, 2.0)])
+            for model, loc, n in (("a", 0.0, 40), ("b", 0.3, 55), ("c", 0.1, 1))}
+
+
+@pytest.mark.parametrize("block_entries", [bootstrap.BLOCK_ENTRIES, 64])
+def test_bincount_means_match_per_resample_loop(values_by_model, monkeypatch, block_entries):
+    monkeypatch.setattr(bootstrap, "BLOCK_ENTRIES", block_entries)
+    values = values_by_model["b"]
+    expected = naive_means(values, RESAMPLES, np.random.default_rng(5))
+    np.testing.assert_allclose(bootstrap_means(values, RESAMPLES, 5), expected, rtol=1e-12)
+
+
+def test_empty_model_gives_nan_means():
+    assert np.isnan(bootstrap_means(np.zeros((0, 2)), 3)).all()
+
+
+@pytest.mark.parametrize("tie_value", [0.5, 1.0])
+def test_scores_and_wins_match_per_resample_loop(values_by_model, tie_value):
+    keys = ["quality", "errors", "constant"]
+    weights = {"quality": 0.5, "errors": 0.3, "constant": 0.2}
+    result = BootstrapResult(values_by_model, keys, weights, ["errors"], RESAMPLES,
+                             seed=3, tie_value=tie_value)
+    means, scores, wins = naive_result(values_by_model, keys, weights, ["errors"], 3, tie_value)
+
+    for m, model in enumerate(result.models):
+        np.testing.assert_allclose(result.means[:, m], means[model], rtol=1e-12)
+    np.testing.assert_allclose(result.scores, scores, rtol=1e-12)
+    np.testing.assert_allclose(result.wins, wins)
+    assert result.wins + result.wins.T == pytest.approx(np.ones_like(wins))
+
+
+@pytest.mark.parametrize("tie_value", [0.5, 1.0])
+def test_full_ties_split_wins(tie_value):
+    values_by_model = {model: np.ones((10, 2)) for model in ("a", "b", "c")}
+    result = BootstrapResult(values_by_model, ["x", "y"], {"x": 0.6, "y": 0.4}, ["y"], 50,
+                             tie_value=tie_value)
+    assert result.scores == pytest.approx(np.full((50, 3), tie_value))
+    assert result.win_probability("a", "b") == 0.5
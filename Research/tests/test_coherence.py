@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import comparemore
+from coherence import (LOCAL_WEIGHT, MIN_SENTENCES, all_pairs_coherence_scores,
+                       coherence_scores, windowed_coherence_scores)
+
+TOLERANCE = 1e-5
+
+
+def cosine(a, b):
+    norms = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(a @ b / norms) if norms > 0 else 0.0
+
+
+# Per-email loops over sentence pairs, as coherence was computed before it
+# was vectorized
+def naive_coherence(matrix):
+    if len(matrix) < MIN_SENTENCES:
+        return 1.0
+    local = np.mean([cosine(matrix[i], matrix[i + 1]) for i in range(len(matrix) - 1)])
+    return LOCAL_WEIGHT * local + (1 - LOCAL_WEIGHT) * cosine(matrix[0], matrix[-1])
+
+
+def naive_all_pairs(matrix):
+    n = len(matrix)
+    if n < 2:
+        return 1.0
+    return np.mean([cosine(matrix[i], matrix[j]) for i in range(n) for j in range(n) if i != j])
+
+
+def naive_windowed(matrix, window):
+    n = len(matrix)
+    if n < 2:
+        return 1.0
+    return np.mean([cosine(matrix[i], matrix[j]) for i in range(n)
+                    for j in range(i + 1, min(i + window, n - 1) + 1)])
+
+
+@pytest.fixture
+def matrices():
+    rng = np.random.default_rng(0)
+    matrices = [rng.normal(size=(n, 8)).astype(np.float32) for n in (1, 2, 3, 9, 4, 6)]
+    matrices[4][2] = 0.0  # A sentence without a vector
+    return [np.zeros((0, 0), dtype=np.float32)] + matrices
+
+
+def test_coherence_matches_pairwise_loop(matrices):
+    expected = [naive_coherence(matrix) for matrix in matrices]
+    assert coherence_scores(matrices) == pytest.approx(expected, abs=TOLERANCE)
+
+
+def test_all_pairs_matches_pairwise_loop(matrices):
+    expected = [naive_all_pairs(matrix) for matrix in matrices]
+    assert all_pairs_coherence_scores(matrices) == pytest.approx(expected, abs=TOLERANCE)
+
+
+@pytest.mark.parametrize("window", [1, 2, 5, 20])
+def test_windowed_matches_pairwise_loop(matrices, window):
+    expected = [naive_windowed(matrix, window) for matrix in matrices]
+    assert windowed_coherence_scores(matrices, window) == pytest.approx(expected, abs=TOLERANCE)
+
+
+def test_short_emails_score_one():
+    short = [np.zeros((0, 0), dtype=np.float32), np.ones((1, 4), dtype=np.float32)]
+    assert all_pairs_coherence_scores(short) == [1.0, 1.0]
+    assert windowed_coherence_scores(short) == [1.0, 1.0]
+
+
+# Define function to build a stand-in context whose sentences carry the
+# rows of matrix as vectors
+def context(matrix):
+    return SimpleNamespace(sentences=[SimpleNamespace(vector=row) for row in matrix])
+
+
+@pytest.mark.parametrize("name", ["coherence", "coherence_all_pairs", "coherence_windowed"])
+def test_batch_metric_matches_single_email_path(matrices, name):
+    metric = comparemore.METRICS[name]
+    extract, compute = metric.batch
+    contexts = [context(matrix) for matrix in matrices]
+    expected = [metric.analyze(ctx) for ctx in contexts]
+    assert compute([extract(ctx) for ctx in contexts]) == pytest.approx(expected, abs=TOLERANCE)
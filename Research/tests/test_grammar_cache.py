@@ -0,0 +1,118 @@
+import functools
+import re
+from collections import namedtuple
+from concurrent.futures import Future
+
+import pytest
+
+import benchmark
+import comparemore
+from grammar_cache import SentenceCache, SentenceGrammarChecker, split_sentences
+
+# LanguageTool 3.x match fields, as read by grammar_cache._to_match
+Match = namedtuple("Match", "rule_id message offset error_length category")
+
+# Sentence-local rules of the stand-in checker
+_RULES = {"MORFOLOGIK_RULE_EN_US": re.compile(r"\bteh\b"),
+          "DOUBLE_WORD": re.compile(r"\b(\w+) \1\b")}
+
+
+# Stand-in for LanguageToolPool: checks synchronously with a few regex rules
+# and records every text it was sent
+class FakePool:
+    def __init__(self):
+        self.checked = []
+
+    def submit(self, text, wrap=None):
+        self.checked.append(text)
+        future = Future()
+        future.set_result(check_whole_text(text))
+        return future
+
+    def close(self):
+        pass
+
+
+def check_whole_text(text):
+    return sorted((Match(rule, "", m.start(), m.end() - m.start(), "TYPOS")
+                   for rule, pattern in _RULES.items() for m in pattern.finditer(text)),
+                  key=lambda match: match.offset)
+
+
+def sentences(text):
+    return [sentence for _, sentence in split_sentences(text)]
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Abbreviations do not end a sentence, nor does a period before a lower-case word
+    ("Dear Dr. Smith, thanks. We met e.g. last week at ABC Corp. and it went well.",
+     ["Dear Dr. Smith, thanks. ", "We met e.g. last week at ABC Corp. and it went well."]),
+    ("Mr. Brown is here... Right? Yes!! ok",
+     ["Mr. Brown is here... ", "Right? ", "Yes!! ok"]),
+    # List markers stay with their item; segments never cross lines
+    ("Agenda:\n1. Review the budget.\n2. Plan Q3. Next steps follow.",
+     ["Agenda:", "1. Review the budget.", "2. Plan Q3. ", "Next steps follow."]),
+    ("a. first item b. second", ["a. first item b. second"]),
+    # Closing quotes and brackets belong to the sentence they close
+    ('She said "Stop." Then she left. (See the notes.) Fine!',
+     ['She said "Stop." ', "Then she left. ", "(See the notes.) ", "Fine!"]),
+    # Periods inside URLs are not followed by whitespace
+    ("Visit https://example.com/a.b?x=1. Then reply. Or www.site.org/page.html is fine.",
+     ["Visit https://example.com/a.b?x=1. ", "Then reply. ",
+      "Or www.site.org/page.html is fine."]),
+    # Repeated spaces between sentences stay with the sentence before them
+    ("Hello  there.  Two spaces.\n\nNew para.",
+     ["Hello  there.  ", "Two spaces.", "New para."]),
+])
+def test_split_sentences(text, expected):
+    segments = split_sentences(text)
+    assert [sentence for _, sentence in segments] == expected
+    for start, sentence in segments:
+        assert text[start:start + len(sentence)] == sentence
+
+
+def test_matches_are_reassembled_at_their_email_offsets():
+    pool = FakePool()
+    checker = SentenceGrammarChecker(pool)
+    first = "Dear team,\nI hope teh meeting went well. Please send the the notes. Thanks."
+    second = "Hi all. Please send the the notes. Teh end is near, and teh rest follows."
+
+    assert checker.check(first) == check_whole_text(first)
+    checked = len(pool.checked)
+    assert checker.check(second) == check_whole_text(second)
+
+    # The shared sentence was not sent to the checker again
+    assert len(pool.checked) - checked == len(sentences(second)) - 1
+    assert checker.stats()["memory_hits"] == 1
+
+
+def test_benchmark_clear_caches_empties_the_memory_tier(monkeypatch, tmp_path):
+    text = "Hello there. I hope teh week went well. Thanks."
+    pool = FakePool()
+    checker = SentenceGrammarChecker(pool, SentenceCache(path=str(tmp_path / "cache.sqlite")))
+    monkeypatch.setattr(comparemore, "get_grammar_pool",
+                        functools.lru_cache(maxsize=None)(lambda: checker))
+    comparemore.get_grammar_pool()
+
+    expected = check_whole_text(text)
+    assert checker.check(text) == expected
+    assert checker.check(text) == expected
+    assert checker.cache.hits == 3 and checker.cache.disk_hits == 0
+
+    # After clear_caches the sentences come from the disk tier, not from memory
+    benchmark.clear_caches()
+    assert checker.check(text) == expected
+    assert checker.cache.hits == 3 and checker.cache.disk_hits == 3
+    assert len(pool.checked) == 3
+    checker.close()
+
+
+def test_clear_without_disk_tier_checks_sentences_again():
+    text = "Hello there. I hope teh week went well."
+    pool = FakePool()
+    checker = SentenceGrammarChecker(pool)
+    checker.check(text)
+    checker.cache.clear()
+    assert checker.check(text) == check_whole_text(text)
+    assert pool.checked == sentences(text) * 2
+    assert checker.cache.hits == 0
@@ -0,0 +1,77 @@
+import math
+
+import numpy as np
+import pytest
+
+from group_stats import GroupedStats, scores_by_group
+from results_store import ResultsTable
+
+COLUMNS = ["formality", "perplexity"]
+
+
+@pytest.fixture
+def table():
+    rng = np.random.default_rng(4)
+    table = ResultsTable(COLUMNS, capacity=1)
+    layout = [("gpt", "Sales", 30), ("gpt", "Support", 25), ("claude", "Sales", 40),
+              ("claude", "Support", 1), ("llama", "HR", 12)]
+    for model, category, n in layout:
+        for i in range(n):
+            row = {"formality": rng.normal(0.5, 0.2),
+                   # A large offset checks that the one-pass variance stays accurate
+                   "perplexity": rng.normal(1e4, 3.0)}
+            if model == "llama" and i in (3, 7):
+                row["perplexity"] = float("nan")
+            table.append(model, "Follow-up", category, i, row)
+    return table
+
+
+# Define function to compute each group's mean and sample std with plain
+# NumPy over the rows of that group; the std skips missing values
+def naive_stats(table, by):
+    labels = [[table.labels[label][code] for code in table.codes(label)] for label in by]
+    keys = list(zip(*labels))
+    stats = {}
+    for key in dict.fromkeys(keys):
+        rows = np.array([k == key for k in keys])
+        stats[key] = {}
+        for column in COLUMNS:
+            values = table.column(column)[rows].astype(np.float64)
+            present = values[~np.isnan(values)]
+            stats[key][column] = (np.mean(values),
+                                  np.std(present, ddof=1) if len(present) > 1 else math.nan)
+    return stats
+
+
+def test_grouped_means_and_stds_match_numpy(table):
+    grouped = GroupedStats(table, ("model", "category"))
+    expected = naive_stats(table, ("model", "category"))
+    aggregates = {f"avg_{column}": column for column in COLUMNS}
+    means, stds = grouped.means(aggregates), grouped.stds(aggregates)
+
+    assert sorted(grouped.keys) == sorted(expected)
+    for key, columns in expected.items():
+        for column, (mean, std) in columns.items():
+            assert means[key][f"avg_{column}"] == pytest.approx(mean, rel=1e-9, nan_ok=True)
+            assert stds[key][f"avg_{column}"] == pytest.approx(std, rel=1e-6, nan_ok=True)
+
+
+def test_single_member_and_missing_groups(table):
+    grouped = GroupedStats(table, ("model", "category"))
+    g = grouped.keys.index(("claude", "Support"))
+    assert grouped.rows[g] == 1
+    assert not np.isnan(grouped.mean[g]).any()
+    assert np.isnan(grouped.std[g]).all()
+
+    g = grouped.keys.index(("llama", "HR"))
+    p = grouped.columns.index("perplexity")
+    assert (grouped.count[g, p], grouped.missing[g, p]) == (10, 2)
+    assert np.isnan(grouped.mean[g, p])
+    assert not np.isnan(grouped.std[g, p])
+
+
+def test_scores_by_group_splits_on_the_label(table):
+    grouped = GroupedStats(table, ("model", "category"))
+    by_category = scores_by_group(grouped.means({"avg_formality": "formality"}))
+    assert sorted(by_category) == ["HR", "Sales", "Support"]
+    assert sorted(by_category["Sales"]) == ["claude", "gpt"]
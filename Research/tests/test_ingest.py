@@ -0,0 +1,59 @@
+import json
+import os
+
+import pytest
+
+from ingest import iter_records
+
+RESEARCH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def write(tmp_path, text, name="model.json"):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+# Small read sizes put block boundaries inside elements and separators
+@pytest.mark.parametrize("read_size", [1, 3, 7, 1 << 16])
+def test_array_matches_json_load(read_size):
+    path = os.path.join(RESEARCH_DIR, "claude.json")
+    with open(path, "r", encoding="utf-8") as f:
+        expected = [{field: obj.get(field) for field in ("scenario", "category", "email")}
+                    for obj in json.load(f)]
+    assert list(iter_records(path, read_size)) == expected
+
+
+@pytest.mark.parametrize("read_size", [1, 4, 1 << 16])
+@pytest.mark.parametrize("text, records", [
+    ("[]", 0),
+    (" \n[ ]\n", 0),
+    ('[{"email": "a, ]"}]', 1),
+    ('[ {"email": "a"} ,\n {"email": "b"} ]  \n', 2),
+])
+def test_valid_arrays(tmp_path, text, records, read_size):
+    assert len(list(iter_records(write(tmp_path, text), read_size))) == records
+    json.loads(text)
+
+
+@pytest.mark.parametrize("read_size", [1, 4, 1 << 16])
+@pytest.mark.parametrize("text", [
+    '[{"a": 1},]',              # trailing comma
+    '[{"a": 1} {"b": 2}]',      # missing comma
+    '[,,{"a": 1}]',             # leading commas
+    '[{"a": 1},,{"b": 2}]',     # doubled comma
+    '[,]',
+    '[{"a": 1}',                # unterminated
+    '[{"a": 1}] [{"b": 2}]',    # extra data
+    '[1, 2]',                   # non-object elements
+    '[{"a": 1}, "text"]',
+])
+def test_invalid_arrays_raise_value_error(tmp_path, text, read_size):
+    with pytest.raises(ValueError):
+        list(iter_records(write(tmp_path, text), read_size))
+
+
+def test_jsonl_rejects_non_objects(tmp_path):
+    path = write(tmp_path, '{"email": "a"}\n[1]\n', "model.jsonl")
+    with pytest.raises(ValueError, match="line 2"):
+        list(iter_records(path))
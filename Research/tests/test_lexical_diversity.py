@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+lexicalrichness = pytest.importorskip("lexicalrichness")
+
+from ingest import iter_records
+from lexical_diversity import (HDD_DRAWS, MTLD_THRESHOLD, LexicalDiversityEngine,
+                               compare_with_lexicalrichness, encode, hdd, mtld, tokenize)
+
+RESEARCH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_FILES = ["gpt.json", "gemini.json", "claude.json", "llama.json"]
+
+# Largest allowed absolute difference per measure (float summation order)
+TOLERANCE = 1e-9
+
+
+def reference(text):
+    return lexicalrichness.LexicalRichness(text)
+
+
+def test_corpus_matches_lexicalrichness():
+    texts = [record["email"] for file in MODEL_FILES
+             for record in iter_records(os.path.join(RESEARCH_DIR, file))]
+    max_diff, mismatched, _, _ = compare_with_lexicalrichness(texts)
+    assert mismatched == 0
+    for key, diff in max_diff.items():
+        assert diff <= TOLERANCE, key
+
+
+@pytest.mark.parametrize("text", [
+    "word",                                                # one token
+    "alpha beta gamma delta epsilon zeta eta theta",       # TTR never drops: one factor
+    "a a a a a a",                                         # every token repeats
+    "the cat and the dog and the bird",                    # a single full factor
+    "we will meet we will talk we will plan the meeting soon and then",
+    "Thanks -- see you at 10:30, Alex! Re: re: the Q3 plan.",  # dropped digits and dashes
+])
+def test_mtld_on_short_texts(text):
+    ids, freqs = encode(tokenize(text))
+    expected = reference(text).mtld(threshold=MTLD_THRESHOLD)
+    assert mtld(ids, len(freqs)) == pytest.approx(expected, abs=TOLERANCE)
+
+
+@pytest.mark.parametrize("tokens", [HDD_DRAWS, HDD_DRAWS + 1, 60])
+def test_hdd_at_the_draw_limit(tokens):
+    text = " ".join(f"w{chr(97 + i % 20)}" for i in range(tokens))
+    _, freqs = encode(tokenize(text))
+    assert hdd(freqs) == pytest.approx(reference(text).hdd(draws=HDD_DRAWS), abs=TOLERANCE)
+
+
+def test_hdd_raises_below_the_draw_limit():
+    text = " ".join(f"w{chr(97 + i % 20)}" for i in range(HDD_DRAWS - 1))
+    with pytest.raises(ValueError):
+        reference(text).hdd(draws=HDD_DRAWS)
+    with pytest.raises(ValueError):
+        LexicalDiversityEngine().analyze(text)
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from near_duplicates import NearDuplicateIndex
+
+BASE = ("Thank you for reaching out about the quarterly budget review. I have attached the "
+        "revised spreadsheet with the updated travel and equipment figures, and I would "
+        "appreciate your feedback before Friday so we can finalize the numbers with finance.")
+UNRELATED = ("Our team picnic moves to the riverside park this year. Bring sunscreen, a folding "
+             "chair and your favourite dessert; the grill opens at noon and games start later.")
+
+
+# Define function to make a near-identical copy of BASE
+def variant(word):
+    return BASE.replace("Friday", word)
+
+
+@pytest.fixture
+def index():
+    index = NearDuplicateIndex()
+    index.add_model("gpt", [BASE, variant("Thursday"), UNRELATED, ""])
+    index.add_model("claude", [variant("Monday"), "   "])
+    return index
+
+
+def test_near_identical_texts_cluster_within_and_across_models(index):
+    assert index.clusters(across=False) == [[("gpt", 0), ("gpt", 1)]]
+    assert index.clusters() == [[("gpt", 0), ("gpt", 1), ("claude", 0)]]
+
+    rows = {(row["model"], row["email_index"]): row for row in index.rows()}
+    assert rows[("claude", 0)]["cluster_across"] == "gpt:0"
+    assert rows[("claude", 0)]["cluster_within"] == "claude:0"
+    assert rows[("gpt", 2)]["cluster_across"] == "gpt:2"
+    assert rows[("gpt", 1)]["similarity_within"] >= index.threshold
+    assert rows[("gpt", 2)]["similarity_across"] < index.threshold
+
+
+def test_shared_text_raises_templatedness(index):
+    rows = {(row["model"], row["email_index"]): row for row in index.rows()}
+    assert rows[("gpt", 0)]["templatedness"] > 0.9
+    assert rows[("claude", 0)]["templatedness_across"] > 0.9
+    assert rows[("claude", 0)]["templatedness_within"] == 0.0
+    assert rows[("gpt", 2)]["templatedness"] == 0.0
+
+
+def test_shared_opening_is_templated_without_a_duplicate_cluster():
+    opening = "I hope this message finds you well. "
+    index = NearDuplicateIndex()
+    index.add_model("gpt", [opening + BASE, opening + UNRELATED])
+    assert index.clusters() == []
+    templated = [row["templatedness"] for row in index.rows()]
+    assert all(0.0 < value < 0.5 for value in templated)
+
+
+def test_empty_emails_are_skipped(index):
+    assert index.skipped == [("gpt", 3), ("claude", 1)]
+    assert len(index) == 4
+    assert index.insert(("gpt", 3), "") is None
+    assert index.skipped == [("gpt", 3), ("claude", 1)]
+
+
+def test_incremental_insert_and_readding_a_model_is_idempotent(index):
+    before = index.rows()
+    index.add_model("gpt", [BASE, variant("Thursday"), UNRELATED, ""])
+    assert len(index) == 4
+    assert index.rows() == before
+
+    # Adding more of a model's file only inserts its new emails
+    index.add_model("claude", [variant("Monday"), "   ", variant("Sunday")])
+    assert len(index) == 5
+    assert index.insert(("claude", 2), "ignored: the key is already indexed") == 4
+    assert index.clusters()[0][-1] == ("claude", 2)
+
+
+def test_save_load_reproduces_summary(index, tmp_path):
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = NearDuplicateIndex.load(path)
+
+    assert loaded.keys == index.keys
+    assert loaded.summary() == index.summary()
+    assert loaded.rows() == index.rows()
+    np.testing.assert_array_equal(loaded._signatures[:len(loaded)],
+                                  index._signatures[:len(index)])
+
+    # The loaded index keeps indexing
+    loaded.insert(("llama", 0), variant("Tuesday"))
+    assert ("llama", 0) in loaded.clusters()[0]
@@ -0,0 +1,60 @@
+import os
+from importlib import metadata
+
+import pytest
+
+pytest.importorskip("pyphen")
+textstat = pytest.importorskip("textstat")
+
+from ingest import iter_records
+from readability import ReadabilityEngine, compare_with_textstat, load_easy_words
+
+RESEARCH_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_FILES = ["gpt.json", "gemini.json", "claude.json", "llama.json"]
+
+# Largest allowed absolute difference per metric, as in `python readability.py`
+TOLERANCE = 0.01
+
+# The engine follows textstat's pyphen-based releases
+TEXTSTAT_VERSION = tuple(int(part) for part in metadata.version("textstat").split(".")[:3])
+pytestmark = pytest.mark.skipif(not (0, 7, 3) <= TEXTSTAT_VERSION <= (0, 7, 4),
+                                reason="readability.py matches textstat 0.7.3-0.7.4")
+
+# Edge cases: no words, fewer than three sentences (SMOG), short sentences
+# that textstat does not count, and punctuation-only tokens
+FRAGMENTS = [
+    "",
+    "Hi.",
+    "Thanks!",
+    "Dear Alex, thank you.",
+    "Yes. No. Maybe. We will meet on Monday at 10 a.m. to discuss the budget.",
+    "Best regards,\n--\nJordan",
+    "The quarterly infrastructure modernization initiative necessitates "
+    "comprehensive interdepartmental collaboration.",
+]
+
+
+@pytest.fixture(scope="module")
+def max_diff():
+    texts = [record["email"] for file in MODEL_FILES
+             for record in iter_records(os.path.join(RESEARCH_DIR, file))]
+    diff, _, _ = compare_with_textstat(texts + FRAGMENTS)
+    return diff
+
+
+@pytest.mark.parametrize("metric", ["flesch_kincaid", "gunning_fog", "smog", "coleman_liau",
+                                    "ari", "dale_chall", "difficult_words", "average_grade"])
+def test_matches_textstat(max_diff, metric):
+    assert max_diff[metric] <= TOLERANCE
+
+
+def test_shipped_easy_words_match_textstat():
+    from importlib import resources
+    path = resources.files("textstat") / "resources" / "en" / "easy_words.txt"
+    with path.open("r", encoding="utf-8") as f:
+        assert load_easy_words() == {line.strip() for line in f if line.strip()}
+
+
+def test_fragments_without_words_score_zero():
+    metrics = ReadabilityEngine().analyze("")
+    assert metrics["gunning_fog"] == metrics["ari"] == metrics["dale_chall"] == 0.0
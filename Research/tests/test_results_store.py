@@ -0,0 +1,23 @@
+import numpy as np
+
+from results_store import ResultsTable
+
+
+def test_save_load_round_trip(tmp_path):
+    table = ResultsTable(["formality", "perplexity"], capacity=1)
+    table.append("gpt", "Follow-up", None, 0, {"formality": 1.5, "perplexity": 20.0})
+    table.append("gpt", None, "", 1, {"formality": -0.5})
+    table.append("claude", "Follow-up", "Sales", 0, {"perplexity": float("nan")})
+    path = str(tmp_path / "scores.npz")
+    table.save(path)
+
+    loaded = ResultsTable.load(path)
+    assert len(loaded) == 3
+    assert loaded.columns == table.columns
+    assert loaded.labels == {"model": ["gpt", "claude"], "scenario": ["Follow-up", None],
+                             "category": [None, "", "Sales"]}
+    for label in ("model", "scenario", "category"):
+        assert np.array_equal(loaded.codes(label), table.codes(label))
+    np.testing.assert_array_equal(loaded.column("formality"), table.column("formality"))
+    np.testing.assert_array_equal(loaded.model_column("gpt", "perplexity"), [20.0, np.nan])
+    assert loaded.email_index.tolist() == [0, 1, 0]
@@ -0,0 +1,218 @@
+import asyncio
+import json
+from http import HTTPStatus
+
+import numpy as np
+import pytest
+
+import scoring_service
+from scoring_service import (MAX_BATCH_SIZE, MAX_BODY_BYTES, MAX_WAIT_MS, BatchScorer,
+                             MicroBatcher, RequestError, ScoringService, encode_json)
+
+
+def test_non_finite_scores_are_written_as_null():
+    payload = {"results": [{"metrics": {"perplexity": float("nan"),
+                                        "coherence": np.float32("inf"),
+                                        "readability": {"smog": np.float64(7.5)}},
+                            "scores": {"perplexity": float("-inf"), "word_count": np.int64(12)}}]}
+    body = encode_json(payload).decode("utf-8")
+
+    def reject(token):
+        raise ValueError(f"non-standard JSON token {token}")
+
+    result = json.loads(body, parse_constant=reject)["results"][0]
+    assert result["metrics"] == {"perplexity": None, "coherence": None,
+                                 "readability": {"smog": 7.5}}
+    assert result["scores"] == {"perplexity": None, "word_count": 12}
+
+
+def test_batch_scorer_scores_each_metric_set_separately(monkeypatch):
+    calls = []
+
+    def evaluate_chunk(model, records, offset, selected, cache=None, batch_size=None):
+        names = [metric.name for metric in selected]
+        calls.append(([record["email"] for record in records], offset, names))
+        return [{name: record["email"] for name in names} for record in records]
+
+    monkeypatch.setattr(scoring_service.comparemore, "evaluate_chunk", evaluate_chunk)
+    scorer = BatchScorer(["readability", "perplexity", "grammar"])
+    values = scorer.score(["a", "b", "c", "d"],
+                          [{"readability"}, {"perplexity", "grammar"}, {"readability"},
+                           {"grammar", "perplexity"}])
+
+    assert calls == [(["a", "c"], 0, ["readability"]),
+                     (["b", "d"], 2, ["perplexity", "grammar"])]
+    assert values == [{"readability": "a"}, {"perplexity": "b", "grammar": "b"},
+                      {"readability": "c"}, {"perplexity": "d", "grammar": "d"}]
+    assert scorer.emails_scored == 4
+
+
+# Scorer stand-in run on the batcher's worker thread: records each batch and
+# scores every requested metric as the text's length; a text of "boom" fails
+# its batch
+class StubScorer:
+    def __init__(self):
+        self.batches = []
+        self.opened = self.closed = False
+
+    def open(self):
+        self.opened = True
+
+    def close(self):
+        self.closed = True
+
+    def score(self, texts, metric_sets):
+        self.batches.append((list(texts), [set(names) for names in metric_sets]))
+        if "boom" in texts:
+            raise RuntimeError("scorer failed")
+        return [{name: float(len(text)) for name in sorted({"coherence", "perplexity"} | names)}
+                for text, names in zip(texts, metric_sets)]
+
+
+# Define function to run a coroutine against a started batcher and close it
+def run_batcher(scenario, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+    async def main():
+        scorer = StubScorer()
+        batcher = MicroBatcher(scorer, max_batch_size, max_wait_ms)
+        await batcher.start()
+        try:
+            result = await scenario(batcher)
+        finally:
+            await batcher.close()
+        assert scorer.opened and scorer.closed
+        return scorer, batcher, result
+    return asyncio.run(main())
+
+
+def test_batches_are_capped_at_max_batch_size():
+    async def scenario(batcher):
+        return await asyncio.gather(*(batcher.score("x" * n, ["coherence"]) for n in range(1, 6)))
+
+    scorer, batcher, results = run_batcher(scenario, max_batch_size=2, max_wait_ms=50)
+    assert [len(texts) for texts, _ in scorer.batches] == [2, 2, 1]
+    assert results == [{"coherence": float(n)} for n in range(1, 6)]
+    assert batcher.stats()["batches"] == 3
+    assert batcher.stats()["emails"] == 5
+
+
+def test_partial_batch_is_flushed_after_max_wait():
+    async def scenario(batcher):
+        first = await asyncio.gather(batcher.score("a", ["coherence"]),
+                                     batcher.score("bb", ["coherence"]))
+        await asyncio.sleep(0.05)
+        second = await batcher.score("ccc", ["coherence"])
+        return first, second
+
+    scorer, _, (first, second) = run_batcher(scenario, max_batch_size=32, max_wait_ms=10)
+    assert [texts for texts, _ in scorer.batches] == [["a", "bb"], ["ccc"]]
+    assert first == [{"coherence": 1.0}, {"coherence": 2.0}]
+    assert second == {"coherence": 3.0}
+
+
+def test_each_request_gets_only_its_metrics():
+    async def scenario(batcher):
+        return await asyncio.gather(batcher.score("ab", ["coherence"]),
+                                    batcher.score("abc", ["perplexity", "coherence"]))
+
+    scorer, _, results = run_batcher(scenario)
+    assert scorer.batches == [(["ab", "abc"], [{"coherence"}, {"perplexity", "coherence"}])]
+    assert results == [{"coherence": 2.0}, {"perplexity": 3.0, "coherence": 3.0}]
+
+
+def test_scorer_errors_reach_every_future_in_the_batch():
+    async def scenario(batcher):
+        failed = await asyncio.gather(batcher.score("ok", ["coherence"]),
+                                      batcher.score("boom", ["coherence"]),
+                                      return_exceptions=True)
+        # The batcher keeps serving after a failed batch
+        return failed, await batcher.score("next", ["coherence"])
+
+    _, batcher, (failed, after) = run_batcher(scenario)
+    assert [type(result) for result in failed] == [RuntimeError, RuntimeError]
+    assert after == {"coherence": 4.0}
+    assert batcher.stats()["batches"] == 1
+
+
+# Define function to run one request against a service over the stub scorer
+def run_service(request):
+    async def scenario(batcher):
+        return await request(ScoringService(batcher, ["coherence", "perplexity"]))
+    return run_batcher(scenario)[2]
+
+
+def test_score_request_returns_metrics_and_scores_in_order():
+    result = run_service(lambda service: service.score(
+        {"emails": ["abcd", {"text": "ab"}], "metrics": ["perplexity"]}))
+    assert result == {"results": [{"metrics": {"perplexity": 4.0}, "scores": {"perplexity": 4.0}},
+                                  {"metrics": {"perplexity": 2.0}, "scores": {"perplexity": 2.0}}]}
+
+    result = run_service(lambda service: service.score({"email": "abc"}))
+    assert result["results"][0]["metrics"] == {"coherence": 3.0, "perplexity": 3.0}
+
+
+@pytest.mark.parametrize("payload", [
+    ["not", "an", "object"],
+    {"text": "missing the email field"},
+    {"emails": "not a list"},
+    {"emails": ["ok", 3]},
+    {"emails": [{"body": "no text field"}]},
+    {"email": "text", "metrics": "coherence"},
+    {"email": "text", "metrics": ["grammar"]},
+])
+def test_invalid_score_requests_are_rejected(payload):
+    with pytest.raises(RequestError) as error:
+        run_service(lambda service: service.score(payload))
+    assert error.value.status == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.parametrize("method, path, body, status", [
+    ("POST", "/score", b"{not json", HTTPStatus.BAD_REQUEST),
+    ("GET", "/score", b"", HTTPStatus.METHOD_NOT_ALLOWED),
+    ("POST", "/health", b"", HTTPStatus.METHOD_NOT_ALLOWED),
+    ("GET", "/unknown", b"", HTTPStatus.NOT_FOUND),
+])
+def test_dispatch_errors(method, path, body, status):
+    with pytest.raises(RequestError) as error:
+        run_service(lambda service: service.dispatch(method, path, body))
+    assert error.value.status == status
+
+
+def test_health_reports_metrics_and_batching():
+    status, payload = run_service(lambda service: service.dispatch("GET", "/health", b""))
+    assert status == HTTPStatus.OK
+    assert payload["metrics"] == ["coherence", "perplexity"]
+    assert payload["batching"]["max_batch_size"] == MAX_BATCH_SIZE
+
+
+# Define function to parse raw request bytes with ScoringService.read_request
+def read_request(raw):
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        return await ScoringService(None, []).read_request(reader)
+    return asyncio.run(main())
+
+
+def test_read_request_parses_body_and_connection():
+    body = b'{"email": "hi"}'
+    request = read_request(b"POST /score?debug=1 HTTP/1.1\r\nHost: x\r\n"
+                           b"Content-Length: %d\r\n\r\n" % len(body) + body)
+    assert request == ("POST", "/score", body, True)
+
+    request = read_request(b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n")
+    assert request == ("GET", "/health", b"", False)
+    assert read_request(b"") is None
+
+
+@pytest.mark.parametrize("raw, status", [
+    (b"GARBAGE\r\n\r\n", HTTPStatus.BAD_REQUEST),
+    (b"POST /score HTTP/1.1\r\nContent-Length: -5\r\n\r\n", HTTPStatus.BAD_REQUEST),
+    (b"POST /score HTTP/1.1\r\nContent-Length: many\r\n\r\n", HTTPStatus.BAD_REQUEST),
+    (b"POST /score HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % (MAX_BODY_BYTES + 1),
+     HTTPStatus.REQUEST_ENTITY_TOO_LARGE),
+])
+def test_malformed_requests_are_rejected(raw, status):
+    with pytest.raises(RequestError) as error:
+        read_request(raw)
+    assert error.value.status == status
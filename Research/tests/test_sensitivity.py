@@ -0,0 +1,29 @@
+import math
+from itertools import product
+
+import numpy as np
+import pytest
+
+from sensitivity import MAX_GRID_POINTS, grid_weights
+
+
+@pytest.mark.parametrize("steps, k", [(1, 1), (4, 1), (1, 3), (5, 3), (6, 4), (3, 10)])
+def test_grid_is_every_composition_in_order(steps, k):
+    base = np.full(k, 1.0)
+    expected = [parts for parts in product(range(steps + 1), repeat=k) if sum(parts) == steps]
+    grid = grid_weights(steps, base)
+    assert len(grid) == math.comb(steps + k - 1, k - 1)
+    np.testing.assert_allclose(grid, np.array(expected) / steps)
+
+
+def test_grid_keeps_the_sign_of_each_weight():
+    grid = grid_weights(4, np.array([0.3, -0.3, 0.1]))
+    np.testing.assert_allclose(np.abs(grid).sum(axis=1), 1.0)
+    assert (grid[:, 1] <= 0).all() and (grid[:, [0, 2]] >= 0).all()
+
+
+def test_grid_above_the_cap_raises():
+    steps = 100
+    assert math.comb(steps + 9, 9) > MAX_GRID_POINTS
+    with pytest.raises(ValueError):
+        grid_weights(steps, np.ones(10))
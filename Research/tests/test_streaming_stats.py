@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+import pytest
+
+from streaming_stats import SKETCH_CAPACITY, QuantileSketch, RunningStats, StreamingAggregator
+
+# Allowed quantile error, as a fraction of the values' rank. A sketch of
+# SKETCH_CAPACITY values per level stays well inside this on 50k values.
+RANK_ERROR = 0.02
+
+
+@pytest.fixture
+def values():
+    return np.random.default_rng(7).lognormal(size=50_000)
+
+
+# Define function to fold shards into one accumulator, alternating the
+# per-value (Welford) and per-array (Chan) update paths
+def merged_stats(shards):
+    total = RunningStats()
+    for i, shard in enumerate(shards):
+        stats = RunningStats()
+        if i % 2:
+            stats.add_many(shard)
+        else:
+            for value in shard:
+                stats.add(value)
+        total.merge(stats)
+    return total
+
+
+def test_merged_mean_and_std_match_numpy(values):
+    stats = merged_stats(np.array_split(values, [3, 1000, 1001, 20_000, 37_500]))
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(np.mean(values), rel=1e-12)
+    assert stats.std == pytest.approx(np.std(values, ddof=1), rel=1e-9)
+    assert (stats.min, stats.max) == (values.min(), values.max())
+
+
+@pytest.mark.parametrize("q", [0.5, 0.95])
+def test_merged_quantiles_within_rank_error(values, q):
+    stats = merged_stats(np.array_split(values, 7))
+    estimate = stats.quantile(q)
+    low, high = np.quantile(values, [q - RANK_ERROR, q + RANK_ERROR])
+    assert low <= estimate <= high
+
+
+def test_small_sketch_is_exact():
+    values = np.random.default_rng(1).normal(size=SKETCH_CAPACITY - 1)
+    sketch = QuantileSketch()
+    sketch.add_many(values.tolist())
+    # Weighted quantiles pick the smallest value whose cumulative weight
+    # reaches q * n
+    expected = np.quantile(values, [0.5, 0.95], method="inverted_cdf")
+    assert sketch.quantiles([0.5, 0.95]) == expected.tolist()
+
+
+def test_missing_values_make_the_mean_nan():
+    stats = RunningStats()
+    stats.add_many([1.0, math.nan, 3.0])
+    assert (stats.count, stats.missing) == (2, 1)
+    assert math.isnan(stats.mean)
+    assert stats.std == pytest.approx(np.std([1.0, 3.0], ddof=1))
+
+
+def test_aggregator_spread_matches_numpy(values):
+    aggregator = StreamingAggregator()
+    aggregator.add_column("model", "score", values)
+    spread = aggregator.spread({"avg_score": "score"})["model"]["avg_score"]
+    assert spread["std"] == pytest.approx(np.std(values, ddof=1), rel=1e-9)
+    for q in (0.5, 0.95):
+        low, high = np.quantile(values, [q - RANK_ERROR, q + RANK_ERROR])
+        assert low <= spread[f"p{round(q * 100)}"] <= high
@@ -0,0 +1,22 @@
+from timing import WARMUP_EMAILS, measure
+
+
+def test_measure_warms_up_then_times_every_run():
+    calls = []
+    resets = []
+    result = measure(lambda batch: calls.append(len(batch)), list(range(10)), repeat=3,
+                     reset=lambda: resets.append(len(calls)))
+    # Warm-up, three timed runs and the tracemalloc run
+    assert calls == [WARMUP_EMAILS, 10, 10, 10, 10]
+    assert resets == [1, 2, 3, 4]
+    assert result["emails"] == 10
+    assert result["emails_per_sec"] > 0
+    assert result["peak_mb"] >= 0
+
+
+def test_measure_without_memory_pass():
+    calls = []
+    result = measure(lambda batch: calls.append(len(batch)), list(range(6)), repeat=2,
+                     memory=False)
+    assert calls == [WARMUP_EMAILS, 6, 6]
+    assert result["peak_mb"] is None
@@ -0,0 +1,45 @@
+import time
+import tracemalloc
+
+# Emails run through a measured function once before it is timed, so lazy
+# loading and first-call setup are not counted
+WARMUP_EMAILS = 4
+
+
+# Define function to measure one batch function. run(items) processes every
+# item; throughput is taken from the fastest of `repeat` timed runs and peak
+# memory from one more run under tracemalloc (skipped, with peak_mb None,
+# when memory is False). reset() (optional) is called before every timed
+# run. tracemalloc only sees allocations made through Python's allocator
+# (including NumPy), not memory allocated inside PyTorch or other native
+# libraries. benchmark.py and `python perplexity.py` both time with it.
+def measure(run, items, repeat=3, reset=None, memory=True):
+    run(items[:WARMUP_EMAILS])
+
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        if reset is not None:
+            reset()
+        start = time.perf_counter()
+        run(items)
+        best = min(best, time.perf_counter() - start)
+
+    peak_mb = None
+    if memory:
+        if reset is not None:
+            reset()
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            run(items)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        peak_mb = peak / (1024 * 1024)
+
+    return {
+        "emails": len(items),
+        "seconds": best,
+        "emails_per_sec": len(items) / best if best > 0 else float("inf"),
+        "peak_mb": peak_mb,
+    }